@@ -0,0 +1,57 @@
+"""Prompt size of follow-up questions: rolling window with summaries vs. resending the whole history.
+
+Run from the repository root:
+
+    python bench/bench_followup.py --turns 30
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import followup  # noqa: E402
+from gemini_models import estimate_tokens  # noqa: E402
+
+PLAN = ("Monthly Savings: ₹20,000 a month.\n\nGoal Feasibility: a home in 8 years is achievable.\n\n"
+        "Top 2 Investment Options: an index fund SIP and PPF.\n\nBudget Tip: automate savings on payday.\n\n"
+        "Action Plan:\n- Build an emergency fund\n- Start a SIP\n- Review yearly\n") * 4
+QUESTION = "How would that change if I also wanted to save for my daughter's education in 10 years?"
+ANSWER = ("Put roughly ₹6,000 of your ₹20,000 into a separate equity index fund SIP for education, keep the rest "
+          "on the home goal, and step both SIPs up by 10% a year as your income grows. ") * 3
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--turns", type=int, default=30)
+    p.add_argument("--budget", type=int, default=1000, help="FOLLOWUP_TOKEN_BUDGET")
+    p.add_argument("--keep", type=int, default=2, help="FOLLOWUP_KEEP_TURNS")
+    args = p.parse_args()
+
+    summary_tokens = []
+
+    def summarize(prompt):
+        # Simulated model summary of the length the summary prompt asks for; its prompt is counted too
+        summary_tokens.append(estimate_tokens(prompt))
+        return "s" * (followup.SUMMARY_MAX_CHARS // 2)
+
+    plan = PLAN[:followup.PLAN_CONTEXT_CHARS]
+    summary, turns, history = "", [], []
+    total_window = total_full = peak_window = 0
+    print(f"{'turn':>4}  {'window tokens':>13}  {'full history tokens':>19}")
+    for n in range(1, args.turns + 1):
+        window = estimate_tokens(followup.build_followup_prompt(plan, summary, turns, QUESTION))
+        full = estimate_tokens(followup.build_followup_prompt(plan, "", history, QUESTION))
+        total_window, total_full, peak_window = total_window + window, total_full + full, max(peak_window, window)
+        if n in (1, 2, 5) or n % 10 == 0:
+            print(f"{n:>4}  {window:>13}  {full:>19}")
+        history.append([QUESTION, ANSWER])
+        summary, turns = followup.compress(summary, turns + [[QUESTION, ANSWER]], args.budget, args.keep, summarize)
+    total_window += sum(summary_tokens)
+    print(f"\n{args.turns} follow-ups: {total_window} vs {total_full} prompt tokens "
+          f"({total_full / total_window:.1f}x fewer, including {len(summary_tokens)} summary calls), "
+          f"peak {peak_window} tokens per question")
+
+
+if __name__ == "__main__":
+    main()
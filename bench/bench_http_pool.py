@@ -0,0 +1,82 @@
+"""Micro-benchmark: Telegram sends through telebot's default per-thread sessions vs. the shared pool in http_pool.
+
+Worker threads send multi-chunk plans through telebot's apihelper to the
+fake Bot API server, as the outbound workers do. Reports time per message
+and the connections the server saw. The server is plain HTTP, so a
+connection here costs a TCP handshake only; against api.telegram.org each
+one is a TLS handshake as well. Run from the repository root:
+
+    python bench/bench_http_pool.py --plans 500 --chunks 3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+from telebot import apihelper  # noqa: E402
+
+from fake_telegram import FakeTelegram  # noqa: E402
+from http_pool import ConnectionStats, make_session  # noqa: E402
+
+TOKEN = "123456:BENCHMARK"
+CHUNK = "📊 Your India-Focused Financial Plan\n\n" + "Start a SIP in an index fund. " * 120
+
+
+def run(fake, workers, plans, chunks):
+    """Send plans x chunks messages from `workers` threads; returns seconds per message."""
+    connections_before = fake.connections
+    per_worker = plans // workers
+
+    def worker():
+        for i in range(per_worker):
+            for _ in range(chunks):
+                apihelper.send_message(TOKEN, 1000 + i, CHUNK)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    return elapsed / (per_worker * workers * chunks), fake.connections - connections_before
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--plans", type=int, default=500)
+    p.add_argument("--chunks", type=int, default=3, help="messages per plan")
+    p.add_argument("--workers", type=int, default=4, help="sending threads (OUTBOUND_WORKERS)")
+    args = p.parse_args()
+
+    fake = FakeTelegram().start()
+    apihelper.API_URL = fake.api_url
+
+    # telebot's default: a requests.Session per thread, re-reading proxy settings on every call
+    apihelper.session = None
+    apihelper.SESSION_TIME_TO_LIVE = 600
+    default_s, default_conns = run(fake, args.workers, args.plans, args.chunks)
+
+    stats = ConnectionStats()
+    apihelper.session = make_session(fake.base_url, args.workers + 2, stats)
+    apihelper.SESSION_TIME_TO_LIVE = None
+    pooled_s, pooled_conns = run(fake, args.workers, args.plans, args.chunks)
+
+    messages = args.plans // args.workers * args.workers * args.chunks
+    print(f"{messages} messages ({args.chunks} per plan) from {args.workers} threads")
+    print(f"{'client':<26}{'us/message':>12}{'connections':>13}")
+    print(f"{'telebot per-thread':<26}{default_s * 1e6:>12.0f}{default_conns:>13}")
+    print(f"{'shared pool':<26}{pooled_s * 1e6:>12.0f}{pooled_conns:>13}")
+    print(f"shared pool reuse rate: {stats.reuse_rate():.2%}")
+    print(f"telebot also renews each thread's session every 600 s: {args.workers * 6} more handshakes an hour "
+          f"for {args.workers} threads, none with the shared pool")
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Micro-benchmark: session expiry sweep cost vs. the original O(N) dict scan.
+
+Run from the repository root:
+
+    python bench/bench_sessions.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sessions import MemorySessionStore, SqliteSessionStore  # noqa: E402
+
+TTL = 600
+
+
+def legacy_sweep(user_data, now, expiry_seconds=TTL):
+    """The cleanup loop bot.py used to run every 60 seconds, minus the sleep and the send."""
+    expired = []
+    for uid, data in list(user_data.items()):
+        ts = data.get('_ts')
+        if ts and now - ts > expiry_seconds:
+            user_data.pop(uid, None)
+            expired.append(uid)
+    return expired
+
+
+def fill_legacy(n, now):
+    return {i: {"_ts": now, "state": "awaiting_income", "age": "25"} for i in range(n)}
+
+
+def fill_store(store, n):
+    for i in range(n):
+        store.create(i, state="awaiting_income", age="25")
+
+
+def time_sweeps(sweep, ticks, step):
+    """Average seconds per sweep over `ticks` sweeps spaced `step` seconds apart in fake time."""
+    start = time.time()
+    began = time.perf_counter()
+    expired = 0
+    for k in range(1, ticks + 1):
+        expired += len(sweep(start + k * step))
+    return (time.perf_counter() - began) / ticks, expired
+
+
+def main():
+    print(f"{'sessions':>10}{'legacy scan ms':>16}{'timer wheel ms':>16}{'sqlite ms':>12}   (per 1 s sweep, nothing due)")
+    for n in (1_000, 10_000, 100_000):
+        now = time.time()
+        legacy = fill_legacy(n, now)
+        legacy_ms, _ = time_sweeps(lambda t: legacy_sweep(legacy, t), 20, 1.0)
+
+        wheel = MemorySessionStore(ttl=TTL)
+        fill_store(wheel, n)
+        wheel_ms, _ = time_sweeps(wheel.expire, 20, 1.0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite = SqliteSessionStore(os.path.join(tmp, "sessions.db"), ttl=TTL)
+            fill_store(sqlite, min(n, 10_000))
+            sqlite_ms, _ = time_sweeps(sqlite.expire, 20, 1.0)
+
+        print(f"{n:>10}{legacy_ms * 1000:>16.3f}{wheel_ms * 1000:>16.4f}{sqlite_ms * 1000:>12.3f}")
+
+    print()
+    n = 100_000
+    wheel = MemorySessionStore(ttl=TTL)
+    fill_store(wheel, n)
+    began = time.perf_counter()
+    expired = len(wheel.expire(time.time() + TTL + 1))
+    elapsed = time.perf_counter() - began
+    print(f"timer wheel expiring all {expired} sessions: {elapsed * 1000:.1f} ms "
+          f"({elapsed / expired * 1e6:.2f} us per session)")
+
+
+if __name__ == "__main__":
+    main()
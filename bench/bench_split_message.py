@@ -0,0 +1,82 @@
+"""Micro-benchmark: text_split.split_message vs. the original split_message from bot.py.
+
+Run from the repository root:
+
+    python bench/bench_split_message.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from text_split import split_message, utf16_len  # noqa: E402
+
+
+def legacy_split_message(text, max_length=4000):
+    """The split_message that bot.py shipped before the rewrite, kept verbatim for comparison."""
+    if len(text) <= max_length:
+        return [text]
+
+    chunks = []
+    current_chunk = ""
+
+    lines = text.split('\n')
+
+    for line in lines:
+        if len(current_chunk + line + '\n') <= max_length:
+            current_chunk += line + '\n'
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+                current_chunk = line + '\n'
+            else:
+                words = line.split(' ')
+                for word in words:
+                    if len(current_chunk + word + ' ') <= max_length:
+                        current_chunk += word + ' '
+                    else:
+                        if current_chunk:
+                            chunks.append(current_chunk.strip())
+                            current_chunk = word + ' '
+                        else:
+                            chunks.append(word)
+
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+
+    return chunks
+
+
+def make_plan(paragraphs):
+    para = (
+        "💰 **Monthly Savings:** ₹20,000 — put ₹10,000 into an index fund SIP and ₹5,000 into PPF. "
+        "Keep 6 months of expenses (₹1,80,000) as an emergency fund 🏦. Review the plan every year.\n"
+        "- Step-up your SIP by 10% when your salary grows 📈\n"
+    )
+    return "\n".join(para for _ in range(paragraphs))
+
+
+def main():
+    cases = {
+        "short plan (2 KB)": make_plan(8),
+        "long plan (25 KB)": make_plan(100),
+        "very long plan (250 KB)": make_plan(1000),
+        "one huge line (100 KB)": "word " * 20000,
+        "emoji-heavy (20 KB)": ("📈 SIP 💰 ₹5,000 🏦 PPF 🎯 goal\n" * 700),
+    }
+    print(f"{'case':<26}{'legacy ms':>12}{'new ms':>10}{'legacy chunks':>15}{'new chunks':>12}{'legacy overflow':>17}")
+    for name, text in cases.items():
+        number = 20 if len(text) < 50000 else 3
+        legacy = timeit.timeit(lambda: legacy_split_message(text), number=number) / number * 1000
+        new = timeit.timeit(lambda: split_message(text), number=number) / number * 1000
+        old_chunks = legacy_split_message(text)
+        new_chunks = split_message(text)
+        # Chunks the old splitter produced that Telegram would still reject (it counts UTF-16 units)
+        overflow = sum(1 for c in old_chunks if utf16_len(c) > 4096)
+        assert all(utf16_len(c) <= 4096 for c in new_chunks)
+        print(f"{name:<26}{legacy:>12.2f}{new:>10.2f}{len(old_chunks):>15}{len(new_chunks):>12}{overflow:>17}")
+
+
+if __name__ == "__main__":
+    main()
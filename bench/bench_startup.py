@@ -0,0 +1,79 @@
+"""Startup benchmark: seconds from launching bot.py to its first reply, as on a cold-started free instance.
+
+A /start message is already waiting on a fake Bot API server when the
+process starts; the clock stops when the bot's welcome message arrives.
+The old layout is emulated too: a separate check_env interpreter, then
+bot.py with the Gemini SDK imported before anything else.
+
+Run from the repository root:
+
+    python bench/bench_startup.py --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_telegram import FakeTelegram  # noqa: E402
+
+BOT = os.path.join(ROOT, "src", "bot.py")
+
+# What `python src/check_env.py` did before it was folded into bot.py
+LEGACY_CHECK = "import os, sys; sys.exit(1 if not all(os.getenv(k) for k in ('BOT_TOKEN', 'GEMINI_API_KEY')) else 0)"
+LEGACY_BOT = (
+    "import sys, runpy; sys.path.insert(0, sys.argv[1]); import google.generativeai; "
+    "runpy.run_path(sys.argv[2], run_name='__main__')"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_reply(legacy, timeout=60.0):
+    replied = threading.Event()
+    fake = FakeTelegram(on_message=lambda chat_id, text: replied.set()).start()
+    fake.push_text(1, "/start")
+    env = dict(os.environ, BOT_TOKEN="123456:BENCHMARK", GEMINI_API_KEY="offline", GEMINI_WARMUP="0",
+               TELEGRAM_API_URL=fake.base_url, PORT=str(free_port()), SESSION_BACKEND="memory",
+               PLAN_CACHE_DB="", PYTHONDONTWRITEBYTECODE="1")
+    began = time.perf_counter()
+    if legacy:
+        subprocess.run([sys.executable, "-c", LEGACY_CHECK], env=env, check=True)
+        cmd = [sys.executable, "-c", LEGACY_BOT, os.path.dirname(BOT), BOT]
+    else:
+        cmd = [sys.executable, BOT]
+    proc = subprocess.Popen(cmd, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not replied.wait(timeout):
+            raise RuntimeError("bot did not reply in time")
+        return time.perf_counter() - began
+    finally:
+        proc.kill()
+        proc.wait()
+        fake.stop()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--runs", type=int, default=5)
+    args = p.parse_args()
+
+    print(f"{'layout':<40}{'median s':>10}{'min s':>10}{'max s':>10}")
+    for name, legacy in (("check_env + eager SDK (old)", True), ("single process, lazy SDK (bot.py)", False)):
+        times = [time_to_first_reply(legacy) for _ in range(args.runs)]
+        print(f"{name:<40}{statistics.median(times):>10.3f}{min(times):>10.3f}{max(times):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
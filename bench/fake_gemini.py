@@ -0,0 +1,72 @@
+"""A stand-in for google.generativeai.GenerativeModel with configurable latency and failures."""
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+_PLAN = (
+    "Monthly Savings: you keep a healthy surplus every month.\n\n"
+    "Goal Feasibility: achievable with a disciplined SIP.\n\n"
+    "Top 2 Investment Options: an index fund SIP and PPF.\n\n"
+    "Budget Tip: automate your savings on payday.\n\n"
+    "Action Plan:\n- Build an emergency fund\n- Start a SIP\n- Review yearly\n"
+)
+
+
+class FakeGeminiError(Exception):
+    """Looks like google.api_core's ServiceUnavailable to the bot's retry logic."""
+    code = 503
+
+
+class FakeGenerativeModel:
+    """generate_content() that sleeps for a lognormal latency and fails at a given rate.
+
+    ``median_latency`` is in seconds; ``sigma`` is the lognormal shape (0 for a
+    fixed latency). ``plan_repeats`` controls the response size.
+    """
+
+    def __init__(self, median_latency=1.5, sigma=0.5, failure_rate=0.0, plan_repeats=3,
+                 stream_chunks=8, seed=None):
+        self.median_latency = median_latency
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.text = _PLAN * plan_repeats
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            latency = self.median_latency * self._rng.lognormvariate(0, self.sigma) if self.sigma else self.median_latency
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        return latency, fail
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        latency, fail = self._draw()
+        if not stream:
+            time.sleep(latency)
+            if fail:
+                raise FakeGeminiError("503 The model is overloaded (injected)")
+            return SimpleNamespace(text=self.text)
+        return self._stream(latency, fail)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        latency, fail = self._draw()
+        await asyncio.sleep(latency)
+        if fail:
+            raise FakeGeminiError("503 The model is overloaded (injected)")
+        return SimpleNamespace(text=self.text)
+
+    def _stream(self, latency, fail):
+        step = max(1, len(self.text) // self.stream_chunks)
+        for i in range(0, len(self.text), step):
+            time.sleep(latency / self.stream_chunks)
+            if fail and i >= len(self.text) // 2:
+                raise FakeGeminiError("503 The model is overloaded (injected)")
+            yield SimpleNamespace(text=self.text[i:i + step])
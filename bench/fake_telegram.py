@@ -0,0 +1,173 @@
+"""A local stand-in for the Telegram Bot API, good enough to drive bot.py offline.
+
+Implements getMe, getUpdates (with long polling), sendMessage, editMessageText,
+deleteMessage, setWebhook and deleteWebhook. Point telebot at it with::
+
+    telebot.apihelper.API_URL = server.api_url
+"""
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+class FakeTelegram:
+    """Holds the update queue and calls back into the load generator for every bot reply."""
+
+    def __init__(self, on_message=None, on_edit=None, max_poll_wait=1.0, failure_rate=0.0, rng=None):
+        self.on_message = on_message
+        self.on_edit = on_edit
+        self.max_poll_wait = max_poll_wait
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.requests = 0
+        self.connections = 0
+        self.errors_injected = 0
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._server = None
+
+    # -- load generator side -------------------------------------------------
+
+    def push_text(self, chat_id, text):
+        """Queue an incoming user message; returns the update id."""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        with self._cond:
+            update_id = next(self._update_ids)
+            self._updates.append({"update_id": update_id, "message": message})
+            self._cond.notify_all()
+        return update_id
+
+    # -- Bot API side --------------------------------------------------------
+
+    def handle(self, method, params):
+        self.requests += 1
+        if method in ("getMe",):
+            return {"id": 1, "is_bot": True, "first_name": "FinanceBot", "username": "finance_bench_bot"}
+        if method in ("setWebhook", "deleteWebhook", "deleteMessage"):
+            return True
+        if method == "getUpdates":
+            return self._get_updates(int(params.get("offset", 0) or 0), float(params.get("timeout", 0) or 0))
+        if method in ("sendMessage", "editMessageText"):
+            if self.failure_rate and self.rng is not None and self.rng.random() < self.failure_rate:
+                self.errors_injected += 1
+                raise _ApiError(500, "Internal Server Error: injected failure")
+            chat_id = int(params["chat_id"])
+            text = params.get("text", "")
+            if method == "sendMessage":
+                message_id = next(self._message_ids)
+                if self.on_message:
+                    self.on_message(chat_id, text)
+            else:
+                message_id = int(params["message_id"])
+                if self.on_edit:
+                    self.on_edit(chat_id, text)
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "FinanceBot"},
+                "text": text,
+            }
+        raise _ApiError(404, f"Not Found: method {method} is not implemented by the fake server")
+
+    def _get_updates(self, offset, timeout):
+        deadline = time.monotonic() + min(timeout, self.max_poll_wait)
+        with self._cond:
+            # Confirmed updates (id < offset) are dropped, like the real API does
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return list(self._updates[:100])
+
+    # -- server lifecycle ----------------------------------------------------
+
+    def start(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this Nagle adds ~40 ms per call
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                fake.connections += 1
+
+            def _dispatch(self):
+                url = urlparse(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = self.rfile.read(length).decode("utf-8")
+                    if self.headers.get("Content-Type", "").startswith("application/json"):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body))
+                try:
+                    payload, status = {"ok": True, "result": fake.handle(method, params)}, 200
+                except _ApiError as e:
+                    payload, status = {"ok": False, "error_code": e.code, "description": e.description}, e.code
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    @property
+    def base_url(self):
+        """Base URL for bot.py's TELEGRAM_API_URL setting."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.base_url + "/bot{0}/{1}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A bot process that is killed mid-request (bench_startup.py does this) is not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _ApiError(Exception):
+    def __init__(self, code, description):
+        super().__init__(description)
+        self.code = code
+        self.description = description
@@ -0,0 +1,413 @@
+"""Offline load test: drive the real bot.py handlers through a fake Telegram API and a fake Gemini.
+
+Every simulated user walks the whole conversation (/start -> age -> income ->
+expenses -> goals) and waits for the bot's reply before sending the next
+answer. Reports p50/p95/p99 latency per step, plans per second, error rates
+and memory per session. Run from the repository root:
+
+    python bench/loadtest.py --conversations 2000 --gemini-latency 1.5
+    python bench/loadtest.py --conversations 2000 --runtime async   # bot_async.py instead
+    python bench/loadtest.py --telegram-failure-rate 0.2 --outbox    # plans survive failed sends
+    python bench/loadtest.py --conversations 300 --ramp 60 --one-shot   # /plan in one message
+"""
+import asyncio
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+
+GOALS = ["Retirement", "Buy a home", "Child's education", "Tax saving", "Retirement, buy a car"]
+
+# (step name, substring of the bot reply that completes the step)
+STEPS = [
+    ("start", "share your age"),
+    ("age", "monthly income"),
+    ("income", "monthly expenses"),
+    ("expenses", "financial goals"),
+    ("plan", "✅ Done"),
+]
+# --one-shot: the whole profile in a single /plan message
+ONE_SHOT_STEPS = [("plan", "✅ Done")]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Conversation:
+    __slots__ = ("chat_id", "answers", "step", "sent_at", "replied", "first_plan_at", "done")
+
+    def __init__(self, chat_id, answers):
+        self.chat_id = chat_id
+        self.answers = answers
+        self.step = 0
+        self.sent_at = 0.0
+        self.replied = True
+        self.first_plan_at = None
+        self.done = False
+
+
+class Simulator:
+    """Plays thousands of users against the fake Telegram server."""
+
+    def __init__(self, args):
+        self.args = args
+        self.steps = ONE_SHOT_STEPS if args.one_shot else STEPS
+        self.rng = random.Random(args.seed)
+        self.fake = None
+        self.conversations = {}
+        self.latencies = defaultdict(list)
+        self.events = Counter()
+        self.completed = 0
+        self.messages_sent = 0
+        self.remaining = 0
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+        self._timers = []
+        self._timer_cond = threading.Condition()
+
+    def make_answers(self, index):
+        if self.rng.random() < self.args.shared_profile_ratio:
+            answers = ["/start", "25", "50000", "30000", "Retirement"]
+        else:
+            answers = [
+                "/start",
+                str(self.rng.randint(21, 58)),
+                str(self.rng.randrange(25000, 300000, 500)),
+                str(self.rng.randrange(10000, 150000, 500)),
+                self.rng.choice(GOALS),
+            ]
+        if self.args.one_shot:
+            return ["/plan age {} income {} expenses {} goals {}".format(*answers[1:])]
+        return answers
+
+    # -- user side -----------------------------------------------------------
+
+    def send_step(self, conv):
+        conv.sent_at = time.monotonic()
+        conv.replied = False
+        self.messages_sent += 1
+        self.fake.push_text(conv.chat_id, conv.answers[conv.step])
+
+    def schedule(self, delay, conv):
+        if delay <= 0:
+            self.send_step(conv)
+            return
+        with self._timer_cond:
+            heapq.heappush(self._timers, (time.monotonic() + delay, conv.chat_id))
+            self._timer_cond.notify()
+
+    def _timer_loop(self):
+        next_check = time.monotonic() + 1.0
+        while not self.finished.is_set():
+            if time.monotonic() >= next_check:
+                self._resend_unanswered()
+                next_check = time.monotonic() + 1.0
+            with self._timer_cond:
+                now = time.monotonic()
+                if not self._timers:
+                    self._timer_cond.wait(0.1)
+                    continue
+                due, chat_id = self._timers[0]
+                if due > now:
+                    self._timer_cond.wait(min(due - now, 0.1))
+                    continue
+                heapq.heappop(self._timers)
+            self.send_step(self.conversations[chat_id])
+
+    def _resend_unanswered(self):
+        # A real user whose message got no reply at all sends it again; count it as a lost update
+        now = time.monotonic()
+        with self._lock:
+            lost = [c for c in self.conversations.values()
+                    if not c.done and not c.replied and c.sent_at and now - c.sent_at > self.args.step_timeout]
+            self.events["lost update (resent)"] += len(lost)
+        for conv in lost:
+            self.send_step(conv)
+
+    def think_time(self):
+        return self.rng.expovariate(1 / self.args.think_time) if self.args.think_time > 0 else 0.0
+
+    # -- bot side (called from the fake server's request threads) -------------
+
+    def on_message(self, chat_id, text):
+        now = time.monotonic()
+        conv = self.conversations.get(chat_id)
+        if conv is None or conv.done:
+            return
+        with self._lock:
+            conv.replied = True
+            if text.startswith("📊"):
+                if conv.first_plan_at is None:
+                    conv.first_plan_at = now
+                    self.latencies["first plan chunk"].append(now - conv.sent_at)
+                return
+            if text.startswith("⚠️ Our AI advisor"):
+                self.events["fallback plan"] += 1
+                return
+            if text.startswith("⚠️"):
+                self.events["generation error"] += 1
+                self._finish(conv)
+                return
+            if text.startswith("🚦"):
+                # Queue full: the bot asks the user to resend their goals
+                self.events["rejected (queue full)"] += 1
+                self.schedule(1.0, conv)
+                return
+            if text.startswith("⏳ You're"):
+                self.events["queued behind others"] += 1
+                return
+            if "timed out" in text:
+                self.events["session timeout"] += 1
+                self._finish(conv)
+                return
+            if text.startswith("No active session"):
+                self.events["no active session"] += 1
+                self._finish(conv)
+                return
+
+            name, marker = self.steps[conv.step]
+            if marker not in text:
+                return
+            self.latencies[name].append(now - conv.sent_at)
+            if name == "plan" and conv.first_plan_at is None:
+                # The closing message arrived but the plan's first chunk never did
+                self.events["plan lost"] += 1
+            conv.step += 1
+            if conv.step == len(self.steps):
+                self.completed += 1
+                self._finish(conv)
+                return
+        self.schedule(self.think_time(), conv)
+
+    def _finish(self, conv):
+        conv.done = True
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.finished.set()
+
+    # -- driver --------------------------------------------------------------
+
+    def run(self):
+        args = self.args
+        for i in range(args.conversations):
+            chat_id = 10_000 + i
+            self.conversations[chat_id] = Conversation(chat_id, self.make_answers(i))
+        self.remaining = len(self.conversations)
+        threading.Thread(target=self._timer_loop, name="user-timers", daemon=True).start()
+
+        started = time.monotonic()
+        gap = args.ramp / args.conversations if args.conversations else 0
+        for i, conv in enumerate(self.conversations.values()):
+            self.schedule(started + i * gap - time.monotonic(), conv)
+        self.finished.wait(args.timeout)
+        return time.monotonic() - started
+
+
+def session_memory(samples=10000):
+    """Bytes per session held by the in-memory store, measured with tracemalloc."""
+    from sessions import MemorySessionStore
+
+    tracemalloc.start()
+    store = MemorySessionStore(ttl=600)
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(samples):
+        store.create(i, state="awaiting_goals", age="25", income="50000", expenses="30000")
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / samples
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--conversations", type=int, default=1000, help="simulated users (default 1000)")
+    p.add_argument("--ramp", type=float, default=5.0, help="seconds over which users arrive (default 5)")
+    p.add_argument("--think-time", type=float, default=0.0, help="mean user think time between answers, seconds")
+    p.add_argument("--gemini-latency", type=float, default=1.5, help="median fake Gemini latency, seconds")
+    p.add_argument("--gemini-sigma", type=float, default=0.5, help="lognormal shape of Gemini latency (0 = fixed)")
+    p.add_argument("--gemini-failure-rate", type=float, default=0.0, help="fraction of Gemini calls that fail")
+    p.add_argument("--telegram-failure-rate", type=float, default=0.0, help="fraction of sends that return HTTP 500")
+    p.add_argument("--one-shot", action="store_true",
+                   help="send the whole profile in one /plan message instead of answering step by step")
+    p.add_argument("--outbox", action="store_true",
+                   help="deliver plans through the SQLite outbox (OUTBOX_DB in a temporary directory)")
+    p.add_argument("--shared-profile-ratio", type=float, default=0.0,
+                   help="fraction of users sending the same profile (exercises the cache and request coalescing)")
+    p.add_argument("--realistic-limits", action="store_true",
+                   help="keep Telegram's 30 msg/s global rate limit instead of lifting it for the benchmark")
+    p.add_argument("--step-timeout", type=float, default=10.0,
+                   help="resend an answer that got no reply at all within this many seconds (default 10)")
+    p.add_argument("--timeout", type=float, default=300.0, help="give up after this many seconds")
+    p.add_argument("--runtime", choices=("threaded", "async"), default="threaded",
+                   help="drive bot.py (threaded, default) or bot_async.py (asyncio)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # bot.py reads its configuration at import time
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    os.environ.setdefault("GEMINI_API_KEY", "offline")
+    os.environ.setdefault("PLAN_CACHE_DB", "")
+    os.environ.setdefault("GEMINI_LOG_USAGE", "0")
+    if args.outbox:
+        os.environ.setdefault("OUTBOX_DB", os.path.join(tempfile.mkdtemp(), "outbox.db"))
+    if not args.realistic_limits:
+        os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "1000000")
+        os.environ.setdefault("OUTBOUND_PER_CHAT_RATE", "1000")
+        os.environ.setdefault("OUTBOUND_PER_CHAT_BURST", "1000")
+
+    sim = Simulator(args)
+    fake = FakeTelegram(on_message=sim.on_message, failure_rate=args.telegram_failure_rate,
+                        rng=random.Random(args.seed + 1)).start()
+    sim.fake = fake
+
+    if args.runtime == "async":
+        from telebot import asyncio_helper
+        asyncio_helper.API_URL = fake.api_url
+        import bot_async as bot
+    else:
+        import telebot
+        telebot.apihelper.API_URL = fake.api_url
+        import bot
+    # Settings, metrics and components both runtimes share
+    import bot_common as common
+
+    gemini = FakeGenerativeModel(median_latency=args.gemini_latency, sigma=args.gemini_sigma,
+                                 failure_rate=args.gemini_failure_rate, seed=args.seed)
+    for tier in bot.model_tiers.values():
+        tier.model = gemini
+
+    rss_before = rss_bytes()
+    if args.runtime == "async":
+        async def run_async_bot():
+            bot.event_loop = asyncio.get_running_loop()
+            if bot.outbox_sender is not None:
+                bot.outbox_sender.start()
+            asyncio.create_task(bot.cleanup_sessions())
+            await bot.run_bot()
+        threading.Thread(target=asyncio.run, args=(run_async_bot(),), name="event-loop", daemon=True).start()
+    else:
+        threading.Thread(target=bot.cleanup_sessions, name="cleanup", daemon=True).start()
+        if bot.outbox_sender is not None:
+            bot.outbox_sender.start()
+        threading.Thread(target=bot.run_bot, name="polling", daemon=True).start()
+
+    # Sample the bot's thread count while the load runs (the fake server's request threads are excluded)
+    peak_threads = [0]
+
+    def sample_threads():
+        while not sim.finished.is_set():
+            names = [t.name for t in threading.enumerate() if not t.name.startswith("Thread-")]
+            peak_threads[0] = max(peak_threads[0], len(names))
+            time.sleep(0.2)
+
+    threading.Thread(target=sample_threads, name="thread-sampler", daemon=True).start()
+
+    elapsed = sim.run()
+    rss_after = rss_bytes()
+    fake.stop()
+
+    timed_out = sum(1 for c in sim.conversations.values() if not c.done)
+    report = {
+        "runtime": args.runtime,
+        "conversations": args.conversations,
+        "completed_plans": sim.completed,
+        "timed_out": timed_out,
+        "elapsed_s": round(elapsed, 3),
+        "plans_per_s": round(sim.completed / elapsed, 2) if elapsed else 0.0,
+        "gemini_calls": gemini.calls,
+        "gemini_failures": gemini.failures,
+        "gemini_tokens": {
+            tier.name: {kind: int(common.GEMINI_TOKENS.value(model=tier.name, kind=kind)) for kind in ("input", "output")}
+            for tier in bot.model_tiers.values()
+        },
+        "telegram_requests": fake.requests,
+        "telegram_requests_per_plan": round(fake.requests / max(1, sim.completed), 2),
+        "telegram_connections": fake.connections,
+        "telegram_errors_injected": fake.errors_injected,
+        "events": dict(sim.events),
+        "user_messages": sim.messages_sent,
+        # Share of user messages that ended in an error, a rejection or a lost update
+        "error_rate": round(sum(v for k, v in sim.events.items() if k not in ("queued behind others", "fallback plan"))
+                            / max(1, sim.messages_sent), 4),
+        "latency_s": {
+            name: {
+                "n": len(values),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+                "p99": round(percentile(values, 99), 4),
+            }
+            for name, values in sim.latencies.items()
+        },
+        "session_bytes": round(session_memory()),
+        "rss_growth_mb": round((rss_after - rss_before) / 2**20, 1),
+        "peak_bot_threads": peak_threads[0],
+        "gemini_resilience": {
+            tier.name: {
+                "retries": int(common.GEMINI_RETRIES.value(model=tier.name)),
+                "hedges_launched": int(common.GEMINI_HEDGES.value(model=tier.name, result="launched")),
+                "hedges_won": int(common.GEMINI_HEDGES.value(model=tier.name, result="won")),
+                "circuit_rejections": common.breakers[name].rejected,
+                "circuit_opened": common.breakers[name].opened,
+            }
+            for name, tier in bot.model_tiers.items()
+        },
+        "plan_cache": common.plan_cache.stats(),
+        "gemini_coalescing": bot.gemini_flight.stats() if hasattr(bot, "gemini_flight") else None,
+        "outbound": bot.outbound.stats(),
+        "outbox": bot.outbox_sender.stats() if bot.outbox_sender is not None else None,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['completed_plans']}/{args.conversations} plans in {report['elapsed_s']}s "
+          f"({report['plans_per_s']} plans/s), {timed_out} unfinished, error rate {report['error_rate']:.2%}")
+    print(f"{'step':<18}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, _ in STEPS + [("first plan chunk", None)]:
+        stats = report["latency_s"].get(name)
+        if stats:
+            print(f"{name:<18}{stats['n']:>7}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+    print(f"events: {report['events']}")
+    print(f"gemini calls: {report['gemini_calls']} ({report['gemini_failures']} failed), "
+          f"telegram requests: {report['telegram_requests']} ({report['telegram_requests_per_plan']} per plan) "
+          f"on {report['telegram_connections']} connections")
+    print(f"gemini tokens (estimated): {report['gemini_tokens']}")
+    print(f"gemini resilience: {report['gemini_resilience']}")
+    if report["outbox"] is not None:
+        print(f"outbox: {report['outbox']}")
+    print(f"memory: {report['session_bytes']} bytes/session, RSS growth {report['rss_growth_mb']} MB, "
+          f"peak {report['peak_bot_threads']} bot threads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import deque
+
+from outbound import TokenBucket, retry_after_seconds
+
+
+class _Chat:
+    __slots__ = ("lock", "bucket", "waiting")
+
+    def __init__(self, bucket):
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.waiting = 0
+
+
+class AsyncOutboundDispatcher:
+    """OutboundDispatcher for asyncio: the same rate limits and per-chat order, on one event loop.
+
+    Calls for one chat are sent strictly in order (asyncio.Lock is FIFO), a
+    global token bucket keeps us under Telegram's ~30 msg/s and a per-chat
+    bucket under ~1 msg/s per chat. 429 responses wait ``retry_after`` and
+    retry. Every call is a coroutine that returns the API result; a call
+    that fails for good is logged and returns None, so a handler carries on
+    as it would after bot.py's fire-and-forget sends (``call`` raises
+    instead, for callers that retry).
+
+    ``on_complete(method, seconds, error)`` is called after every call, as in
+    OutboundDispatcher.
+    """
+
+    def __init__(self, bot, global_rate=30.0, global_burst=30, per_chat_rate=1.0, per_chat_burst=3,
+                 max_attempts=5, on_complete=None):
+        self.bot = bot
+        self.on_complete = on_complete
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._chats = {}
+        self._pending = 0
+        self._sent = 0
+        self._failed = 0
+        self._rate_limited = 0
+        self._latencies = deque(maxlen=1000)
+
+    async def submit(self, chat_id, func, *args, **kwargs):
+        """Await func(*args, **kwargs) once earlier calls for chat_id are done and the rate limits allow."""
+        try:
+            return await self.call(chat_id, func, *args, **kwargs)
+        except Exception:
+            return None  # already logged
+
+    async def call(self, chat_id, func, *args, **kwargs):
+        """submit(), but a call that fails for good raises its error instead of returning None."""
+        began = time.monotonic()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.per_chat_rate, self.per_chat_burst, began))
+        chat.waiting += 1
+        self._pending += 1
+        error = result = None
+        try:
+            async with chat.lock:
+                for attempt in range(1, self.max_attempts + 1):
+                    await self._take(chat.bucket)
+                    try:
+                        result = await func(*args, **kwargs)
+                        break
+                    except Exception as e:
+                        retry_after = retry_after_seconds(e) if hasattr(e, "error_code") else None
+                        if retry_after is None or attempt == self.max_attempts:
+                            error = e
+                            break
+                        self._rate_limited += 1
+                        await asyncio.sleep(retry_after)
+        finally:
+            chat.waiting -= 1
+            self._pending -= 1
+            if not chat.waiting and chat.bucket.is_full(time.monotonic()):
+                del self._chats[chat_id]
+        self._finish(chat_id, func, began, error)
+        if error is not None:
+            raise error
+        return result
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self.submit(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        return await self.submit(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "queue_depth": self._pending,
+            "chats_waiting": sum(1 for c in self._chats.values() if c.waiting),
+            "sent": self._sent,
+            "failed": self._failed,
+            "rate_limited": self._rate_limited,
+            "latency_p50": pct(0.50),
+            "latency_p95": pct(0.95),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    async def _take(self, bucket):
+        # Single-threaded, so checking and taking both tokens can't race with another sender
+        while True:
+            now = time.monotonic()
+            wait = max(self._global.wait_time(now), bucket.wait_time(now))
+            if wait <= 0:
+                self._global.take(now)
+                bucket.take(now)
+                return
+            await asyncio.sleep(wait)
+
+    def _finish(self, chat_id, func, began, error):
+        seconds = time.monotonic() - began
+        if error is None:
+            self._sent += 1
+            self._latencies.append(seconds)
+        else:
+            self._failed += 1
+            print(f"Outbound call to chat {chat_id} failed: {error}")
+        if self.on_complete is not None:
+            try:
+                self.on_complete(getattr(func, "__name__", "call"), seconds, error)
+            except Exception as e:
+                print(f"Outbound on_complete hook failed: {e}")
@@ -0,0 +1,246 @@
+"""Generate plans offline for a JSONL file of profiles.
+
+Each input line is a JSON object with age, income, expenses and goals (plus
+an optional id). Prompts are built exactly as the bot builds them. Requests
+run on a bounded pool under a token-bucket rate limit, and results are
+written to the output JSONL in input order with latency and token counts.
+
+Progress is checkpointed next to the output file. Re-running the same
+command resumes after the last checkpoint instead of starting over.
+
+    python src/batch_plans.py profiles.jsonl plans.jsonl --concurrency 8 --rate 2
+    python src/batch_plans.py profiles.jsonl prompts.jsonl --prompts-only   # no Gemini calls
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from gemini_models import model_tiers_from_env
+from outbound import TokenBucket
+from plan_prompt import PROMPT_VERSION, SYSTEM_INSTRUCTION, build_plan_request
+from resilience import retry_call
+
+PROFILE_FIELDS = ("age", "income", "expenses", "goals")
+
+
+class RateLimiter:
+    """Blocking token bucket shared by the worker threads."""
+
+    def __init__(self, rate, burst):
+        self._lock = threading.Lock()
+        self._bucket = TokenBucket(rate, burst, time.monotonic())
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._bucket.wait_time(now)
+                if wait <= 0:
+                    self._bucket.take(now)
+                    return
+            time.sleep(wait)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def read_profiles(path, skip):
+    """Yield (line_number, profile or None, error) for each line after the first `skip` lines."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if number <= skip:
+                continue
+            if not line.strip():
+                yield number, None, "empty line"
+                continue
+            try:
+                profile = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"invalid JSON: {e}"
+                continue
+            missing = [k for k in PROFILE_FIELDS if k not in profile] if isinstance(profile, dict) else PROFILE_FIELDS
+            if missing:
+                yield number, None, "missing " + ", ".join(missing)
+                continue
+            yield number, profile, None
+
+
+class BatchRunner:
+    def __init__(self, tiers, limiter, retries, prompts_only=False):
+        self.tiers = tiers
+        self.limiter = limiter
+        self.retries = retries
+        self.prompts_only = prompts_only
+
+    def run_one(self, number, profile):
+        """Build the prompt for one profile and generate its plan; returns the output record."""
+        try:
+            request = build_plan_request(*(str(profile[k]) for k in PROFILE_FIELDS))
+        except Exception as e:
+            # Recorded like a malformed line, so one bad profile can't stop (or block resuming) the run
+            return {"line": number, "id": profile.get("id"), "plan": None,
+                    "error": f"invalid profile: {type(e).__name__}: {e}"}
+        tier = self.tiers["lite"] if request.simple and "lite" in self.tiers else self.tiers["standard"]
+        record = {
+            "line": number,
+            "id": profile.get("id"),
+            "model": tier.name,
+            "prompt_version": PROMPT_VERSION,
+            "cache_key": request.cache_key,
+        }
+        if self.prompts_only:
+            record["prompt"] = request.prompt
+            return record
+
+        def attempt():
+            self.limiter.acquire()
+            return tier.generate(request.prompt)
+
+        began = time.perf_counter()
+        try:
+            plan, usage = retry_call(attempt, attempts=self.retries)
+        except Exception as e:
+            record.update(plan=None, error=f"{type(e).__name__}: {e}")
+        else:
+            record.update(plan=plan, input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                          tokens_estimated=usage.estimated, error=None if plan and plan.strip() else "empty response")
+        record["latency_s"] = round(time.perf_counter() - began, 3)
+        return record
+
+
+class Stats:
+    def __init__(self):
+        self.done = 0
+        self.errors = 0
+        self.latencies = []
+        self.tokens = {}
+
+    def add(self, record):
+        self.done += 1
+        if record.get("error"):
+            self.errors += 1
+        if "latency_s" in record:
+            self.latencies.append(record["latency_s"])
+        if "input_tokens" in record:
+            totals = self.tokens.setdefault(record["model"], [0, 0])
+            totals[0] += record["input_tokens"]
+            totals[1] += record["output_tokens"]
+
+    def summary(self, elapsed):
+        lines = [f"{self.done} profiles in {elapsed:.1f}s ({self.done / elapsed if elapsed else 0:.2f}/s), "
+                 f"{self.errors} errors"]
+        if self.latencies:
+            values = sorted(self.latencies)
+            pct = lambda p: values[min(len(values) - 1, int(p * len(values)))]  # noqa: E731
+            lines.append(f"latency p50 {pct(0.50):.2f}s  p95 {pct(0.95):.2f}s  max {values[-1]:.2f}s")
+        for model, (tokens_in, tokens_out) in sorted(self.tokens.items()):
+            lines.append(f"{model}: {tokens_in} input / {tokens_out} output tokens")
+        return "\n".join(lines)
+
+
+def run(args, tiers):
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    state = None if args.restart else load_checkpoint(checkpoint_path)
+    if state and state.get("input") != os.path.abspath(args.input):
+        sys.exit(f"{checkpoint_path} belongs to {state.get('input')}; pass --restart to start over")
+    state = state or {"input": os.path.abspath(args.input), "lines_done": 0, "output_bytes": 0}
+    if state["lines_done"]:
+        print(f"Resuming after line {state['lines_done']}")
+
+    out = open(args.output, "a+b" if state["output_bytes"] else "wb")
+    # Drop anything written after the last checkpoint; those lines are redone
+    out.truncate(state["output_bytes"])
+    out.seek(state["output_bytes"])
+
+    runner = BatchRunner(tiers, RateLimiter(args.rate, args.burst), args.retries, args.prompts_only)
+    stats = Stats()
+    window = deque()  # (line_number, future) in input order; bounds memory to ~2x concurrency
+    began = time.perf_counter()
+
+    def write(number, record):
+        out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        stats.add(record)
+        state["lines_done"] = number
+        if stats.done % args.checkpoint_every == 0:
+            flush()
+
+    def flush():
+        out.flush()
+        os.fsync(out.fileno())
+        state["output_bytes"] = out.tell()
+        save_checkpoint(checkpoint_path, state)
+
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch")
+    try:
+        for number, profile, error in read_profiles(args.input, state["lines_done"]):
+            if error:
+                future = None
+                record = {"line": number, "id": None, "plan": None, "error": error}
+            else:
+                future = pool.submit(runner.run_one, number, profile)
+                record = None
+            window.append((number, future, record))
+            while len(window) > 2 * args.concurrency or (window and window[0][1] is None):
+                n, f, r = window.popleft()
+                write(n, r if f is None else f.result())
+        while window:
+            n, f, r = window.popleft()
+            write(n, r if f is None else f.result())
+    except KeyboardInterrupt:
+        print("Interrupted; saving progress")
+        pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        flush()
+        out.close()
+
+    print(stats.summary(time.perf_counter() - began))
+    print(f"Checkpoint: {checkpoint_path} ({state['lines_done']} lines done)")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Generate financial plans for a JSONL file of profiles.")
+    p.add_argument("input", help="JSONL file, one {age, income, expenses, goals[, id]} object per line")
+    p.add_argument("output", help="JSONL file to write plans to (appended to when resuming)")
+    p.add_argument("--concurrency", type=int, default=8, help="requests in flight at once (default 8)")
+    p.add_argument("--rate", type=float, default=2.0, help="max Gemini requests per second (default 2)")
+    p.add_argument("--burst", type=int, default=4, help="requests allowed back to back (default 4)")
+    p.add_argument("--retries", type=int, default=3, help="tries per profile on transient errors (default 3)")
+    p.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    p.add_argument("--checkpoint-every", type=int, default=50, help="save progress every N lines (default 50)")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    p.add_argument("--prompts-only", action="store_true",
+                   help="write the prompts and cache keys without calling Gemini (for prompt regression diffs)")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key and not args.prompts_only:
+        sys.exit("ERROR: GEMINI_API_KEY is not set")
+    run(args, model_tiers_from_env(SYSTEM_INSTRUCTION, api_key))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,237 +1,437 @@
 import os
-from dotenv import load_dotenv
 import telebot                           # Telegram Bot API library
-import google.generativeai as genai        # Google GenAI for generating content
-from flask import Flask
+from flask import Flask, Response, request, abort, jsonify
 import threading
 import time
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+import bot_common
+from bot_common import (BOT_MODE, BOT_TOKEN, FOLLOWUP_KEEP_TURNS, FOLLOWUP_TIER, FOLLOWUP_TOKEN_BUDGET, GEMINI_HEDGES,
+                        GEMINI_LATENCY, GEMINI_RETRY_ATTEMPTS, GEMINI_RETRY_BASE_DELAY, GEMINI_RETRY_MAX_DELAY,
+                        HEALTHZ_MAX_POLL_AGE, KEEP_WARM_INTERVAL, OUTBOX_MAX_ATTEMPTS, SHARD_WORKERS, TRACE_LOG,
+                        TRACE_LOG_BACKUPS, TRACE_LOG_MAX_BYTES, check_config, check_profile_request, followup_tiers,
+                        gemini_circuit, gemini_retry_logger, idle_connections, model_tiers, outbox, ping_gemini,
+                        profile_lock, record_outbound, record_usage, seconds_since, start_startup_profile, tracer,
+                        warm_models, webhook_authorized, webhook_settings)
+from conversation import PLAN_HEADER, Conversation
+from generation import GenerationPool
+from streaming import MessageStreamer
+from singleflight import SingleFlight
+from outbound import OutboundDispatcher
+from http_pool import ConnectionStats, make_session, warm_connections
+from outbox import OutboxSender
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from sharding import ShardRouter, shard_for
+from chat_executor import ChatExecutor
+import followup
+from profiler import folded, sample_stacks
+from resilience import LatencyWindow, hedged_call, is_retryable, retry_call
+
+# Point telebot at a self-hosted Bot API server instead of api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+if TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+
+# Every thread shares one keep-alive pool instead of telebot's session per thread (renewed every
+# 10 minutes, each renewal a new TLS handshake). Sized for the outbound workers plus polling.
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "0")) or int(os.getenv("OUTBOUND_WORKERS", "4")) + 2
+telegram_http = ConnectionStats()
+telebot.apihelper.session = make_session(TELEGRAM_API_URL or "https://api.telegram.org", TELEGRAM_POOL_SIZE,
+                                         telegram_http)
+telebot.apihelper.SESSION_TIME_TO_LIVE = None
+telebot.apihelper.CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+telebot.apihelper.READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "30"))
+
+
+UPDATE_QUEUE_WAIT = Histogram("finance_bot_update_queue_wait_seconds",
+                              "Time an update waited for a handler thread.")
+
+
+class FinanceBot(telebot.TeleBot):
+    """TeleBot that runs handlers on a ChatExecutor and remembers when it last polled and last
+    received an update, for /healthz and /metrics."""
+
+    last_poll_at = None
+    last_update_at = None
+
+    def __init__(self, token, handler_threads=4):
+        # Built unthreaded so telebot doesn't start its own pool, then given ours
+        super().__init__(token, threaded=False)
+        self.threaded = True
+        self.worker_pool = ChatExecutor(handler_threads, on_wait=UPDATE_QUEUE_WAIT.observe)
+
+    def get_updates(self, *args, **kwargs):
+        updates = super().get_updates(*args, **kwargs)
+        self.last_poll_at = time.time()
+        return updates
+
+    def process_new_updates(self, updates):
+        if updates:
+            self.last_update_at = time.time()
+        super().process_new_updates(updates)
 
-# Load local .env if present and read keys from environment
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Initialize the Telegram bot and Google GenAI model
-bot = telebot.TeleBot(BOT_TOKEN)
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.5-flash")
-
-# Dictionary to store conversation data for each user
-user_data = {}
-
-# Function to split long messages for Telegram
-def split_message(text, max_length=4000):
-    """Split long messages into chunks that fit Telegram's limit"""
-    if len(text) <= max_length:
-        return [text]
-    
-    chunks = []
-    current_chunk = ""
-    
-    # Split by sentences or lines
-    lines = text.split('\n')
-    
-    for line in lines:
-        if len(current_chunk + line + '\n') <= max_length:
-            current_chunk += line + '\n'
-        else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = line + '\n'
-            else:
-                # If single line is too long, split it
-                words = line.split(' ')
-                for word in words:
-                    if len(current_chunk + word + ' ') <= max_length:
-                        current_chunk += word + ' '
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                            current_chunk = word + ' '
-                        else:
-                            chunks.append(word)
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
-
-
-def is_conversation_active(user_id):
-    """Return True if the user has an active session stored in user_data."""
-    return user_id in user_data
-
-@bot.message_handler(commands=["start"])
-def start(message):
-    user_id = message.chat.id  # Unique identifier for the user
-    # initialize session with timestamp and state
-    user_data[user_id] = {"_ts": time.time(), "state": "awaiting_age"}
-
-    # Welcome message with an introduction to the financial planning bot
-    bot.send_message(
-        user_id,
-        "Welcome to Finance Bot!\n"
-        "Let's create a personalized financial plan for you.\n\n"
-        "First, share your age:"
+# Different chats are handled in parallel on BOT_HANDLER_THREADS threads; one chat's updates run in order
+bot = FinanceBot(BOT_TOKEN, handler_threads=int(os.getenv("BOT_HANDLER_THREADS", "4")))
+# Every outgoing Telegram call goes through this rate-limited, per-chat ordered queue
+outbound = OutboundDispatcher(
+    bot,
+    workers=int(os.getenv("OUTBOUND_WORKERS", "4")),
+    # Telegram's global limit is per bot, so each shard worker gets an equal share
+    global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")) / max(1, SHARD_WORKERS),
+    per_chat_rate=float(os.getenv("OUTBOUND_PER_CHAT_RATE", "1")),
+    per_chat_burst=int(os.getenv("OUTBOUND_PER_CHAT_BURST", "3")),
+    on_complete=record_outbound,
+)
+outbox_sender = OutboxSender(
+    outbox,
+    send=lambda chat_id, text: send_message(chat_id, text),
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+) if outbox else None
+
+# Hedging: a second identical request when the first is slower than the recent p95. Costs extra tokens, so off by default.
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0").lower() in ("1", "true", "yes")
+gemini_latencies = {name: LatencyWindow() for name in model_tiers}
+hedge_executor = ThreadPoolExecutor(
+    max_workers=2 * int(os.getenv("GENERATION_WORKERS", "4")), thread_name_prefix="gemini-hedge"
+) if GEMINI_HEDGE else None
+
+# Worker pool that runs Gemini generation off telebot's handler threads
+generation_pool = GenerationPool(
+    workers=int(os.getenv("GENERATION_WORKERS", "4")),
+    max_concurrency=int(os.getenv("GENERATION_MAX_CONCURRENCY", "0")) or None,
+    max_queue=int(os.getenv("GENERATION_QUEUE_SIZE", "100")),
+)
+
+# Stream Gemini output into a progressively edited message instead of waiting for the full plan
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "0").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Deduplicates identical Gemini requests that are in flight at the same time
+gemini_flight = SingleFlight()
+
+bot_common.register_runtime_metrics(bot, generation_pool, outbound, outbox_sender, telegram_http)
+Gauge("finance_bot_update_queue_depth", "Updates waiting for a handler thread.",
+      func=lambda: bot.worker_pool.stats()["queued"])
+Counter("finance_bot_gemini_calls_total", "Gemini requests, split into executed and coalesced.", ["result"],
+        func=lambda: {("executed",): gemini_flight.executed, ("shared",): gemini_flight.shared})
+
+def send_message(chat_id, text, **kwargs):
+    """Queue a message on the outbound dispatcher; returns a Future for the sent Message."""
+    return conversation.send_message(chat_id, text, **kwargs)
+
+def stream_plan(user_id, prompt, tier_name="standard"):
+    """Stream the plan into an edited message as Gemini produces it; returns the full text."""
+    streamer = MessageStreamer(
+        send=lambda chat_id, text: send_message(chat_id, text).result(),
+        edit=outbound.edit_message_text,
+        delete=outbound.delete_message,
+        chat_id=user_id,
+        header=PLAN_HEADER,
+        min_interval=STREAM_EDIT_INTERVAL,
     )
-    # Set the next handler to capture the age
-    bot.register_next_step_handler(message, get_age)
-
-def get_age(message):
-    user_id = message.chat.id
-    # ignore if there's no active session (user may have cancelled)
-    if not is_conversation_active(user_id):
-        bot.send_message(user_id, "No active session. Send /start to begin a new one.")
-        return
-
-    # update timestamp and state
-    user_data.setdefault(user_id, {})
-    user_data[user_id]["_ts"] = time.time()
-    user_data[user_id]["state"] = "awaiting_income"
-    user_data[user_id]["age"] = message.text  # Store the user's age
-
-    bot.send_message(user_id, "💸 What is your monthly income (in ₹)?")
-    bot.register_next_step_handler(message, get_income)
+    tier = model_tiers[tier_name]
 
-def get_income(message):
-    user_id = message.chat.id
-    if not is_conversation_active(user_id):
-        bot.send_message(user_id, "No active session. Send /start to begin a new one.")
-        return
-
-    user_data.setdefault(user_id, {})
-    user_data[user_id]["_ts"] = time.time()
-    user_data[user_id]["state"] = "awaiting_expenses"
-    user_data[user_id]["income"] = message.text  # Store the monthly income
+    def attempt():
+        with GEMINI_LATENCY.time(model=tier.name, mode="stream"):
+            for text in tier.stream(prompt, on_usage=lambda usage: record_usage(tier, usage)):
+                streamer.feed(text)
 
-    bot.send_message(user_id, "What are your monthly expenses (in ₹)?")
-    bot.register_next_step_handler(message, get_expenses)
-
-def get_expenses(message):
-    user_id = message.chat.id
-    if not is_conversation_active(user_id):
-        bot.send_message(user_id, "No active session. Send /start to begin a new one.")
+    # Once part of the plan is on screen a retry would repeat it, so only retry before the first chunk
+    try:
+        call_gemini(tier_name, attempt, retryable=lambda e: is_retryable(e) and not streamer.text)
+    except Exception:
+        # The fallback plan or the error message goes out instead of half a plan
+        streamer.discard()
+        raise
+    streamer.finish()
+    return streamer.text
+
+def call_gemini(tier_name, attempt, retryable=is_retryable):
+    """Run attempt() behind the model's circuit breaker, retrying transient errors with backoff."""
+    with gemini_circuit(tier_name):
+        return retry_call(attempt, GEMINI_RETRY_ATTEMPTS, GEMINI_RETRY_BASE_DELAY, GEMINI_RETRY_MAX_DELAY,
+                          retryable, gemini_retry_logger(model_tiers[tier_name]))
+
+def generate_plan_text(prompt, tier_name="standard"):
+    """Generate personalized financial advice using the GenAI model."""
+    tier, window = model_tiers[tier_name], gemini_latencies[tier_name]
+
+    def attempt():
+        began = time.perf_counter()
+        with GEMINI_LATENCY.time(model=tier.name, mode="full"):
+            text, usage = tier.generate(prompt)
+        window.add(time.perf_counter() - began)
+        record_usage(tier, usage)
+        return text
+
+    def hedged_attempt():
+        delay = window.percentile(0.95) if hedge_executor else None
+        text, hedge_won = hedged_call(hedge_executor, attempt, delay,
+                                      on_hedge=lambda: GEMINI_HEDGES.inc(model=tier.name, result="launched"))
+        if hedge_won:
+            GEMINI_HEDGES.inc(model=tier.name, result="won")
+        return text
+
+    return call_gemini(tier_name, hedged_attempt)
+
+def generate_and_send_plan(user_id, prompt, cache_key=None, fallback=None, tier_name="standard", queued_at=None):
+    """Runs on a generation worker: call Gemini and send the plan to the user."""
+    if queued_at is not None:
+        tracer.record("generation_queue", user_id, queued_at, time.time() - queued_at)
+        if not conversation.plan_job_current(user_id, queued_at):
+            return  # queued again, cancelled or expired while it waited
+    # Byte-identical prompts for the same model in flight at the same time share a single Gemini call
+    flight_key = hashlib.sha256(f"{tier_name}\0{prompt}".encode("utf-8")).hexdigest()
+    try:
+        with tracer.span("gemini", user_id, model=model_tiers[tier_name].name, stream=STREAM_RESPONSES) as span:
+            if STREAM_RESPONSES:
+                # The first caller streams to its own chat; concurrent duplicates get the finished text
+                plan_text, shared = gemini_flight.do(flight_key, stream_plan, user_id, prompt, tier_name)
+                streamed = not shared
+            else:
+                plan_text, shared = gemini_flight.do(flight_key, generate_plan_text, prompt, tier_name)
+                streamed = False
+            span["shared"] = shared
+    except Exception as e:
+        conversation.plan_failed(user_id, e, fallback)
         return
+    conversation.plan_generated(user_id, plan_text, cache_key, fallback, streamed)
 
-    user_data.setdefault(user_id, {})
-    user_data[user_id]["_ts"] = time.time()
-    user_data[user_id]["state"] = "awaiting_goals"
-    user_data[user_id]["expenses"] = message.text  # Store the monthly expenses
-
-    bot.send_message(
-        user_id,
-        "What are your financial goals?\n"
-        "(e.g., Buy a home, Child's education, Retirement, Tax saving):"
-    )
-    bot.register_next_step_handler(message, get_goals)
-
-def get_goals(message):
-    user_id = message.chat.id
-    if not is_conversation_active(user_id):
-        bot.send_message(user_id, "No active session. Send /start to begin a new one.")
-        return
+def followup_generate(prompt):
+    """Return the follow-up model's text for prompt, with retries and the circuit breaker."""
+    tier = followup_tiers[FOLLOWUP_TIER]
 
-    user_data.setdefault(user_id, {})
-    user_data[user_id]["_ts"] = time.time()
-    user_data[user_id]["state"] = "generating_advice"
-    user_data[user_id]["goals"] = message.text  # Store the financial goals
+    def attempt():
+        with GEMINI_LATENCY.time(model=tier.name, mode="followup"):
+            text, usage = tier.generate(prompt)
+        record_usage(tier, usage)
+        return text
 
-    # Retrieve all collected data for this user
-    data = user_data[user_id]
+    return call_gemini(FOLLOWUP_TIER, attempt)
 
-    # Calculate savings if possible
+def generate_follow_up(user_id, question, prompt):
+    """Runs on a generation worker: answer a follow-up question and add it to the user's window."""
     try:
-        savings = int(data['income']) - int(data['expenses'])
-    except:
-        savings = "Calculate manually"
-
-    # Build a concise prompt for the GenAI model
-    prompt = f"""
-    Act as a certified Indian financial advisor. Create a CONCISE personalized plan for a {data['age']}-year-old with:
-    - Monthly income: ₹{data['income']}
-    - Monthly expenses: ₹{data['expenses']}  
-    - Financial goals: {data['goals']}
-
-    Provide SHORT advice (max 2000 characters) with:
-    1. Monthly Savings: ₹{savings}
-    2. Goal Feasibility: Quick assessment
-    3. Top 2 Investment Options: Brief suggestions  
-    4. Budget Tip: One key recommendation
-    5. Action Plan: 3 simple steps
-
-    Keep it brief, use ₹ currency, avoid jargon. Format for Telegram (max 2000 chars).
-    """
-
-    try:
-        # Send a processing message to the user
-        bot.send_message(user_id, "🤖 Analyzing your financial data and generating personalized advice... Please wait a moment.")
-        
-        # Generate personalized financial advice using the GenAI model
-        response = model.generate_content(prompt)
-        
-        # Check if response has content
-        if response and response.text:
-            # Split the response into manageable chunks
-            full_response = f"📊 Your India-Focused Financial Plan\n\n{response.text}"
-            message_chunks = split_message(full_response)
-            
-            # Send each chunk as a separate message
-            for i, chunk in enumerate(message_chunks):
-                if i == 0:
-                    bot.send_message(user_id, chunk)
-                else:
-                    bot.send_message(user_id, f"📊 Continued...\n\n{chunk}")
-
-            # Conversation finished: clear session and confirm
-            user_data.pop(user_id, None)
-            bot.send_message(user_id, "✅ Done. Send /start if you want another personalized plan.")
-        else:
-            bot.send_message(user_id, "⚠️ No response generated. Please try again!")
-            
+        with tracer.span("gemini", user_id, model=followup_tiers[FOLLOWUP_TIER].name, mode="followup"):
+            answer = (followup_generate(prompt) or "").strip()
     except Exception as e:
-        # If there is an error during content generation, notify the user with more details
-        print(f"Error generating advice for user {user_id}: {str(e)}")
-        bot.send_message(user_id, f"⚠️ Error generating advice: {str(e)}\n\nPlease try again or contact support if this persists.")
-
-
-@bot.message_handler(commands=["cancel", "end", "stop"])
-def cancel_conversation(message):
-    user_id = message.chat.id
-    if user_data.pop(user_id, None):
-        bot.send_message(user_id, "🛑 Conversation ended. Send /start whenever you're ready to begin again.")
-    else:
-        bot.send_message(user_id, "No active conversation. Send /start to begin a new one.")
+        conversation.follow_up_failed(user_id, e)
+        answer = ""
+    session = conversation.follow_up_answered(user_id, question, answer)
+    if session is None:
+        return
+    # Summarizing happens after the answer is sent, so it never delays the reply itself
+    with tracer.span("followup_compress", user_id):
+        summary, turns = followup.compress(session["summary"], session["turns"], FOLLOWUP_TOKEN_BUDGET,
+                                           FOLLOWUP_KEEP_TURNS, followup_generate)
+    conversation.follow_up_summarized(user_id, session, summary, turns)
+
+conversation = Conversation(
+    send=outbound.send_message,
+    generation_pool=generation_pool,
+    generate_plan=generate_and_send_plan,
+    answer_question=generate_follow_up,
+    outbox_sender=outbox_sender,
+)
+for handler, filters in conversation.message_handlers():
+    bot.register_message_handler(handler, **filters)
+
+def cleanup_sessions(sleep_seconds=1.0):
+    """Background thread calling Conversation.expire_sessions every `sleep_seconds`."""
+    while True:
+        conversation.expire_sessions()
+        time.sleep(sleep_seconds)
+
+background_threads = {}
+shard_router = None
+
+def shard_worker(index, inbox):
+    """Body of a shard worker process: handle this shard's updates (in order per chat, via the ChatExecutor)."""
+    print(f"Shard worker {index} started (pid {os.getpid()})")
+    if TRACE_LOG:
+        # One file per process: rotating a file that other processes are writing to loses lines
+        tracer.open(f"{TRACE_LOG}.{index}", TRACE_LOG_MAX_BYTES, TRACE_LOG_BACKUPS)
+    start_startup_profile()
+    threading.Thread(target=warm_models, daemon=True).start()
+    start_connection_warmers()
+    if outbox_sender is not None:
+        # Every worker shares the outbox file but only delivers its own chats
+        outbox_sender.owns = lambda chat_id: shard_for(chat_id, SHARD_WORKERS) == index
+        outbox_sender.start()
+    conversation.resume_jobs(owns=lambda chat_id: shard_for(chat_id, SHARD_WORKERS) == index)
+    while True:
+        update = telebot.types.Update.de_json(inbox.get())
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            print(f"Shard worker {index} failed on update {update.update_id}: {e}")
+
+def start_shards():
+    global shard_router
+    shard_router = ShardRouter(shard_worker, SHARD_WORKERS)
+    shard_router.start()
+    Gauge("finance_bot_shard_queue_depth", "Updates waiting for each shard worker.", ["shard"],
+          func=lambda: {(str(i),): d for i, d in enumerate(shard_router.stats()["queue_depths"])})
+    Counter("finance_bot_shard_updates_total", "Updates routed to each shard worker.", ["shard"],
+            func=lambda: {(str(i),): n for i, n in enumerate(shard_router.stats()["routed"])})
+
+def run_sharded_polling():
+    """Receive updates here and hand each one to its chat's worker process."""
+    bot.remove_webhook()
+    offset = None
+    while True:
+        try:
+            # Raw dicts, not Update objects: they pickle cheaply and are parsed once, in the worker
+            updates = telebot.apihelper.get_updates(BOT_TOKEN, offset=offset, timeout=20, long_polling_timeout=20)
+        except Exception as e:
+            print(f"getUpdates failed: {e}")
+            time.sleep(3)
+            continue
+        bot.last_poll_at = time.time()
+        if updates:
+            bot.last_update_at = bot.last_poll_at
+        for update in updates:
+            offset = update["update_id"] + 1
+            shard_router.route(update)
 
 def run_bot():
+    # A webhook left over from an earlier deployment would make getUpdates fail
+    bot.remove_webhook()
     bot.infinity_polling()
 
+def setup_webhook():
+    bot.remove_webhook()
+    bot.set_webhook(**webhook_settings())
+
 app = Flask(__name__)
 
 @app.route("/")
 def health():
     return "Finance Bot is running"
 
+@app.route("/healthz")
+def healthz():
+    """Readiness: 503 when a background thread died or polling has stalled."""
+    checks = {name: t.is_alive() for name, t in background_threads.items()}
+    if shard_router is not None:
+        checks["shard_workers"] = shard_router.alive()
+    if BOT_MODE != "webhook":
+        poll_age = seconds_since(bot.last_poll_at)
+        checks["polling_fresh"] = 0 <= poll_age <= HEALTHZ_MAX_POLL_AGE
+    ok = all(checks.values())
+    return jsonify(status="ok" if ok else "unavailable", checks=checks), 200 if ok else 503
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profile")
+def debug_profile():
+    """Sample this process for ?seconds=N (at most 60) and return folded stacks for a flame graph."""
+    token = request.headers.get("X-Profile-Token") or request.args.get("token", "")
+    status, seconds = check_profile_request(token, request.args.get("seconds"))
+    if status != 200:
+        abort(status)
+    # One profile at a time; a second sampler would only add overhead to the first one's numbers
+    if not profile_lock.acquire(blocking=False):
+        abort(409)
+    try:
+        return Response(folded(sample_stacks(seconds)), mimetype="text/plain")
+    finally:
+        profile_lock.release()
+
+@app.route("/telegram/<secret>", methods=["POST"])
+def telegram_webhook(secret):
+    if BOT_MODE != "webhook":
+        abort(404)
+    if not webhook_authorized(secret, request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")):
+        abort(403)
+
+    if shard_router is not None:
+        try:
+            update = json.loads(request.get_data(as_text=True))
+        except ValueError:
+            abort(400)
+        if not isinstance(update, dict):
+            abort(400)
+        try:
+            shard_router.route(update)
+        except (KeyError, TypeError):
+            abort(400)
+        return ""
+
+    try:
+        update = telebot.types.Update.de_json(request.get_data(as_text=True))
+    except (ValueError, KeyError, TypeError):
+        update = None
+    if update is None:
+        abort(400)
+    # Handlers run on telebot's worker pool, so Telegram gets its 200 straight away
+    bot.process_new_updates([update])
+    return ""
+
+def telegram_url(method):
+    return (telebot.apihelper.API_URL or "https://api.telegram.org/bot{0}/{1}").format(BOT_TOKEN, method)
+
+def warm_telegram():
+    """Open a connection per outbound worker so the first burst of sends doesn't wait on handshakes."""
+    warm_connections(telebot.apihelper.session, telegram_url("getMe"), outbound.workers)
+
+def keep_connections_warm(interval=KEEP_WARM_INTERVAL):
+    """Background thread pinging whatever idle_connections() reports every `interval / 4` seconds."""
+    while True:
+        time.sleep(interval / 4)
+        telegram_idle, tiers = idle_connections(telegram_http, interval)
+        if telegram_idle:
+            warm_connections(telebot.apihelper.session, telegram_url("getMe"), 1)
+        for tier in tiers:
+            ping_gemini(tier)
+
+def start_connection_warmers():
+    threading.Thread(target=warm_telegram, daemon=True).start()
+    if KEEP_WARM_INTERVAL > 0:
+        t = threading.Thread(target=keep_connections_warm, daemon=True)
+        t.start()
+        return t
+
 if __name__ == "__main__":
-    # Start background cleanup thread to remove stale sessions
-    def cleanup_sessions(expiry_seconds=600, sleep_seconds=60):
-        while True:
-            now = time.time()
-            for uid, data in list(user_data.items()):
-                ts = data.get('_ts')
-                if ts and now - ts > expiry_seconds:
-                    user_data.pop(uid, None)
-                    try:
-                        bot.send_message(uid, "⏳ Your session timed out due to inactivity. Send /start to begin again.")
-                    except Exception:
-                        pass
-            time.sleep(sleep_seconds)
+    check_config(supports_shards=True)
+    start_startup_profile()
 
+    # Start background cleanup thread to remove stale sessions
     cleanup_thread = threading.Thread(target=cleanup_sessions, daemon=True)
     cleanup_thread.start()
+    background_threads["cleanup"] = cleanup_thread
 
-    # Start bot in background thread
-    t = threading.Thread(target=run_bot, daemon=True)
-    t.start()
+    keep_warm_thread = start_connection_warmers()
+    if keep_warm_thread is not None:
+        background_threads["keep_warm"] = keep_warm_thread
+
+    if SHARD_WORKERS > 1:
+        start_shards()
+    else:
+        if outbox_sender is not None:
+            # Delivers what's queued, including plans left unsent by the last run
+            background_threads["outbox"] = outbox_sender.start()
+        # Plans and answers the last run was still generating when it stopped
+        conversation.resume_jobs()
+
+    if BOT_MODE == "webhook":
+        # Telegram pushes updates to the Flask app below
+        setup_webhook()
+    else:
+        # Start bot in background thread
+        t = threading.Thread(target=run_sharded_polling if SHARD_WORKERS > 1 else run_bot, daemon=True)
+        t.start()
+        background_threads["polling"] = t
+
+    # Give the first update a head start on the GIL before the SDK import starts
+    warmup = threading.Timer(2.0, warm_models)
+    warmup.daemon = True
+    warmup.start()
 
     # Run the Flask web server on the port Render provides
     port = int(os.environ.get("PORT", 5000))
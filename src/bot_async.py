@@ -0,0 +1,361 @@
+"""Asyncio entry point: the same conversation as bot.py, on a single event loop.
+
+Telegram is reached through telebot's AsyncTeleBot (aiohttp), Gemini through
+the SDK's async API, and /, /healthz, /metrics and the webhook route are
+served by uvicorn as a plain ASGI app. A conversation waiting on the network
+is a suspended coroutine rather than a blocked thread, so thousands of them
+fit in one process. Run it instead of bot.py:
+
+    python src/bot_async.py
+
+The conversation itself (conversation.py) and the settings, metrics and
+components (bot_common.py) are shared with bot.py; this file only has the
+asyncio transport and the awaited Gemini calls. It reads the same environment
+variables as bot.py, TRACE_LOG and PROFILE_TOKEN included. STREAM_RESPONSES,
+GEMINI_HEDGE, SHARD_WORKERS and the thread counts (BOT_HANDLER_THREADS,
+GENERATION_WORKERS, OUTBOUND_WORKERS) don't apply here.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qs
+
+import aiohttp
+import uvicorn
+from telebot import asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+import bot_common
+import followup
+from async_outbound import AsyncOutboundDispatcher
+from bot_common import (BOT_MODE, BOT_TOKEN, FOLLOWUP_KEEP_TURNS, FOLLOWUP_TIER, FOLLOWUP_TOKEN_BUDGET, GEMINI_LATENCY,
+                        GEMINI_RETRY_ATTEMPTS, GEMINI_RETRY_BASE_DELAY, GEMINI_RETRY_MAX_DELAY, HEALTHZ_MAX_POLL_AGE,
+                        KEEP_WARM_INTERVAL, OUTBOX_MAX_ATTEMPTS, check_config, check_profile_request, followup_tiers,
+                        gemini_circuit, gemini_retry_logger, idle_connections, model_tiers, outbox, ping_gemini,
+                        profile_lock, record_outbound, record_usage, seconds_since, start_startup_profile, tracer,
+                        warm_models, webhook_authorized, webhook_settings)
+from conversation import Conversation
+from generation import AsyncGenerationPool
+from http_pool import ConnectionStats, aiohttp_trace_config
+from outbox import OutboxSender
+from metrics import REGISTRY
+from profiler import folded, sample_stacks
+from resilience import is_retryable, retry_call_async
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+if TELEGRAM_API_URL:
+    asyncio_helper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+
+# telebot's aiohttp session already keeps connections alive; this sizes the pool, bounds each request
+# and counts handshakes. Sends are tasks, not threads, so the pool is larger than bot.py's.
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "0")) or 50
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+asyncio_helper.REQUEST_TIMEOUT = TELEGRAM_CONNECT_TIMEOUT + float(os.getenv("TELEGRAM_READ_TIMEOUT", "30"))
+telegram_http = ConnectionStats()
+
+async def create_telegram_session():
+    connector = aiohttp.TCPConnector(limit=TELEGRAM_POOL_SIZE, ssl=asyncio_helper.session_manager.ssl_context)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[aiohttp_trace_config(telegram_http)],
+                                 timeout=aiohttp.ClientTimeout(sock_connect=TELEGRAM_CONNECT_TIMEOUT))
+
+asyncio_helper.session_manager.create_session = create_telegram_session
+
+
+class FinanceBot(AsyncTeleBot):
+    """AsyncTeleBot that remembers when it last polled and last received an update."""
+
+    last_poll_at = None
+    last_update_at = None
+
+    async def get_updates(self, *args, **kwargs):
+        updates = await super().get_updates(*args, **kwargs)
+        self.last_poll_at = time.time()
+        return updates
+
+    async def process_new_updates(self, updates):
+        if updates:
+            self.last_update_at = time.time()
+        await super().process_new_updates(updates)
+
+
+bot = FinanceBot(BOT_TOKEN)
+# Same limits as bot.py's OutboundDispatcher; a queued send is a task, not a thread
+outbound = AsyncOutboundDispatcher(
+    bot,
+    global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+    per_chat_rate=float(os.getenv("OUTBOUND_PER_CHAT_RATE", "1")),
+    per_chat_burst=int(os.getenv("OUTBOUND_PER_CHAT_BURST", "3")),
+    on_complete=record_outbound,
+)
+# The outbox sender is a thread (its SQLite calls stay off the loop) that hands each send to the loop
+outbox_sender = OutboxSender(
+    outbox,
+    send=lambda chat_id, text: tracer.track(asyncio.run_coroutine_threadsafe(
+        outbound.call(chat_id, bot.send_message, chat_id, text), event_loop), "send", chat_id, chars=len(text)),
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+) if outbox else None
+event_loop = None
+
+# Caps simultaneous Gemini calls; raising it costs no threads here
+generation_pool = AsyncGenerationPool(
+    max_concurrency=int(os.getenv("GENERATION_MAX_CONCURRENCY", "0")) or int(os.getenv("GENERATION_WORKERS", "4")),
+    max_queue=int(os.getenv("GENERATION_QUEUE_SIZE", "100")),
+)
+
+# Identical Gemini requests in flight at the same time share one call
+gemini_in_flight = {}
+
+# Fire-and-forget tasks (sends, webhook updates); referenced here until they finish
+pending_tasks = set()
+background_tasks = {}
+
+bot_common.register_runtime_metrics(bot, generation_pool, outbound, outbox_sender, telegram_http)
+
+def spawn(coro):
+    """Run coro as a task without waiting for it."""
+    task = asyncio.create_task(coro)
+    pending_tasks.add(task)
+    task.add_done_callback(pending_tasks.discard)
+    return task
+
+def send_message(chat_id, text, **kwargs):
+    """Queue a message on the outbound dispatcher; returns the Task that sends it.
+
+    Sends for one chat go out in the order they were queued, so handlers don't
+    need to wait for them.
+    """
+    return spawn(outbound.send_message(chat_id, text, **kwargs))
+
+async def call_gemini(tier_name, attempt, retryable=is_retryable):
+    """Await attempt() behind the model's circuit breaker, retrying transient errors with backoff."""
+    with gemini_circuit(tier_name):
+        return await retry_call_async(attempt, GEMINI_RETRY_ATTEMPTS, GEMINI_RETRY_BASE_DELAY, GEMINI_RETRY_MAX_DELAY,
+                                      retryable, gemini_retry_logger(model_tiers[tier_name]))
+
+async def generate_plan_text(prompt, tier_name="standard"):
+    """Generate personalized financial advice using the GenAI model."""
+    tier = model_tiers[tier_name]
+
+    async def attempt():
+        with GEMINI_LATENCY.time(model=tier.name, mode="full"):
+            text, usage = await tier.generate_async(prompt)
+        record_usage(tier, usage)
+        return text
+
+    return await call_gemini(tier_name, attempt)
+
+async def generate_plan_text_once(prompt, tier_name):
+    """generate_plan_text(), with concurrent identical requests sharing one call."""
+    key = hashlib.sha256(f"{tier_name}\0{prompt}".encode("utf-8")).hexdigest()
+    task = gemini_in_flight.get(key)
+    if task is None:
+        task = gemini_in_flight[key] = asyncio.ensure_future(generate_plan_text(prompt, tier_name))
+        task.add_done_callback(lambda _: gemini_in_flight.pop(key, None))
+    # shield: one waiter being cancelled must not cancel the call the others share
+    return await asyncio.shield(task)
+
+async def generate_and_send_plan(user_id, prompt, cache_key=None, fallback=None, tier_name="standard",
+                                 queued_at=None):
+    """Runs as a generation task: call Gemini and send the plan to the user."""
+    if queued_at is not None:
+        tracer.record("generation_queue", user_id, queued_at, time.time() - queued_at)
+        if not conversation.plan_job_current(user_id, queued_at):
+            return  # queued again, cancelled or expired while it waited
+    try:
+        with tracer.span("gemini", user_id, model=model_tiers[tier_name].name):
+            plan_text = await generate_plan_text_once(prompt, tier_name)
+    except Exception as e:
+        conversation.plan_failed(user_id, e, fallback)
+        return
+    conversation.plan_generated(user_id, plan_text, cache_key, fallback)
+
+async def followup_generate(prompt):
+    """Return the follow-up model's text for prompt, with retries and the circuit breaker."""
+    tier = followup_tiers[FOLLOWUP_TIER]
+
+    async def attempt():
+        with GEMINI_LATENCY.time(model=tier.name, mode="followup"):
+            text, usage = await tier.generate_async(prompt)
+        record_usage(tier, usage)
+        return text
+
+    return await call_gemini(FOLLOWUP_TIER, attempt)
+
+async def generate_follow_up(user_id, question, prompt):
+    """Runs as a generation task: answer a follow-up question and add it to the user's window."""
+    try:
+        with tracer.span("gemini", user_id, model=followup_tiers[FOLLOWUP_TIER].name, mode="followup"):
+            answer = (await followup_generate(prompt) or "").strip()
+    except Exception as e:
+        conversation.follow_up_failed(user_id, e)
+        answer = ""
+    session = conversation.follow_up_answered(user_id, question, answer)
+    if session is None:
+        return
+    with tracer.span("followup_compress", user_id):
+        summary, turns = await followup.compress_async(session["summary"], session["turns"], FOLLOWUP_TOKEN_BUDGET,
+                                                       FOLLOWUP_KEEP_TURNS, followup_generate)
+    conversation.follow_up_summarized(user_id, session, summary, turns)
+
+conversation = Conversation(
+    send=send_message,
+    generation_pool=generation_pool,
+    generate_plan=generate_and_send_plan,
+    answer_question=generate_follow_up,
+    outbox_sender=outbox_sender,
+)
+
+def register(handler, filters):
+    """Register a Conversation handler with AsyncTeleBot, which awaits its handlers."""
+    async def run(message):
+        handler(message)
+    bot.register_message_handler(run, **filters)
+
+for handler, filters in conversation.message_handlers():
+    register(handler, filters)
+
+async def cleanup_sessions(sleep_seconds=1.0):
+    """Background task calling Conversation.expire_sessions every `sleep_seconds`."""
+    while True:
+        conversation.expire_sessions()
+        await asyncio.sleep(sleep_seconds)
+
+async def run_bot():
+    # A webhook left over from an earlier deployment would make getUpdates fail
+    await bot.remove_webhook()
+    await bot.infinity_polling(timeout=20)
+
+async def setup_webhook():
+    await bot.remove_webhook()
+    await bot.set_webhook(**webhook_settings())
+
+def health_checks():
+    """Readiness: False when a background task died or polling has stalled."""
+    checks = {name: not task.done() for name, task in background_tasks.items()}
+    if outbox_sender is not None:
+        checks["outbox"] = outbox_sender.alive()
+    if BOT_MODE != "webhook":
+        poll_age = seconds_since(bot.last_poll_at)
+        checks["polling_fresh"] = 0 <= poll_age <= HEALTHZ_MAX_POLL_AGE
+    return all(checks.values()), checks
+
+async def telegram_webhook(secret, headers, body):
+    """Return the HTTP status for one webhook delivery; the update is handled in the background."""
+    if BOT_MODE != "webhook":
+        return 404
+    if not webhook_authorized(secret, headers.get(b"x-telegram-bot-api-secret-token", b"").decode("latin-1")):
+        return 403
+    try:
+        update = types.Update.de_json(body.decode("utf-8"))
+    except (ValueError, KeyError, TypeError):
+        update = None
+    if update is None:
+        return 400
+    # Telegram gets its 200 straight away
+    spawn(bot.process_new_updates([update]))
+    return 200
+
+async def debug_profile(query, headers):
+    """Sample the process for ?seconds=N (at most 60) on a worker thread; returns (status, folded stacks).
+
+    The event loop shows up as one thread, so the flame graph shows what runs
+    on (and blocks) the loop, not coroutines parked on an await.
+    """
+    params = parse_qs(query.decode("latin-1"))
+    token = headers.get(b"x-profile-token", b"").decode("latin-1") or params.get("token", [""])[0]
+    status, seconds = check_profile_request(token, params.get("seconds", [None])[0])
+    if status != 200:
+        return status, {400: "Bad Request", 403: "Forbidden", 404: "Not Found"}[status]
+    if not profile_lock.acquire(blocking=False):
+        return 409, "A profile is already running"
+    try:
+        return 200, folded(await asyncio.to_thread(sample_stacks, seconds))
+    finally:
+        profile_lock.release()
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if not event.get("more_body"):
+            return body
+
+async def _respond(send, status, body="", content_type="text/plain; charset=utf-8"):
+    data = body.encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(data)).encode())]})
+    await send({"type": "http.response.body", "body": data})
+
+async def app(scope, receive, send):
+    """The ASGI app uvicorn serves: health, readiness, metrics, the profiler and the Telegram webhook."""
+    if scope["type"] != "http":
+        return
+    path = scope["path"]
+    if path == "/":
+        await _respond(send, 200, "Finance Bot is running")
+    elif path == "/healthz":
+        ok, checks = health_checks()
+        await _respond(send, 200 if ok else 503, json.dumps({"checks": checks, "status": "ok" if ok else "unavailable"}),
+                       "application/json")
+    elif path == "/metrics":
+        await _respond(send, 200, REGISTRY.render(), "text/plain; version=0.0.4")
+    elif path == "/debug/profile":
+        status, body = await debug_profile(scope["query_string"], dict(scope["headers"]))
+        await _respond(send, status, body)
+    elif path.startswith("/telegram/") and scope["method"] == "POST":
+        status = await telegram_webhook(path[len("/telegram/"):], dict(scope["headers"]), await _read_body(receive))
+        await _respond(send, status)
+    else:
+        await _respond(send, 404, "Not Found")
+
+async def warm_models_later(delay=2.0):
+    # Give the first update a head start before the SDK import starts
+    await asyncio.sleep(delay)
+    await asyncio.to_thread(warm_models)
+
+async def warm_telegram(connections=4):
+    """Open a few connections so the first burst of sends doesn't wait on handshakes."""
+    results = await asyncio.gather(*(bot.get_me() for _ in range(connections)), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        print(f"Warming {connections} connection(s) failed: {errors[0]}")
+
+async def keep_connections_warm(interval=KEEP_WARM_INTERVAL):
+    """Background task pinging whatever idle_connections() reports; Gemini pings run on a worker thread."""
+    while True:
+        await asyncio.sleep(interval / 4)
+        telegram_idle, tiers = idle_connections(telegram_http, interval)
+        if telegram_idle:
+            await warm_telegram(1)
+        for tier in tiers:
+            await asyncio.to_thread(ping_gemini, tier)
+
+async def main():
+    global event_loop
+    check_config(supports_shards=False)
+    start_startup_profile()
+    event_loop = asyncio.get_running_loop()
+    if outbox_sender is not None:
+        outbox_sender.start()
+    # Plans and answers the last run was still generating when it stopped
+    conversation.resume_jobs()
+    background_tasks["cleanup"] = asyncio.create_task(cleanup_sessions())
+    if BOT_MODE == "webhook":
+        await setup_webhook()
+    else:
+        background_tasks["polling"] = asyncio.create_task(run_bot())
+    spawn(warm_models_later())
+    spawn(warm_telegram())
+    if KEEP_WARM_INTERVAL > 0:
+        background_tasks["keep_warm"] = asyncio.create_task(keep_connections_warm())
+
+    # Serve the HTTP routes on the port Render provides, on this same event loop
+    port = int(os.environ.get("PORT", 5000))
+    server = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=port, lifespan="off", log_level="warning"))
+    await server.serve()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,280 @@
+"""Settings, metrics and components shared by both entry points, bot.py (threads) and bot_async.py (asyncio).
+
+Everything here is independent of how Telegram and Gemini are reached:
+environment settings, the metrics on /metrics, the session store, plan
+cache, outbox, model tiers and their circuit breakers, and the tracer.
+The conversation itself is in conversation.py.
+"""
+import contextlib
+import os
+import secrets
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import followup
+import montecarlo
+from gemini_models import model_tiers_from_env
+from metrics import Counter, Gauge, Histogram
+from outbox import Outbox
+from plan_cache import PlanCache
+from plan_prompt import SYSTEM_INSTRUCTION
+from profiler import profile_to_file
+from resilience import CircuitBreaker, CircuitOpenError, is_retryable
+from sessions import SqliteSessionStore, make_session_store
+from tracing import Tracer
+
+# Load local .env if present and read keys from environment
+load_dotenv()
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Ping Telegram and Gemini after this many idle seconds so the next real call finds an open connection
+KEEP_WARM_INTERVAL = float(os.getenv("KEEP_WARM_INTERVAL", "240"))
+# Open the Gemini connection at startup (and keep it warm) with free count_tokens calls
+GEMINI_WARMUP = os.getenv("GEMINI_WARMUP", "1").lower() in ("1", "true", "yes")
+
+# "polling" (default, handy for local development) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+# Used both in the webhook path and as Telegram's secret_token header; allowed chars are A-Z a-z 0-9 _ -
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
+# Polling counts as stalled (and /healthz fails) when getUpdates hasn't returned for this long
+HEALTHZ_MAX_POLL_AGE = float(os.getenv("HEALTHZ_MAX_POLL_AGE", "90"))
+
+# Timing spans for every step of a conversation, as JSON lines in a rotating log (unset = off)
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 2**20)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "3"))
+tracer = Tracer(TRACE_LOG, TRACE_LOG_MAX_BYTES, TRACE_LOG_BACKUPS)
+# GET /debug/profile?seconds=N with this token samples the live process (unset = route disabled)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_MAX_SECONDS = 60
+# Sample the first N seconds after startup into PROFILE_OUTPUT ({pid} is replaced by the process id)
+PROFILE_ON_START = float(os.getenv("PROFILE_ON_START", "0"))
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT", "profile-{pid}.folded")
+profile_lock = threading.Lock()
+
+# Hot-path metrics served on /metrics; the same names in either runtime, so dashboards work with both
+GEMINI_LATENCY = Histogram("finance_bot_gemini_latency_seconds", "Gemini generate_content call time.", ["model", "mode"])
+GEMINI_RETRIES = Counter("finance_bot_gemini_retries_total", "Gemini calls retried after a transient error.", ["model"])
+GEMINI_HEDGES = Counter("finance_bot_gemini_hedges_total", "Hedged Gemini requests launched, and how many won.",
+                        ["model", "result"])
+GEMINI_TOKENS = Counter("finance_bot_gemini_tokens_total", "Gemini tokens by model and direction.", ["model", "kind"])
+HANDLER_LATENCY = Histogram("finance_bot_handler_latency_seconds", "Time spent in each Telegram handler.", ["handler"])
+SEND_LATENCY = Histogram("finance_bot_telegram_call_latency_seconds",
+                         "Time from queueing a Telegram call to its completion.", ["method"])
+PLANS_GENERATED = Counter("finance_bot_plans_total", "Plans delivered to users, by source.", ["source"])
+ERRORS = Counter("finance_bot_errors_total", "Errors by where they happened and exception type.", ["where", "type"])
+SESSIONS_EXPIRED = Counter("finance_bot_sessions_expired_total", "Sessions closed by the inactivity timeout.")
+
+# Plans are written to a SQLite outbox before they're sent, so a failed send or a restart resends
+# the stored chunks instead of losing them (or paying Gemini for the plan again)
+OUTBOX_DB = os.getenv("OUTBOX_DB", "")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+outbox = Outbox(OUTBOX_DB) if OUTBOX_DB else None
+LOG_TOKEN_USAGE = os.getenv("GEMINI_LOG_USAGE", "1").lower() in ("1", "true", "yes")
+
+# Simple profiles (figures computed locally, short goals) go to the cheaper lite model, if one is configured.
+# The Gemini SDK is only imported when a model is first needed (see ModelTier), keeping cold starts fast.
+model_tiers = model_tiers_from_env(SYSTEM_INSTRUCTION, GEMINI_API_KEY)
+
+# Transient Gemini errors (429/5xx, timeouts) are retried with jittered exponential backoff
+GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+# After this many consecutive failures a model's circuit opens and users get the calculator plan straight away
+breakers = {
+    name: CircuitBreaker(
+        failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+    )
+    for name in model_tiers
+}
+
+# Optional follow-up chat after the plan. Each user keeps the plan, a summary and a rolling window of
+# recent questions; once the window passes FOLLOWUP_TOKEN_BUDGET tokens, all but the last
+# FOLLOWUP_KEEP_TURNS turns are folded into the summary, so follow-up prompts stay small and bounded.
+FOLLOWUP_CHAT = os.getenv("FOLLOWUP_CHAT", "0").lower() in ("1", "true", "yes")
+FOLLOWUP_TOKEN_BUDGET = int(os.getenv("FOLLOWUP_TOKEN_BUDGET", "1000"))
+FOLLOWUP_KEEP_TURNS = int(os.getenv("FOLLOWUP_KEEP_TURNS", "2"))
+# Same models (and circuit breakers) as the plans, with the follow-up instruction; the lite model when there is one
+followup_tiers = model_tiers_from_env(followup.FOLLOWUP_INSTRUCTION, GEMINI_API_KEY)
+FOLLOWUP_TIER = "lite" if "lite" in followup_tiers else "standard"
+
+# Conversation data for each user; "memory" or "sqlite" (durable across restarts).
+# Session calls are quick and synchronous; with the sqlite backend they briefly block bot_async's loop.
+sessions = make_session_store(
+    backend=os.getenv("SESSION_BACKEND", "memory").strip().lower(),
+    ttl=float(os.getenv("SESSION_TTL", "600")),
+    path=os.getenv("SESSION_DB", "sessions.db"),
+)
+# A plan still being generated after this many seconds lost its job (e.g. to a restart) and is queued again
+PLAN_JOB_TIMEOUT = float(os.getenv("PLAN_JOB_TIMEOUT", "300"))
+
+# Cache of generated plans keyed on the normalized profile
+plan_cache = PlanCache(
+    max_size=int(os.getenv("PLAN_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("PLAN_CACHE_TTL", "86400")),
+    db_path=os.getenv("PLAN_CACHE_DB") or None,
+)
+
+def seconds_since(timestamp):
+    """Seconds since an epoch timestamp, or -1 when there is none yet."""
+    return time.time() - timestamp if timestamp else -1
+
+Gauge("finance_bot_active_sessions", "Conversations currently in progress.", func=lambda: len(sessions))
+Counter("finance_bot_plan_cache_lookups_total", "Plan cache lookups by result.", ["result"],
+        func=lambda: {("hit",): plan_cache.hits, ("miss",): plan_cache.misses})
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.OPEN: 1, CircuitBreaker.HALF_OPEN: 2}
+Gauge("finance_bot_gemini_circuit_state", "Gemini circuit breaker per model: 0 closed, 1 open, 2 half-open.", ["model"],
+      func=lambda: {(model_tiers[n].name,): _BREAKER_STATES[b.state] for n, b in breakers.items()})
+Counter("finance_bot_gemini_circuit_rejections_total", "Gemini calls skipped because the circuit was open.", ["model"],
+        func=lambda: {(model_tiers[n].name,): b.rejected for n, b in breakers.items()})
+
+def register_runtime_metrics(bot, generation_pool, outbound, outbox_sender, telegram_http):
+    """The /metrics gauges that read the runtime's own bot, queues and HTTP client."""
+    Gauge("finance_bot_generation_queue_depth", "Plan generation jobs by status.", ["status"],
+          func=lambda: {(k,): v for k, v in generation_pool.stats().items() if k in ("queued", "running")})
+    Gauge("finance_bot_outbound_queue_depth", "Telegram calls waiting to be sent.",
+          func=lambda: outbound.stats()["queue_depth"])
+    Gauge("finance_bot_last_update_age_seconds", "Seconds since the last update arrived (-1 if none yet).",
+          func=lambda: seconds_since(bot.last_update_at))
+    Gauge("finance_bot_last_poll_age_seconds", "Seconds since getUpdates last returned (-1 if not polling).",
+          func=lambda: seconds_since(bot.last_poll_at))
+    if outbox_sender is not None:
+        Gauge("finance_bot_outbox_pending", "Outbox messages not yet delivered.", func=outbox.pending)
+        Counter("finance_bot_outbox_messages_total", "Outbox deliveries by result.", ["result"],
+                func=lambda: {("sent",): outbox_sender.sent, ("retried",): outbox_sender.retried,
+                              ("failed",): outbox_sender.failed})
+    Counter("finance_bot_http_requests_total", "HTTP requests by client.", ["client"],
+            func=lambda: {("telegram",): telegram_http.requests})
+    Counter("finance_bot_http_connections_opened_total", "New connections (TCP and TLS handshakes) by client.",
+            ["client"], func=lambda: {("telegram",): telegram_http.connections})
+    Gauge("finance_bot_http_connection_reuse_ratio", "Share of requests sent on an already open connection.",
+          ["client"], func=lambda: {("telegram",): telegram_http.reuse_rate()})
+
+def record_outbound(method, seconds, error):
+    """on_complete hook for the outbound dispatchers."""
+    SEND_LATENCY.observe(seconds, method=method)
+    if error is not None:
+        ERRORS.inc(where="telegram", type=type(error).__name__)
+
+def record_usage(tier, usage):
+    """Count a request's tokens and log them."""
+    GEMINI_TOKENS.inc(usage.input_tokens, model=tier.name, kind="input")
+    GEMINI_TOKENS.inc(usage.output_tokens, model=tier.name, kind="output")
+    if LOG_TOKEN_USAGE:
+        estimated = " (estimated)" if usage.estimated else ""
+        print(f"Gemini {tier.name}: {usage.input_tokens} input / {usage.output_tokens} output tokens{estimated}")
+
+@contextlib.contextmanager
+def gemini_circuit(tier_name):
+    """Run one Gemini request (retries included) behind the model's circuit breaker."""
+    breaker = breakers[tier_name]
+    if not breaker.allow():
+        raise CircuitOpenError(f"{model_tiers[tier_name].name} is unavailable (circuit open)")
+    try:
+        yield
+    except Exception as e:
+        # Only outages count against the breaker; a blocked or malformed response means Gemini is up
+        if is_retryable(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+
+def gemini_retry_logger(tier):
+    """on_retry callback for retry_call(): count and log each retry."""
+    def on_retry(n, error, delay):
+        GEMINI_RETRIES.inc(model=tier.name)
+        print(f"Gemini {tier.name} failed ({error}); retry {n} in {delay:.1f}s")
+    return on_retry
+
+def webhook_authorized(path_secret, header_secret):
+    """True when both the /telegram/<secret> path and Telegram's secret header carry WEBHOOK_SECRET."""
+    # Bytes: compare_digest refuses str with non-ASCII characters, which anyone can put in the URL
+    expected = WEBHOOK_SECRET.encode()
+    return (secrets.compare_digest(path_secret.encode(), expected)
+            and secrets.compare_digest(header_secret.encode(), expected))
+
+def check_profile_request(token, seconds):
+    """Validate a /debug/profile request; returns (HTTP status, seconds to sample)."""
+    if not PROFILE_TOKEN:
+        return 404, None
+    if not secrets.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        return 403, None
+    try:
+        return 200, min(max(float(seconds or "10"), 0.1), PROFILE_MAX_SECONDS)
+    except ValueError:
+        return 400, None
+
+def start_startup_profile():
+    """With PROFILE_ON_START set, profile the next N seconds of this process into PROFILE_OUTPUT."""
+    if PROFILE_ON_START > 0:
+        path = PROFILE_OUTPUT.format(pid=os.getpid())
+        threading.Thread(target=profile_to_file, args=(PROFILE_ON_START, path), daemon=True).start()
+
+REQUIRED_ENV = ["BOT_TOKEN", "GEMINI_API_KEY"]
+
+# Worker processes that handle updates in bot.py (0 = handle them in this process). Conversations are
+# sharded by chat id so each chat always lands on the same worker; sessions must be in SQLite.
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+
+def check_config(supports_shards):
+    """Exit with a clear message when required settings are missing, before connecting to anything.
+
+    supports_shards: False for bot_async.py, which ignores SHARD_WORKERS.
+    """
+    problems = [f"{key} is not set" for key in REQUIRED_ENV if not os.getenv(key)]
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        problems.append("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    if SHARD_WORKERS > 1:
+        if not supports_shards:
+            print("WARNING: SHARD_WORKERS is ignored by bot_async.py; every chat is handled on its event loop.")
+        elif not isinstance(sessions, SqliteSessionStore):
+            problems.append("SHARD_WORKERS needs SESSION_BACKEND=sqlite so every worker sees the same sessions")
+    if problems:
+        print("ERROR: Invalid configuration:\n  " + "\n  ".join(problems))
+        print("Please set them in your environment or in Render's Dashboard under Environment.")
+        sys.exit(1)
+
+def webhook_settings():
+    """Arguments for set_webhook that point Telegram at our /telegram/<secret> route."""
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    if not os.getenv("WEBHOOK_SECRET"):
+        print("WARNING: WEBHOOK_SECRET is not set; using a random one (it changes on every restart).")
+    return {"url": f"{WEBHOOK_URL}/telegram/{WEBHOOK_SECRET}", "secret_token": WEBHOOK_SECRET}
+
+def gemini_tiers():
+    return list(model_tiers.values()) + ([followup_tiers[FOLLOWUP_TIER]] if FOLLOWUP_CHAT else [])
+
+def warm_models():
+    """Load the Gemini SDK in the background so the first plan doesn't pay for the import."""
+    for tier in gemini_tiers():
+        try:
+            tier.warm()
+            if GEMINI_WARMUP:
+                began = time.perf_counter()
+                tier.ping()
+                print(f"Gemini {tier.name} connected in {time.perf_counter() - began:.2f}s")
+        except Exception as e:
+            print(f"Could not initialise Gemini model {tier.name}: {e}")
+    # Draw the simulation's market paths now rather than during the first plan
+    montecarlo.default_simulator()
+
+def idle_connections(telegram_http, interval):
+    """What keeping connections warm should ping now: (Telegram idle for `interval` seconds, idle Gemini tiers)."""
+    tiers = [tier for tier in gemini_tiers() if tier.idle_seconds() >= interval] if GEMINI_WARMUP else []
+    return telegram_http.idle_seconds() >= interval, tiers
+
+def ping_gemini(tier):
+    try:
+        tier.ping()
+    except Exception as e:
+        print(f"Keeping Gemini {tier.name} warm failed: {e}")
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+
+
+def chat_key(args):
+    """Chat id of the update a telebot task was queued for (message or callback query), else None."""
+    if not args:
+        return None
+    update = args[0]
+    chat = getattr(update, "chat", None) or getattr(getattr(update, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "from_user", None)
+    return user.id if user is not None else None
+
+
+class _Chat:
+    __slots__ = ("jobs", "active")
+
+    def __init__(self):
+        self.jobs = deque()
+        self.active = False  # queued on the ready list or running on a worker
+
+
+class ChatExecutor:
+    """Drop-in replacement for telebot's worker pool with per-chat ordering.
+
+    Updates for different chats run in parallel on ``workers`` threads;
+    updates for one chat run strictly one after another, in arrival order.
+    A chat with a backlog goes to the back of the line after each update, so
+    one busy chat can't starve the others. ``on_wait(seconds)`` is called with
+    each update's time in the queue. A handler that raises is logged rather
+    than re-raised into the polling loop, so one bad update doesn't restart
+    polling for everyone.
+    """
+
+    def __init__(self, workers=4, on_wait=None, name="handler"):
+        self.workers = max(1, int(workers))
+        self.on_wait = on_wait
+        self.name = name
+        self._cond = threading.Condition()
+        self._chats = {}
+        self._ready = deque()
+        self._threads = []
+        self._pending = 0
+        self._running = True
+        # Attributes telebot's polling loop expects on its worker pool
+        self.exception_event = threading.Event()
+        self.exception_info = None
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def put(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) behind earlier tasks for the same chat."""
+        self.start()
+        key = chat_key(args)
+        if key is None:
+            key = object()  # no chat: nothing to order against
+        with self._cond:
+            chat = self._chats.get(key)
+            if chat is None:
+                chat = self._chats[key] = _Chat()
+            chat.jobs.append((func, args, kwargs, time.monotonic()))
+            self._pending += 1
+            if not chat.active:
+                chat.active = True
+                self._ready.append(key)
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {"queued": self._pending, "chats_waiting": len(self._ready), "workers": self.workers}
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ready:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                key = self._ready.popleft()
+                chat = self._chats[key]
+                func, args, kwargs, enqueued = chat.jobs.popleft()
+                self._pending -= 1
+
+            if self.on_wait is not None:
+                self.on_wait(time.monotonic() - enqueued)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"Handler {getattr(func, '__name__', func)} failed: {e}")
+
+            with self._cond:
+                if chat.jobs:
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._chats[key]
+
+    def raise_exceptions(self):
+        pass
+
+    def clear_exceptions(self):
+        self.exception_event.clear()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
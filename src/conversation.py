@@ -0,0 +1,425 @@
+import functools
+import queue
+import time
+
+import followup
+import montecarlo
+from bot_common import (ERRORS, FOLLOWUP_CHAT, FOLLOWUP_TIER, HANDLER_LATENCY, PLAN_JOB_TIMEOUT, PLANS_GENERATED,
+                        SESSIONS_EXPIRED, breakers, model_tiers, outbox, plan_cache, sessions, tracer)
+from plan_prompt import build_plan_request
+from profile_parser import PLAN_USAGE, missing_step, parse_profile, state_after
+from resilience import CircuitBreaker, CircuitOpenError
+from text_split import split_message
+
+PLAN_HEADER = "📊 Your India-Focused Financial Plan\n\n"
+
+
+def timed_handler(func):
+    """Record a handler's latency, its trace span and any exception it raises."""
+    @functools.wraps(func)
+    def wrapper(self, message):
+        with HANDLER_LATENCY.time(handler=func.__name__), \
+                tracer.span("handler", message.chat.id, handler=func.__name__):
+            try:
+                return func(self, message)
+            except Exception as e:
+                ERRORS.inc(where="handler", type=type(e).__name__)
+                raise
+    return wrapper
+
+
+class Conversation:
+    """The finance-plan conversation, shared by bot.py (threads) and bot_async.py (asyncio).
+
+    The runtime supplies the transport and the slow work:
+
+    - ``send(chat_id, text, **kwargs)`` queues a Telegram message and returns
+      its Future (or Task);
+    - ``generation_pool.submit`` runs ``generate_plan(user_id, prompt,
+      cache_key, fallback, tier_name, queued_at)`` and ``answer_question(user_id,
+      question, prompt)``, the jobs that call Gemini and then report back
+      through ``plan_generated``/``plan_failed`` and ``follow_up_answered``.
+
+    Everything here is quick and synchronous, so it runs as-is on a handler
+    thread or on the event loop.
+    """
+
+    def __init__(self, send, generation_pool, generate_plan, answer_question, outbox_sender=None):
+        self.send = send
+        self.generation_pool = generation_pool
+        self.generate_plan = generate_plan
+        self.answer_question = answer_question
+        self.outbox_sender = outbox_sender
+        # Which handler answers a text message, keyed on the session's "state" field. The state lives in
+        # the session store, so conversations survive restarts and nothing is registered per chat.
+        self.state_handlers = {
+            "awaiting_age": self.get_age,
+            "awaiting_income": self.get_income,
+            "awaiting_expenses": self.get_expenses,
+            "awaiting_goals": self.get_goals,
+            "generating_advice": self.waiting_for_plan,
+            "follow_up": self.answer_follow_up,
+            "answering_follow_up": self.waiting_for_answer,
+        }
+
+    def message_handlers(self):
+        """(handler, telebot filters) in registration order; the state router is last so commands win."""
+        return [
+            (self.start, {"commands": ["start"]}),
+            (self.quick_plan, {"commands": ["plan"]}),
+            (self.simulate, {"commands": ["simulate"]}),
+            (self.cancel_conversation, {"commands": ["cancel", "end", "stop"]}),
+            (self.route_by_state, {"func": lambda message: True}),
+        ]
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Queue a message through the runtime's transport; returns its Future or Task."""
+        return tracer.track(self.send(chat_id, text, **kwargs), "send", chat_id, chars=len(text))
+
+    @timed_handler
+    def start(self, message):
+        user_id = message.chat.id  # Unique identifier for the user
+        tracer.new_trace(user_id)
+        # initialize session with its state (the store tracks expiry)
+        sessions.create(user_id, state="awaiting_age")
+
+        # Welcome message with an introduction to the financial planning bot
+        self.send_message(
+            user_id,
+            "Welcome to Finance Bot!\n"
+            "Let's create a personalized financial plan for you.\n\n"
+            "First, share your age:"
+        )
+
+    @timed_handler
+    def quick_plan(self, message):
+        """/plan with the whole profile in one message; only the fields it lacks are asked for."""
+        user_id = message.chat.id
+        tracer.new_trace(user_id)
+        profile = parse_profile(message.text.partition(" ")[2])
+        step = missing_step(profile)
+        data = sessions.create(user_id, state=step[1] if step else "generating_advice", **profile)
+        if step is None:
+            self.request_plan(user_id, data)
+        elif profile:
+            self.send_message(user_id, step[2])
+        else:
+            # Nothing readable: carry on as the stepwise conversation
+            self.send_message(user_id, f"{PLAN_USAGE}\n\nOr answer step by step. {step[2]}")
+
+    def save_answer(self, message, field):
+        """Store one answer, then ask for the next missing field or, once the profile is complete, start the plan."""
+        user_id = message.chat.id
+        # Assume the next step in order; only a /plan that already answered it needs a second write
+        state = state_after(field)
+        # ignore if there's no active session (user may have cancelled)
+        data = sessions.update(user_id, state=state, **{field: message.text})
+        if data is None:
+            self.send_message(user_id, "No active session. Send /start to begin a new one.")
+            return
+        step = missing_step(data)
+        next_state = step[1] if step else "generating_advice"
+        if next_state != state:
+            data = sessions.update(user_id, state=next_state) or data
+        if step is None:
+            self.request_plan(user_id, data)
+        else:
+            self.send_message(user_id, step[2])
+
+    @timed_handler
+    def get_age(self, message):
+        self.save_answer(message, "age")
+
+    @timed_handler
+    def get_income(self, message):
+        self.save_answer(message, "income")
+
+    @timed_handler
+    def get_expenses(self, message):
+        self.save_answer(message, "expenses")
+
+    @timed_handler
+    def get_goals(self, message):
+        self.save_answer(message, "goals")
+
+    def choose_tier(self, plan_request):
+        """Use the lite model for simple profiles when one is configured."""
+        return "lite" if plan_request.simple and "lite" in model_tiers else "standard"
+
+    def request_plan(self, user_id, data):
+        """The profile is complete: answer from the cache or queue the plan for generation."""
+        # Same prompt, figures and cache key as the batch CLI builds
+        with tracer.span("build_prompt", user_id) as span:
+            plan_request = build_plan_request(data['age'], data['income'], data['expenses'], data['goals'])
+            span["chars"] = len(plan_request.prompt)
+        prompt, cache_key, fallback = plan_request.prompt, plan_request.cache_key, plan_request.fallback
+        tier = self.choose_tier(plan_request)
+
+        # Identical profiles get the same plan, so serve it from the cache when we can
+        with tracer.span("cache_lookup", user_id) as span:
+            cached_plan = plan_cache.get(cache_key)
+            span["hit"] = bool(cached_plan)
+        if cached_plan:
+            PLANS_GENERATED.inc(source="cache")
+            self.send_plan(user_id, cached_plan)
+            return
+
+        # Gemini is down: don't make the user wait in the queue for a call that would be refused
+        if breakers[tier].state == CircuitBreaker.OPEN:
+            self.serve_without_gemini(user_id, fallback)
+            return
+
+        # Send a processing message to the user
+        self.send_message(user_id, "🤖 Analyzing your financial data and generating personalized advice... "
+                                   "Please wait a moment.")
+
+        # Hand the slow Gemini call to the generation pool so this handler is freed. The session remembers
+        # when, so a job lost to a restart can be told apart from one that is still waiting.
+        queued_at = time.time()
+        sessions.update(user_id, plan_queued_at=queued_at)
+        try:
+            ahead = self.generation_pool.submit(self.generate_plan, user_id, prompt, cache_key, fallback, tier,
+                                                queued_at)
+        except queue.Full:
+            sessions.update(user_id, state="awaiting_goals")
+            self.send_message(user_id, "🚦 We're handling a lot of requests right now. "
+                                       "Please send your goals again in a minute.")
+            return
+
+        if ahead > 0:
+            self.send_message(user_id, f"⏳ You're #{ahead + 1} in the queue. "
+                                       "Your plan will arrive here as soon as it's ready.")
+
+    def plan_job_current(self, user_id, queued_at):
+        """False when the plan job queued at queued_at was queued again, cancelled or expired while it waited."""
+        session = sessions.get(user_id)
+        return (session is not None and session.get("state") == "generating_advice"
+                and session.get("plan_queued_at") == queued_at)
+
+    def resume_jobs(self, owns=lambda user_id: True):
+        """Pick up the Gemini jobs the last run accepted but never finished (sessions in SQLite survive it).
+
+        Plans are queued again; a follow-up question can't be, so its user is asked to repeat it. One
+        session that fails to resume is reset and logged rather than stopping startup.
+        """
+        try:
+            plans = sessions.in_state("generating_advice")
+            questions = sessions.in_state("answering_follow_up")
+        except Exception as e:
+            print(f"Could not look for unfinished jobs: {e}")
+            ERRORS.inc(where="resume", type=type(e).__name__)
+            return
+        for user_id, session in plans.items():
+            if owns(user_id):
+                print(f"Resuming the plan for user {user_id} after a restart")
+                self.resume(user_id, self.plan_lost, self.request_plan, user_id, session)
+        for user_id in questions:
+            if owns(user_id):
+                self.resume(user_id, self.answer_lost, self.answer_lost, user_id)
+
+    def resume(self, user_id, reset, job, *args):
+        """Run job(*args); if it fails, log it and reset(user_id) so the user isn't left waiting."""
+        try:
+            job(*args)
+        except Exception as e:
+            print(f"Resuming user {user_id} failed: {e}")
+            ERRORS.inc(where="resume", type=type(e).__name__)
+            try:
+                reset(user_id)
+            except Exception as e:
+                print(f"Resetting user {user_id} failed: {e}")
+
+    def plan_lost(self, user_id):
+        sessions.update(user_id, state="awaiting_goals")
+        self.send_message(user_id, "⚠️ We couldn't finish your plan. Please send your goals again.")
+
+    def answer_lost(self, user_id):
+        sessions.update(user_id, state="follow_up")
+        self.send_message(user_id, "⚠️ I lost track of your last question. Please ask it again.")
+
+    def finish_conversation(self, user_id, plan_text=None):
+        """Close the session once the plan is out; returns the closing message to send."""
+        # With follow-up chat on, keep the plan so the user can ask about it
+        if FOLLOWUP_CHAT and plan_text:
+            plan = plan_text[:followup.PLAN_CONTEXT_CHARS]
+            if sessions.update(user_id, state="follow_up", plan=plan, summary="", turns=[]) is not None:
+                return "✅ Done. Ask me anything about your plan, or send /cancel to finish."
+        # Conversation finished: clear session and confirm
+        sessions.delete(user_id)
+        return "✅ Done. Send /start if you want another personalized plan."
+
+    def deliver(self, user_id, texts):
+        """Send messages in order, through the outbox when OUTBOX_DB is set."""
+        if outbox is None:
+            for text in texts:
+                self.send_message(user_id, text)
+            return
+        outbox.enqueue(user_id, texts)
+        self.outbox_sender.wake()
+
+    def send_plan(self, user_id, plan_text):
+        """Send a generated plan in Telegram-sized chunks and close the session."""
+        with tracer.span("split", user_id) as span:
+            message_chunks = split_message(f"{PLAN_HEADER}{plan_text}")
+            span["chunks"] = len(message_chunks)
+
+        # Store the plan before closing the session, so a crash in between can't lose it
+        self.deliver(user_id, message_chunks)
+        self.deliver(user_id, [self.finish_conversation(user_id, plan_text)])
+
+    def serve_without_gemini(self, user_id, fallback):
+        """Gemini's circuit is open: send the calculator plan, or ask the user to come back."""
+        if fallback:
+            self.send_fallback_plan(user_id, fallback)
+            return
+        sessions.update(user_id, state="awaiting_goals")
+        self.send_message(user_id, "⚠️ Our AI advisor is temporarily unavailable. "
+                                   "Please send your goals again in a few minutes.")
+
+    def send_fallback_plan(self, user_id, fallback):
+        """Send the calculator-only plan when Gemini can't produce one."""
+        PLANS_GENERATED.inc(source="fallback")
+        self.send_message(user_id, "⚠️ Our AI advisor is unavailable right now, so here is a plan from our calculator.")
+        self.send_plan(user_id, fallback)
+
+    def plan_generated(self, user_id, plan_text, cache_key=None, fallback=None, streamed=False):
+        """Gemini answered: send the plan (a streamed one is already on screen) or fall back on an empty answer."""
+        if not (plan_text and plan_text.strip()):
+            ERRORS.inc(where="gemini", type="EmptyResponse")
+            if fallback:
+                self.send_fallback_plan(user_id, fallback)
+            else:
+                # Let the user retry by sending their goals again
+                sessions.update(user_id, state="awaiting_goals")
+                self.send_message(user_id, "⚠️ No response generated. Please try again!")
+            return
+
+        PLANS_GENERATED.inc(source="gemini")
+        if cache_key:
+            try:
+                plan_cache.put(cache_key, plan_text)
+            except Exception as e:
+                # e.g. "database is locked": the user still gets the plan, only the next lookup misses
+                print(f"Caching the plan for user {user_id} failed: {e}")
+                ERRORS.inc(where="plan_cache", type=type(e).__name__)
+        if streamed:
+            self.send_message(user_id, self.finish_conversation(user_id, plan_text))
+        else:
+            self.send_plan(user_id, plan_text)
+
+    def plan_failed(self, user_id, error, fallback=None):
+        """Gemini couldn't produce a plan: send the calculator plan, or tell the user to retry."""
+        if isinstance(error, CircuitOpenError):
+            print(f"Skipping Gemini for user {user_id}: {error}")
+            self.serve_without_gemini(user_id, fallback)
+            return
+        # If there is an error during content generation, notify the user with more details
+        print(f"Error generating advice for user {user_id}: {str(error)}")
+        ERRORS.inc(where="gemini", type=type(error).__name__)
+        if fallback:
+            self.send_fallback_plan(user_id, fallback)
+            return
+        sessions.update(user_id, state="awaiting_goals")
+        self.send_message(user_id, f"⚠️ Error generating advice: {str(error)}\n\n"
+                                   "Please try again or contact support if this persists.")
+
+    @timed_handler
+    def answer_follow_up(self, message):
+        user_id = message.chat.id
+        data = sessions.update(user_id, state="answering_follow_up", question_asked_at=time.time())
+        if data is None:
+            self.send_message(user_id, "No active session. Send /start to begin a new one.")
+            return
+
+        if breakers[FOLLOWUP_TIER].state == CircuitBreaker.OPEN:
+            sessions.update(user_id, state="follow_up")
+            self.send_message(user_id, "⚠️ Our AI advisor is temporarily unavailable. Please ask again in a few minutes.")
+            return
+
+        # The prompt carries the plan, the summary and the recent turns, never the whole conversation
+        prompt = followup.build_followup_prompt(data["plan"], data["summary"], data["turns"], message.text)
+        try:
+            self.generation_pool.submit(self.answer_question, user_id, message.text, prompt)
+        except queue.Full:
+            sessions.update(user_id, state="follow_up")
+            self.send_message(user_id, "🚦 We're handling a lot of requests right now. Please ask again in a minute.")
+
+    def follow_up_failed(self, user_id, error):
+        print(f"Error answering follow-up for user {user_id}: {str(error)}")
+        ERRORS.inc(where="followup", type=type(error).__name__)
+
+    def follow_up_answered(self, user_id, question, answer):
+        """Send a follow-up answer and record the turn; returns the session to summarize afterwards, or None."""
+        if not answer:
+            sessions.update(user_id, state="follow_up")
+            self.send_message(user_id, "⚠️ I couldn't answer that right now. Please ask again, or send /cancel to finish.")
+            return None
+
+        for chunk in split_message(answer):
+            self.send_message(user_id, chunk)
+
+        session = sessions.get(user_id)
+        if session is None or session.get("state") != "answering_follow_up":
+            return None  # cancelled, expired or restarted while we were answering
+        # The user can ask the next question now; summarizing older turns may take another Gemini call
+        return sessions.update(user_id, state="follow_up", turns=session["turns"] + [[question, answer]])
+
+    def follow_up_summarized(self, user_id, before, summary, turns):
+        """Store the summary compress() made from the session `before`, keeping turns recorded since."""
+        session = sessions.get(user_id)
+        if session is None or session.get("summary") != before["summary"]:
+            return  # the conversation ended, or another summary got there first
+        current = session.get("turns", [])
+        if current[:len(before["turns"])] != before["turns"]:
+            return
+        sessions.update(user_id, summary=summary, turns=turns + current[len(before["turns"]):])
+
+    @timed_handler
+    def simulate(self, message):
+        user_id = message.chat.id
+        # /simulate <age> <income> <expenses> <goals>, or the answers given so far in the conversation
+        args = message.text.partition(" ")[2]
+        self.send_message(user_id, montecarlo.simulate_reply(args, sessions.get(user_id)))
+
+    @timed_handler
+    def cancel_conversation(self, message):
+        user_id = message.chat.id
+        if sessions.delete(user_id) is not None:
+            self.send_message(user_id, "🛑 Conversation ended. Send /start whenever you're ready to begin again.")
+        else:
+            self.send_message(user_id, "No active conversation. Send /start to begin a new one.")
+
+    def waiting_for_plan(self, message):
+        user_id = message.chat.id
+        session = sessions.get(user_id)
+        if session is not None and time.time() - session.get("plan_queued_at", 0) > PLAN_JOB_TIMEOUT:
+            print(f"The plan for user {user_id} never arrived; queueing it again")
+            self.request_plan(user_id, session)
+            return
+        self.send_message(user_id, "⏳ Your plan is still being prepared. It will arrive here shortly.")
+
+    def waiting_for_answer(self, message):
+        user_id = message.chat.id
+        session = sessions.get(user_id)
+        if session is not None and time.time() - session.get("question_asked_at", 0) > PLAN_JOB_TIMEOUT:
+            print(f"The answer for user {user_id} never arrived")
+            self.answer_lost(user_id)
+            return
+        self.send_message(user_id, "⏳ Still working on your previous question. Ask again once it's answered.")
+
+    def route_by_state(self, message):
+        session = sessions.get(message.chat.id)
+        handler = self.state_handlers.get(session.get("state")) if session else None
+        if handler is None:
+            self.send_message(message.chat.id, "No active session. Send /start to begin a new one.")
+            return
+        handler(message)
+
+    def expire_sessions(self):
+        """One sweep of the session store: tell each user whose session timed out."""
+        for uid in sessions.expire():
+            SESSIONS_EXPIRED.inc()
+            try:
+                self.send_message(uid, "⏳ Your session timed out due to inactivity. Send /start to begin again.")
+            except Exception:
+                pass
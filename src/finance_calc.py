@@ -0,0 +1,196 @@
+import math
+import re
+
+import numpy as np
+
+# Annual return assumptions used for the SIP projections
+RETURN_SCENARIOS = (
+    ("Conservative (FD/debt)", 0.07),
+    ("Balanced (hybrid)", 0.10),
+    ("Growth (equity)", 0.12),
+)
+HORIZON_YEARS = (5, 10, 20)
+INFLATION = 0.06
+RETIREMENT_AGE = 60
+EMERGENCY_FUND_MONTHS = 6
+# Anything larger is a typo, not a monthly amount; it would also overflow the projections
+MAX_AMOUNT = 1e15
+
+_MULTIPLIERS = {
+    "k": 1e3, "thousand": 1e3,
+    "l": 1e5, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+    "m": 1e6, "mn": 1e6, "million": 1e6,
+}
+_AMOUNT = re.compile(
+    # (?!\d|\.\d): the number can't give back digits to satisfy (?![a-z]), which read "50000x" as 5000
+    r"(\d+(?:\.\d+)?)(?!\d|\.\d)\s*(thousand|lakhs|lakh|lacs|lac|crores|crore|cr|million|mn|k|l|m)?(?![a-z])"
+)
+
+
+def parse_amount(text):
+    """Parse Indian-style amounts: '50000', '50k', '₹1,20,000', '1.2 lakh', '2 cr', '50000rs'.
+
+    Returns a float, or None for text without an amount or one that isn't finite and below MAX_AMOUNT.
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return _checked(float(text))
+    cleaned = str(text).lower().replace("₹", " ")
+    # Currency before or after the number, spaced or not: "rs 500", "rs.500", "50000rs", "45000INR"
+    cleaned = re.sub(r"(?<![a-z])(?:rs|inr|rupees|rupee)\.?(?![a-z])", " ", cleaned)
+    # Drop digit-group commas (both 1,20,000 and 120,000 styles)
+    cleaned = re.sub(r"(?<=\d),(?=\d)", "", cleaned)
+    match = _AMOUNT.search(cleaned)
+    if not match:
+        return None
+    value = float(match.group(1))
+    unit = match.group(2)
+    return _checked(value * _MULTIPLIERS[unit] if unit else value)
+
+
+def _checked(value):
+    return value if math.isfinite(value) and abs(value) <= MAX_AMOUNT else None
+
+
+def parse_age(text):
+    """First plausible age (1-120) in text, or None."""
+    match = re.search(r"\d{1,3}", str(text))
+    if not match:
+        return None
+    age = int(match.group())
+    return age if 0 < age <= 120 else None
+
+
+def format_inr(amount):
+    """Format a rupee amount with Indian digit grouping: 1234567 -> '₹12,34,567'."""
+    sign = "-" if amount < 0 else ""
+    digits = str(int(round(abs(amount))))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ",".join(groups) + "," + tail
+    return f"{sign}₹{digits}"
+
+
+def sip_future_value(monthly, annual_rates, years):
+    """Future value of a monthly SIP for every (rate, horizon) pair as a rates x years array."""
+    rates = np.asarray(annual_rates, dtype=float).reshape(-1, 1)
+    months = np.asarray(years, dtype=float).reshape(1, -1) * 12
+    r = (1 + rates) ** (1 / 12) - 1
+    return monthly * ((1 + r) ** months - 1) / r * (1 + r)
+
+
+def compute_figures(age, income, expenses):
+    """Deterministic numbers for a plan, or None if income/expenses can't be parsed."""
+    income_value = parse_amount(income)
+    expenses_value = parse_amount(expenses)
+    if income_value is None or expenses_value is None:
+        return None
+    age_value = parse_age(age)
+    savings = income_value - expenses_value
+    emergency_target = expenses_value * EMERGENCY_FUND_MONTHS
+
+    figures = {
+        "age": age_value,
+        "income": income_value,
+        "expenses": expenses_value,
+        "savings": savings,
+        "savings_rate": savings / income_value if income_value else 0.0,
+        "emergency_target": emergency_target,
+        "emergency_months": math.ceil(emergency_target / savings) if savings > 0 else None,
+        "projections": None,
+        "retirement": None,
+    }
+    if savings <= 0:
+        return figures
+
+    names = [name for name, _ in RETURN_SCENARIOS]
+    rates = [rate for _, rate in RETURN_SCENARIOS]
+    grid = sip_future_value(savings, rates, HORIZON_YEARS)
+    figures["projections"] = {
+        name: dict(zip(HORIZON_YEARS, row.tolist())) for name, row in zip(names, grid)
+    }
+
+    if age_value is not None and age_value < RETIREMENT_AGE:
+        years_left = RETIREMENT_AGE - age_value
+        # 25x the inflation-adjusted annual expenses at retirement (the "4% rule")
+        needed = expenses_value * 12 * (1 + INFLATION) ** years_left * 25
+        projected = sip_future_value(savings, rates, [years_left])[:, 0]
+        figures["retirement"] = {
+            "years_left": years_left,
+            "needed": needed,
+            "projected": dict(zip(names, projected.tolist())),
+        }
+    return figures
+
+
+def figures_for_prompt(figures):
+    """Render the computed figures as a compact block for the Gemini prompt."""
+    lines = [
+        f"- Monthly savings: {format_inr(figures['savings'])} ({figures['savings_rate']:.0%} of income)",
+        f"- Emergency fund target ({EMERGENCY_FUND_MONTHS} months of expenses): {format_inr(figures['emergency_target'])}"
+        + (f", reachable in {figures['emergency_months']} months" if figures["emergency_months"] else ""),
+    ]
+    if figures["projections"]:
+        lines.append("- Investing the full savings as a monthly SIP grows to:")
+        for name, by_year in figures["projections"].items():
+            values = ", ".join(f"{years}y {format_inr(value)}" for years, value in by_year.items())
+            lines.append(f"  - {name}: {values}")
+    retirement = figures["retirement"]
+    if retirement:
+        balanced = retirement["projected"][RETURN_SCENARIOS[1][0]]
+        if retirement["needed"]:
+            lines.append(
+                f"- Retirement at {RETIREMENT_AGE} ({retirement['years_left']} years): needs about "
+                f"{format_inr(retirement['needed'])}; balanced SIP reaches {format_inr(balanced)} "
+                f"({balanced / retirement['needed']:.0%} of target)"
+            )
+        else:
+            # No expenses today means no inflation-adjusted target to measure against
+            lines.append(
+                f"- Retirement at {RETIREMENT_AGE} ({retirement['years_left']} years): no target from current "
+                f"expenses (0); balanced SIP reaches {format_inr(balanced)}"
+            )
+    return "\n".join(lines)
+
+
+def template_plan(figures, goals):
+    """A calculator-only plan used when Gemini is unavailable."""
+    savings = figures["savings"]
+    parts = [f"1. Monthly Savings: {format_inr(savings)} ({figures['savings_rate']:.0%} of income)"]
+    if savings <= 0:
+        parts.append("2. Goal Feasibility: Your expenses match or exceed your income, so your goals "
+                     f"({goals}) need a budget fix first.")
+        parts.append("3. Top 2 Investment Options: Hold off on investing until you have a monthly surplus.")
+        parts.append("4. Budget Tip: List every expense and cut the largest non-essential ones until you save at least 10% of income.")
+        parts.append(f"5. Action Plan:\n- Track spending for 30 days\n- Cut expenses to create a surplus\n"
+                     f"- Build an emergency fund of {format_inr(figures['emergency_target'])}")
+        return "\n\n".join(parts)
+
+    retirement = figures["retirement"]
+    if retirement:
+        balanced = retirement["projected"][RETURN_SCENARIOS[1][0]]
+        feasibility = f"Investing your full savings could build {format_inr(balanced)} by {RETIREMENT_AGE}"
+        if retirement["needed"]:
+            share = balanced / retirement["needed"]
+            feasibility += f", {share:.0%} of the ~{format_inr(retirement['needed'])} retirement target."
+        else:
+            feasibility += ". Size your retirement target once your own monthly expenses start."
+    else:
+        ten_year = figures["projections"][RETURN_SCENARIOS[1][0]][10]
+        feasibility = f"Investing your full savings could build about {format_inr(ten_year)} in 10 years."
+    parts.append(f"2. Goal Feasibility ({goals}): {feasibility}")
+    parts.append("3. Top 2 Investment Options: Equity index fund SIP for long-term goals; PPF or debt funds for stability.")
+    parts.append(f"4. Budget Tip: Keep saving at least {max(20, round(figures['savings_rate'] * 100))}% of income and automate it on payday.")
+    emergency = f"- Build an emergency fund of {format_inr(figures['emergency_target'])}"
+    if figures["emergency_months"]:
+        emergency += f" (about {figures['emergency_months']} months)"
+    parts.append(f"5. Action Plan:\n{emergency}\n- Start a SIP with the remaining surplus\n- Review and step up the SIP every year")
+    return "\n\n".join(parts)
@@ -0,0 +1,81 @@
+from gemini_models import estimate_tokens
+
+# System instruction for answering questions about a plan the user already has
+FOLLOWUP_INSTRUCTION = """You are a certified Indian financial advisor answering follow-up questions about a plan
+you already gave this user. Answer only what was asked, in at most 800 characters, use ₹ currency and avoid jargon.
+If the question needs numbers the plan doesn't have, say what you would need to know."""
+
+# Keeps the stored plan and summary small, whatever the model returned
+PLAN_CONTEXT_CHARS = 4000
+SUMMARY_MAX_CHARS = 1000
+
+
+def turns_tokens(summary, turns):
+    """Estimated tokens of the rolling context (summary plus question/answer turns)."""
+    return estimate_tokens(summary) + sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns)
+
+
+def build_followup_prompt(plan, summary, turns, question):
+    parts = [f"The plan you gave this user:\n{plan}"]
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    for q, a in turns:
+        parts.append(f"User: {q}\nYou: {a}")
+    parts.append(f"User: {question}\nYou:")
+    return "\n\n".join(parts)
+
+
+def build_summary_prompt(summary, turns):
+    conversation = "\n\n".join(f"User: {q}\nAdvisor: {a}" for q, a in turns)
+    earlier = f"Earlier summary:\n{summary}\n\n" if summary else ""
+    return (f"{earlier}Conversation:\n{conversation}\n\n"
+            f"Summarize the user's questions, any new facts about their finances, and the advice given, "
+            f"in at most {SUMMARY_MAX_CHARS // 2} characters of plain text.")
+
+
+def local_summary(summary, turns):
+    """Fallback when the model can't summarize: keep the questions, drop the answers."""
+    asked = "; ".join(q.strip() for q, _ in turns)
+    text = f"{summary} Also asked about: {asked}." if summary else f"Asked about: {asked}."
+    return text[-SUMMARY_MAX_CHARS:]
+
+
+def split_turns(summary, turns, budget, keep):
+    """Return (old, recent): the turns to fold into the summary (none while within budget) and the ones to keep."""
+    if turns_tokens(summary, turns) <= budget or len(turns) <= keep:
+        return [], turns
+    return turns[:len(turns) - keep], turns[len(turns) - keep:]
+
+
+def _merged(summary, old, new_summary):
+    return (new_summary or "").strip()[:SUMMARY_MAX_CHARS] or local_summary(summary, old)
+
+
+def compress(summary, turns, budget, keep, summarize):
+    """Fold all but the last `keep` turns into the summary once the context exceeds `budget` tokens.
+
+    ``summarize(prompt)`` returns the new summary text. Returns (summary, turns),
+    unchanged if the context is within budget.
+    """
+    old, recent = split_turns(summary, turns, budget, keep)
+    if not old:
+        return summary, turns
+    try:
+        new_summary = summarize(build_summary_prompt(summary, old))
+    except Exception as e:
+        print(f"Summarizing follow-up context failed: {e}")
+        new_summary = ""
+    return _merged(summary, old, new_summary), recent
+
+
+async def compress_async(summary, turns, budget, keep, summarize):
+    """compress() with a coroutine ``summarize(prompt)``."""
+    old, recent = split_turns(summary, turns, budget, keep)
+    if not old:
+        return summary, turns
+    try:
+        new_summary = await summarize(build_summary_prompt(summary, old))
+    except Exception as e:
+        print(f"Summarizing follow-up context failed: {e}")
+        new_summary = ""
+    return _merged(summary, old, new_summary), recent
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Token counts for one request; estimated is True when the SDK reported no usage metadata
+Usage = namedtuple("Usage", "input_tokens output_tokens estimated")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for SDKs that report no usage."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class ModelTier:
+    """A Gemini model with its generation config and system instruction.
+
+    Newer SDKs take ``system_instruction`` on the model, so the static
+    instructions are not resent as part of every prompt. Older ones (and
+    injected stand-ins) don't, and get the instruction prepended instead.
+
+    The SDK is imported and the model built on first use (or ``warm()``),
+    not at construction, so the bot can start answering before it loads.
+    """
+
+    _build_lock = threading.Lock()
+
+    def __init__(self, name, system_instruction="", generation_config=None, api_key=None, model=None):
+        self.name = name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+        self.api_key = api_key
+        self.native_instruction = False
+        self._model = model
+        # monotonic time of the last request, for keeping an idle connection warm
+        self.last_used = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.warm()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def warm(self):
+        """Import the SDK and build the model now (safe to call more than once)."""
+        with self._build_lock:
+            if self._model is None:
+                self._model = self._build()
+
+    def ping(self):
+        """Make a free request (count_tokens) so the client's connection is open before a real call needs it."""
+        self.last_used = time.monotonic()
+        self.model.count_tokens("ping")
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used if self.last_used is not None else float("inf")
+
+    def _build(self):
+        import google.generativeai as genai  # deferred: the SDK takes ~0.5 s to import
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        if self.system_instruction:
+            try:
+                model = genai.GenerativeModel(self.name, system_instruction=self.system_instruction)
+                self.native_instruction = True
+                return model
+            except TypeError:  # google-generativeai < 0.5
+                pass
+        return genai.GenerativeModel(self.name)
+
+    def _contents(self, prompt):
+        if self.system_instruction and not self.native_instruction:
+            return f"{self.system_instruction}\n\n{prompt}"
+        return prompt
+
+    def generate(self, prompt):
+        """Return (text, usage) for a complete response."""
+        contents = self._contents(prompt)
+        self.last_used = time.monotonic()
+        response = self.model.generate_content(contents, generation_config=self.generation_config)
+        text = response.text if response else ""
+        return text, self._usage(response, contents, text)
+
+    async def generate_async(self, prompt):
+        """generate() for asyncio callers, through the SDK's generate_content_async.
+
+        The first call builds the model on a worker thread so the import doesn't
+        block the event loop. Models without an async API run on a thread too.
+        """
+        if self._model is None:
+            await asyncio.to_thread(self.warm)
+        if not hasattr(self._model, "generate_content_async"):
+            return await asyncio.to_thread(self.generate, prompt)
+        contents = self._contents(prompt)
+        self.last_used = time.monotonic()
+        response = await self._model.generate_content_async(contents, generation_config=self.generation_config)
+        text = response.text if response else ""
+        return text, self._usage(response, contents, text)
+
+    def stream(self, prompt, on_usage=None):
+        """Yield text chunks as Gemini produces them; on_usage(usage) is called once the stream ends."""
+        contents = self._contents(prompt)
+        self.last_used = time.monotonic()
+        last, parts = None, []
+        for chunk in self.model.generate_content(contents, generation_config=self.generation_config, stream=True):
+            last = chunk
+            parts.append(chunk.text)
+            yield chunk.text
+        if on_usage is not None:
+            on_usage(self._usage(last, contents, "".join(parts)))
+
+    def _usage(self, response, contents, text):
+        # With a native system instruction the SDK's prompt count includes it; estimate it the same way
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            return Usage(usage.prompt_token_count, getattr(usage, "candidates_token_count", 0) or 0, False)
+        sent = contents if not self.native_instruction else f"{self.system_instruction}\n\n{contents}"
+        return Usage(estimate_tokens(sent), estimate_tokens(text), True)
+
+
+def model_tiers_from_env(system_instruction, api_key):
+    """Build {"standard": ModelTier, "lite": ModelTier} from the GEMINI_* environment variables.
+
+    "lite" is only built when GEMINI_LITE_MODEL names a model.
+    """
+    # Output is capped in tokens, which bounds both latency and cost. Gemini 2.5 models count their
+    # "thinking" against this cap too, so leave headroom above the ~500 tokens a 2000-character plan needs.
+    generation_config = {
+        "max_output_tokens": int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "1024")),
+        "temperature": float(os.getenv("GEMINI_TEMPERATURE", "0.4")),
+    }
+    tiers = {"standard": ModelTier(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"), system_instruction,
+                                   generation_config, api_key)}
+    lite = os.getenv("GEMINI_LITE_MODEL", "")
+    if lite:
+        tiers["lite"] = ModelTier(lite, system_instruction, generation_config, api_key)
+    return tiers
@@ -0,0 +1,118 @@
+import asyncio
+import queue
+import threading
+
+
+class GenerationPool:
+    """Bounded job queue and worker threads for slow Gemini generation calls.
+
+    Handlers enqueue a job and return straight away, so telebot's handler
+    threads stay free for users who are only answering the quick questions.
+    """
+
+    def __init__(self, workers=4, max_concurrency=None, max_queue=100, name="generation"):
+        self.workers = max(1, int(workers))
+        self.max_concurrency = max(1, int(max_concurrency or self.workers))
+        self.name = name
+        self._queue = queue.Queue(maxsize=max(0, int(max_queue)))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._submitted = 0  # tickets handed out so far
+        self._started = 0    # tickets picked up by a worker
+        self._running = 0
+
+    def start(self):
+        """Start the worker threads (safe to call more than once)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) and return how many jobs are waiting ahead of it.
+
+        Raises queue.Full when the queue is at capacity.
+        """
+        self.start()
+        with self._lock:
+            ahead = self._submitted - self._started
+            self._queue.put_nowait((func, args, kwargs))
+            self._submitted += 1
+        return ahead
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._submitted - self._started,
+                "running": self._running,
+                "workers": self.workers,
+                "max_concurrency": self.max_concurrency,
+            }
+
+    def _worker(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            with self._lock:
+                self._started += 1
+            with self._slots:
+                with self._lock:
+                    self._running += 1
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    print(f"Generation job {getattr(func, '__name__', func)} failed: {e}")
+                finally:
+                    with self._lock:
+                        self._running -= 1
+                    self._queue.task_done()
+
+
+class AsyncGenerationPool:
+    """GenerationPool for asyncio: each job is a task and a semaphore caps how many call Gemini at once.
+
+    There are no worker threads; a job waiting for a slot is a suspended coroutine.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=100):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._tasks = set()  # keeps running jobs referenced until they finish
+        self._queued = 0
+        self._running = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule the coroutine func(*args, **kwargs) and return how many jobs are waiting ahead of it.
+
+        Must be called from the event loop. Raises queue.Full when the queue is at capacity.
+        """
+        ahead = max(0, self._queued + self._running - self.max_concurrency)
+        if self.max_queue and ahead >= self.max_queue:
+            raise queue.Full
+        self._queued += 1
+        task = asyncio.create_task(self._run(func, args, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return ahead
+
+    def stats(self):
+        return {
+            "queued": self._queued,
+            "running": self._running,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def _run(self, func, args, kwargs):
+        async with self._slots:
+            self._queued -= 1
+            self._running += 1
+            try:
+                await func(*args, **kwargs)
+            except Exception as e:
+                print(f"Generation job {getattr(func, '__name__', func)} failed: {e}")
+            finally:
+                self._running -= 1
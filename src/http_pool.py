@@ -0,0 +1,126 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class ConnectionStats:
+    """Requests made and connections opened by one HTTP client.
+
+    Every opened connection is a TCP handshake, plus a TLS handshake for
+    HTTPS; the rest of the requests reused a pooled keep-alive connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.last_used = time.monotonic()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+            self.last_used = time.monotonic()
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def reuse_rate(self):
+        """Share of requests that went out on an already open connection."""
+        with self._lock:
+            return max(0.0, 1 - self.connections / self.requests) if self.requests else 0.0
+
+    def stats(self):
+        return {"requests": self.requests, "connections": self.connections, "reuse_rate": round(self.reuse_rate(), 4)}
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a keep-alive pool of ``pool_size`` connections per host that counts into ConnectionStats.
+
+    The pool doesn't block: a burst beyond ``pool_size`` opens extra
+    connections, which are closed afterwards and show up in the counts.
+    """
+
+    def __init__(self, pool_size=10, stats=None):
+        self.stats = stats or ConnectionStats()
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.record_connection()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.record_connection()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool,
+                                                   "https": CountingHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+def make_session(base_url, pool_size=10, stats=None):
+    """A requests.Session for one API host, shared by every thread.
+
+    Proxy settings are read from the environment once, here. By default
+    requests re-reads them (and ~/.netrc) on every call, which costs about
+    0.3 ms per request.
+    """
+    session = requests.Session()
+    session.trust_env = False
+    session.proxies.update(requests.utils.get_environ_proxies(base_url))
+    adapter = PooledAdapter(pool_size, stats)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def warm_connections(session, url, count, timeout=10):
+    """Open up to `count` pooled connections now, with that many concurrent GETs of url; returns seconds taken."""
+    began = time.perf_counter()
+    errors = []
+
+    def get():
+        try:
+            session.get(url, timeout=timeout).close()
+        except requests.RequestException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=get, daemon=True) for _ in range(max(1, count))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout)
+    if errors:
+        print(f"Warming {count} connection(s) failed: {errors[0]}")
+    return time.perf_counter() - began
+
+
+def aiohttp_trace_config(stats):
+    """aiohttp TraceConfig that counts requests and new connections into stats."""
+    import aiohttp  # only the asyncio runtime needs it
+
+    async def on_request_start(session, context, params):
+        stats.record_request()
+
+    async def on_connection_create_end(session, context, params):
+        stats.record_connection()
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    return trace
@@ -0,0 +1,222 @@
+import os
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from finance_calc import EMERGENCY_FUND_MONTHS, INFLATION, RETIREMENT_AGE, compute_figures, format_inr, parse_amount
+from profile_parser import parse_profile
+
+# Annual return assumptions (mean, volatility); fixed deposits earn a locked-in rate
+EQUITY_RETURN, EQUITY_VOL = 0.12, 0.18
+DEBT_RETURN, DEBT_VOL = 0.075, 0.05
+EQUITY_DEBT_CORRELATION = 0.1
+FD_RATE = 0.07
+INFLATION_VOL = 0.015
+# Yearly SIP step-up (contributions grow with income)
+STEP_UP = 0.10
+MAX_YEARS = 50
+
+# (equity, debt, fixed deposit) weights, rebalanced every year
+MIXES = {
+    "conservative": (0.2, 0.4, 0.4),
+    "balanced": (0.5, 0.3, 0.2),
+    "growth": (0.8, 0.2, 0.0),
+}
+
+# amount is in today's rupees; the simulation grows it with (simulated) inflation
+Goal = namedtuple("Goal", "name amount years")
+
+
+class Simulator:
+    """Vectorized Monte Carlo of SIP savings under random equity, debt and inflation paths.
+
+    Market paths are drawn once from a seeded generator and reused by every
+    simulation (common random numbers). The same profile always gets the
+    same odds, and comparing mixes or step-ups compares like with like.
+    Arrays are year-major (``years x paths``): a simulation steps through the
+    years, updating every path at once, so 10,000 paths take about a
+    millisecond.
+    """
+
+    def __init__(self, paths=10000, seed=42, max_years=MAX_YEARS):
+        rng = np.random.default_rng(seed)
+        shape = (int(max_years), int(paths))
+        self.max_years, self.paths = shape
+        z_equity, z_other, z_inflation = (rng.standard_normal(shape, dtype=np.float32) for _ in range(3))
+        z_debt = EQUITY_DEBT_CORRELATION * z_equity + np.sqrt(1 - EQUITY_DEBT_CORRELATION ** 2) * z_other
+        # Lognormal annual growth factors with the given arithmetic mean and volatility
+        self.equity = _lognormal_growth(EQUITY_RETURN, EQUITY_VOL, z_equity)
+        self.debt = _lognormal_growth(DEBT_RETURN, DEBT_VOL, z_debt)
+        self.prices = np.cumprod(1 + INFLATION + INFLATION_VOL * z_inflation, axis=0, dtype=np.float32)
+        for array in (self.equity, self.debt, self.prices):
+            array.flags.writeable = False
+
+    def run(self, monthly, years, mix="balanced", step_up=STEP_UP, goals=()):
+        """Simulate `years` of SIP investing; return (nominal corpus per path, {goal: probability}).
+
+        Goals are paid in date order out of the same corpus, so an early goal
+        leaves less for the later ones.
+        """
+        years = max(1, min(int(years), self.max_years))
+        w_equity, w_debt, w_fd = MIXES[mix]
+        due = {}
+        for goal in goals:
+            due.setdefault(min(goal.years, years), []).append(goal)
+        wealth = np.zeros(self.paths, dtype=np.float32)
+        growth = np.empty_like(wealth)
+        odds = {}
+        for year in range(years):
+            np.multiply(self.equity[year], np.float32(w_equity), out=growth)
+            growth += np.float32(w_debt) * self.debt[year]
+            growth += np.float32(w_fd * (1 + FD_RATE))
+            wealth *= growth
+            # This year's contributions arrive through the year, so they earn about half a year's return
+            wealth += np.float32(12 * monthly * (1 + step_up) ** year) * np.sqrt(growth)
+            for goal in due.get(year + 1, ()):
+                target = np.float32(goal.amount) * self.prices[year]
+                odds[goal] = float(np.count_nonzero(wealth >= target)) / self.paths
+                wealth -= np.minimum(wealth, target)
+        return wealth, odds
+
+    def goal_odds(self, monthly, goals, mix="balanced", step_up=STEP_UP):
+        """Probability of fully funding each goal out of one SIP; a list of (goal, probability) in the order given."""
+        goals = [g for g in goals if g.years >= 1]
+        if not goals or monthly <= 0:
+            return [(g, 0.0) for g in goals]
+        _, odds = self.run(monthly, max(g.years for g in goals), mix, step_up, goals)
+        return [(g, odds[g]) for g in goals]
+
+    def real_percentiles(self, monthly, years, mix="balanced", step_up=STEP_UP, q=(10, 50, 90)):
+        """Corpus after `years` in today's rupees at the given percentiles."""
+        years = max(1, min(int(years), self.max_years))
+        wealth, _ = self.run(monthly, years, mix, step_up)
+        return np.percentile(wealth / self.prices[years - 1], q).tolist()
+
+
+def _lognormal_growth(mean, vol, z):
+    sigma2 = np.log(1 + (vol / (1 + mean)) ** 2)
+    return np.exp(np.log(1 + mean) - sigma2 / 2 + np.sqrt(sigma2) * z, dtype=np.float32)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_simulator():
+    """Process-wide Simulator (SIMULATION_PATHS paths, default 10000), built on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Simulator(paths=int(os.getenv("SIMULATION_PATHS", "10000")))
+        return _default
+
+
+# (keywords, goal name, amount in today's ₹ from the figures, default years)
+_GOAL_RULES = (
+    (("retire",), "Retirement", lambda f: f["expenses"] * 12 * 25, None),
+    (("home", "house", "flat", "apartment", "property"), "Home down payment", lambda f: f["income"] * 12, 7),
+    (("education", "college", "school", "child", "kid", "daughter", "son"), "Child's education", lambda f: 2_000_000, 15),
+    (("wedding", "marriage"), "Wedding", lambda f: 1_500_000, 5),
+    (("car", "bike", "vehicle"), "Vehicle", lambda f: f["income"] * 6, 4),
+    (("travel", "trip", "vacation", "holiday"), "Travel", lambda f: f["income"] * 2, 2),
+    (("emergency",), "Emergency fund", lambda f: f["expenses"] * EMERGENCY_FUND_MONTHS, 1),
+)
+_YEARS = re.compile(r"(\d{1,2})\s*(?:years?|yrs?)\b")
+
+
+def parse_goals(goals_text, figures):
+    """Turn free-text goals into Goals with amounts and horizons.
+
+    Known goals get defaults scaled to the user's income and expenses; an
+    explicit amount ("home 50 lakh") or horizon ("in 8 years") overrides them.
+    Goals we can't size (e.g. "tax saving") are skipped.
+    """
+    goals = []
+    for part in re.split(r"[,;/\n]|\band\b|&", str(goals_text).lower()):
+        part = part.strip()
+        if not part:
+            continue
+        rule = next((r for r in _GOAL_RULES if re.search(r"\b(?:" + "|".join(r[0]) + ")", part)), None)
+        years_match = _YEARS.search(part)
+        years = int(years_match.group(1)) if years_match else None
+        amount = parse_amount(_YEARS.sub(" ", part))
+        if amount is not None and amount < 1000:  # a bare small number is not a target
+            amount = None
+        if rule is None:
+            if amount and years:
+                goals.append(Goal(part[:40].strip().capitalize(), amount, years))
+            continue
+        _, name, default_amount, default_years = rule
+        if years is None:
+            if default_years is None:  # retirement: years until RETIREMENT_AGE
+                if not figures.get("age") or figures["age"] >= RETIREMENT_AGE:
+                    continue
+                default_years = RETIREMENT_AGE - figures["age"]
+            years = default_years
+        goals.append(Goal(name, amount or default_amount(figures), min(years, MAX_YEARS)))
+    return goals
+
+
+def goal_odds_for_prompt(figures, goals_text, simulator=None, mix="balanced"):
+    """Success probabilities as lines for the plan prompt; empty when there's nothing to simulate."""
+    goals = parse_goals(goals_text, figures) if figures and figures["savings"] > 0 else []
+    if not goals:
+        return ""
+    simulator = simulator or default_simulator()
+    odds = simulator.goal_odds(figures["savings"], goals, mix)
+    lines = [f"- Monte Carlo ({simulator.paths:,} market scenarios, {mix} mix, SIP of the full savings "
+             f"stepped up {STEP_UP:.0%} a year, goals paid in date order):"]
+    for goal, p in odds:
+        lines.append(f"  - {goal.name} ({format_inr(goal.amount)} in today's money, {goal.years}y): {p:.0%} chance")
+    return "\n".join(lines)
+
+
+def simulation_report(figures, goals_text, simulator=None):
+    """The /simulate reply: each goal's odds under every mix, plus the spread of outcomes."""
+    simulator = simulator or default_simulator()
+    savings = figures["savings"]
+    if savings <= 0:
+        return "🎲 There's no monthly surplus to invest yet, so there is nothing to simulate. Cut expenses first."
+    lines = [f"🎲 {simulator.paths:,} simulated market scenarios, investing {format_inr(savings)}/month "
+             f"and stepping it up {STEP_UP:.0%} a year.", ""]
+    goals = parse_goals(goals_text, figures)
+    if goals:
+        lines.append("Chance of fully funding each goal (conservative / balanced / growth mix):")
+        by_mix = {mix: dict(simulator.goal_odds(savings, goals, mix)) for mix in MIXES}
+        for goal in goals:
+            odds = " / ".join(f"{by_mix[mix][goal]:.0%}" for mix in MIXES)
+            lines.append(f"• {goal.name}, {format_inr(goal.amount)} in {goal.years}y: {odds}")
+        lines.append("")
+    years = max([g.years for g in goals] + [10])
+    low, median, high = simulator.real_percentiles(savings, years, "balanced")
+    lines.append(f"Balanced mix after {years} years, in today's money: typically {format_inr(median)}; "
+                 f"1 in 10 scenarios ends below {format_inr(low)} and 1 in 10 above {format_inr(high)}.")
+    lines.append("")
+    lines.append("Mixes (equity/debt/FD): " + ", ".join(
+        f"{mix} {e:.0%}/{d:.0%}/{f:.0%}" for mix, (e, d, f) in MIXES.items()))
+    return "\n".join(lines)
+
+
+SIMULATE_USAGE = ("Send /simulate once you've answered the income and expenses questions, or give everything at once:\n"
+                  "/simulate <age> <income> <expenses> <goals>\n"
+                  "e.g. /simulate 30 80000 50000 home in 8 years, retirement\n"
+                  "or /simulate age 30 income 80k expenses 50k goals home in 8 years")
+
+
+def simulate_reply(args_text, session=None):
+    """Reply to /simulate: from an inline profile (as /plan reads it) if one is given, else from the conversation's answers."""
+    profile = parse_profile(args_text)
+    if "income" in profile and "expenses" in profile:
+        age, income, expenses = profile.get("age"), profile["income"], profile["expenses"]
+        goals = profile.get("goals") or "retirement"
+    elif session and "income" in session and "expenses" in session:
+        age, income, expenses = session.get("age"), session["income"], session["expenses"]
+        goals = session.get("goals") or "retirement"
+    else:
+        return SIMULATE_USAGE
+    figures = compute_figures(age, income, expenses)
+    if figures is None:
+        return "I couldn't read those amounts.\n\n" + SIMULATE_USAGE
+    return simulation_report(figures, goals)
@@ -0,0 +1,242 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from telebot.apihelper import ApiTelegramException
+
+
+class TokenBucket:
+    """Classic token bucket; callers hold the dispatcher lock."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("func", "args", "kwargs", "future", "enqueued", "attempts")
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ("jobs", "bucket", "scheduled")
+
+    def __init__(self, bucket):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.scheduled = False
+
+
+class OutboundDispatcher:
+    """Central, rate-limited queue for every Telegram API call the bot makes.
+
+    A global token bucket keeps us under Telegram's ~30 msg/s limit and a
+    per-chat bucket under ~1 msg/s per chat. Calls for one chat are sent
+    strictly in order; 429 responses delay that chat by ``retry_after`` and
+    the call is retried. Every call returns a Future.
+
+    ``on_complete(method, seconds, error)`` is called after every call with
+    the API method name, the time from submit to completion and the
+    exception (None on success).
+    """
+
+    def __init__(self, bot, workers=4, global_rate=30.0, global_burst=30,
+                 per_chat_rate=1.0, per_chat_burst=3, max_attempts=5, on_complete=None):
+        self.bot = bot
+        self.on_complete = on_complete
+        self.workers = max(1, int(workers))
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._chats = {}
+        self._ready = []  # heap of (ready_at, seq, chat_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pending = 0
+        self._sent = 0
+        self._failed = 0
+        self._rate_limited = 0
+        self._latencies = deque(maxlen=1000)
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"outbound-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, chat_id, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) behind earlier calls for chat_id."""
+        self.start()
+        job = _Job(func, args, kwargs)
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _Chat(
+                    TokenBucket(self.per_chat_rate, self.per_chat_burst, job.enqueued)
+                )
+            chat.jobs.append(job)
+            self._pending += 1
+            if not chat.scheduled:
+                self._schedule(chat_id, chat, job.enqueued)
+            self._cond.notify()
+        return job.future
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self.submit(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        return self.submit(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+
+    def delete_message(self, chat_id, message_id):
+        return self.submit(chat_id, self.bot.delete_message, chat_id, message_id)
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            pending, chats = self._pending, sum(1 for c in self._chats.values() if c.jobs)
+            sent, failed, limited = self._sent, self._failed, self._rate_limited
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "queue_depth": pending,
+            "chats_waiting": chats,
+            "sent": sent,
+            "failed": failed,
+            "rate_limited": limited,
+            "latency_p50": pct(0.50),
+            "latency_p95": pct(0.95),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    def _schedule(self, chat_id, chat, at):
+        chat.scheduled = True
+        heapq.heappush(self._ready, (at, next(self._seq), chat_id))
+
+    def _next_job(self):
+        """Block until a chat is due and a global token is free; return (chat_id, chat, job)."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if not self._ready:
+                    self._cond.wait()
+                    continue
+                ready_at, _, chat_id = self._ready[0]
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                chat = self._chats[chat_id]
+                wait = max(self._global.wait_time(now), chat.bucket.wait_time(now))
+                if wait > 0:
+                    heapq.heapreplace(self._ready, (now + wait, next(self._seq), chat_id))
+                    continue
+                heapq.heappop(self._ready)
+                self._global.take(now)
+                chat.bucket.take(now)
+                # The chat stays "scheduled" while in flight so no other worker picks it up
+                return chat_id, chat, chat.jobs[0]
+
+    def _worker(self):
+        while True:
+            chat_id, chat, job = self._next_job()
+            job.attempts += 1
+            retry_at = None
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except ApiTelegramException as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None and job.attempts < self.max_attempts:
+                    retry_at = time.monotonic() + retry_after
+                else:
+                    self._finish(chat_id, chat, job, error=e)
+                    continue
+            except Exception as e:
+                self._finish(chat_id, chat, job, error=e)
+                continue
+            else:
+                self._finish(chat_id, chat, job, result=result)
+                continue
+
+            with self._cond:
+                self._rate_limited += 1
+                self._schedule(chat_id, chat, retry_at)
+                self._cond.notify()
+
+    def _finish(self, chat_id, chat, job, result=None, error=None):
+        now = time.monotonic()
+        with self._cond:
+            chat.jobs.popleft()
+            self._pending -= 1
+            if error is None:
+                self._sent += 1
+                self._latencies.append(now - job.enqueued)
+            else:
+                self._failed += 1
+            chat.scheduled = False
+            if chat.jobs:
+                self._schedule(chat_id, chat, now)
+                self._cond.notify()
+            elif chat.bucket.is_full(now):
+                del self._chats[chat_id]
+            if (self._sent + self._failed) % 1000 == 0:
+                self._prune(now)
+        if self.on_complete is not None:
+            try:
+                self.on_complete(getattr(job.func, "__name__", "call"), now - job.enqueued, error)
+            except Exception as e:
+                print(f"Outbound on_complete hook failed: {e}")
+        if error is None:
+            job.future.set_result(result)
+        else:
+            print(f"Outbound call to chat {chat_id} failed: {error}")
+            job.future.set_exception(error)
+
+    def _prune(self, now):
+        # Forget idle chats whose bucket has refilled; they would start full anyway
+        for chat_id in [cid for cid, c in self._chats.items() if not c.jobs and not c.scheduled and c.bucket.is_full(now)]:
+            del self._chats[chat_id]
+
+
+def retry_after_seconds(error):
+    """Return retry_after seconds for a 429 response, else None."""
+    if error.error_code != 429:
+        return None
+    params = (error.result_json or {}).get("parameters") or {}
+    return float(params.get("retry_after", 1))
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from resilience import backoff_delay
+
+OutboxRow = namedtuple("OutboxRow", "id chat_id text attempts")
+
+# Telegram answers these for requests that will never succeed (bad request, bot blocked or kicked)
+PERMANENT_ERROR_CODES = (400, 403)
+
+
+class Outbox:
+    """Durable queue of outgoing messages in SQLite (WAL mode).
+
+    A plan's chunks are written in one transaction before anything is sent,
+    then delivered in order and acknowledged one by one. Whatever was not
+    acknowledged when the process died is sent again after a restart, so
+    delivery is at-least-once: a crash between Telegram accepting a chunk
+    and the acknowledgement being written repeats that one chunk.
+    """
+
+    def __init__(self, path, retention=86400):
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, text TEXT NOT NULL,"
+            " created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " sent_at REAL, message_id INTEGER, failed_at REAL, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (chat_id, id) WHERE sent_at IS NULL AND failed_at IS NULL"
+        )
+
+    def enqueue(self, chat_id, texts):
+        """Store messages for chat_id, to be sent in the given order; returns their ids."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [
+                    self._db.execute(
+                        "INSERT INTO outbox (chat_id, text, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                        (chat_id, text, now, now),
+                    ).lastrowid
+                    for text in texts
+                ]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def due(self, now=None, limit=100):
+        """The oldest undelivered message of each chat, if it is due; at most one per chat keeps them in order."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, chat_id, text, attempts FROM outbox WHERE id IN ("
+                " SELECT MIN(id) FROM outbox WHERE sent_at IS NULL AND failed_at IS NULL GROUP BY chat_id)"
+                " AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [OutboxRow(*row) for row in rows]
+
+    def ack(self, row_id, message_id=None):
+        with self._lock:
+            self._db.execute("UPDATE outbox SET sent_at = ?, message_id = ?, attempts = attempts + 1 WHERE id = ?",
+                             (time.time(), message_id, row_id))
+
+    def retry(self, row_id, error, at):
+        with self._lock:
+            self._db.execute("UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, error = ? WHERE id = ?",
+                             (at, str(error)[:500], row_id))
+
+    def give_up(self, row_id, error):
+        with self._lock:
+            self._db.execute("UPDATE outbox SET attempts = attempts + 1, failed_at = ?, error = ? WHERE id = ?",
+                             (time.time(), str(error)[:500], row_id))
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL AND failed_at IS NULL").fetchone()[0]
+
+    def purge(self, now=None):
+        """Delete delivered and abandoned messages older than the retention period."""
+        cutoff = (time.time() if now is None else now) - self.retention
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM outbox WHERE (sent_at IS NOT NULL OR failed_at IS NOT NULL) AND created_at < ?", (cutoff,)
+            ).rowcount
+
+
+class OutboxSender:
+    """Background thread that delivers an Outbox through ``send(chat_id, text)``, which returns a Future.
+
+    One message per chat is in flight at a time, so chunks arrive in order.
+    Failures are retried with jittered backoff up to ``max_attempts``;
+    errors Telegram will never accept (400, 403) are given up on at once.
+    ``owns(chat_id)`` limits the sender to some chats, e.g. one shard's.
+    """
+
+    def __init__(self, outbox, send, owns=None, max_attempts=8, base_delay=1.0, max_delay=60.0, poll_interval=1.0):
+        self.outbox = outbox
+        self.send = send
+        self.owns = owns
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._woken = False
+        self._in_flight = set()
+        self._thread = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {"pending": self.outbox.pending(), "sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+    def wake(self):
+        """Look for due messages now instead of at the next poll."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                for row in self.outbox.due():
+                    if self.owns is not None and not self.owns(row.chat_id):
+                        continue
+                    with self._cond:
+                        if row.id in self._in_flight:
+                            continue
+                        self._in_flight.add(row.id)
+                    self._deliver(row)
+                if time.time() - last_purge > 60:
+                    self.outbox.purge()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"Outbox sender failed: {e}")
+            with self._cond:
+                if not self._woken:
+                    self._cond.wait(self.poll_interval)
+                self._woken = False
+
+    def _deliver(self, row):
+        try:
+            future = self.send(row.chat_id, row.text)
+        except Exception as e:
+            self._done(row, None, e)
+            return
+        future.add_done_callback(lambda f: self._done(row, f.result() if f.exception() is None else None, f.exception()))
+
+    def _done(self, row, message, error):
+        try:
+            if error is None:
+                self.outbox.ack(row.id, getattr(message, "message_id", None))
+                self.sent += 1
+            elif getattr(error, "error_code", None) in PERMANENT_ERROR_CODES or row.attempts + 1 >= self.max_attempts:
+                print(f"Outbox message {row.id} to chat {row.chat_id} abandoned: {error}")
+                self.outbox.give_up(row.id, error)
+                self.failed += 1
+            else:
+                self.outbox.retry(row.id, error, time.time() + backoff_delay(row.attempts, self.base_delay, self.max_delay))
+                self.retried += 1
+        except Exception as e:
+            print(f"Outbox bookkeeping for message {row.id} failed: {e}")
+        with self._cond:
+            self._in_flight.discard(row.id)
+        # The chat's next chunk is due now
+        self.wake()
@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from finance_calc import parse_amount
+
+
+def _normalize_number(value):
+    """Parse '50,000' / '₹ 50k' / '0.5 lakh' into 50000; fall back to trimmed lowercase text."""
+    number = parse_amount(value)
+    if number is None:
+        return str(value).strip().lower()
+    return int(number) if float(number).is_integer() else number
+
+
+def _normalize_goals(goals):
+    return " ".join(str(goals).lower().split())
+
+
+def profile_key(age, income, expenses, goals, savings, version):
+    """Cache key for a plan: the normalized profile plus the prompt template version."""
+    parts = (
+        version,
+        _normalize_number(age),
+        _normalize_number(income),
+        _normalize_number(expenses),
+        _normalize_goals(goals),
+        _normalize_number(savings),
+    )
+    return "|".join(str(p) for p in parts)
+
+
+class PlanCache:
+    """LRU + TTL cache of generated plans, optionally backed by SQLite so hits survive restarts."""
+
+    def __init__(self, max_size=1000, ttl=86400, db_path=None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created_at, plan)
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        if db_path:
+            # WAL like the session and outbox stores: shard workers sharing the file read while one writes
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """Return the cached plan for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                try:
+                    row = self._db.execute("SELECT created, plan FROM plans WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    # A cache that can't be read is a miss, not a failed request
+                    print(f"Plan cache lookup failed: {e}")
+                    row = None
+                if row:
+                    entry = (row[0], row[1])
+                    self._entries[key] = entry
+                    self._evict()
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, plan):
+        if not self.enabled or not plan:
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, plan)
+            self._entries.move_to_end(key)
+            self._evict()
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO plans (key, plan, created) VALUES (?, ?, ?)",
+                                     (key, plan, now))
+                    self._puts += 1
+                    if self._puts % 100 == 0:
+                        self._prune_db(now)
+                    self._db.commit()
+                except sqlite3.Error:
+                    # Don't leave a half-done transaction holding the write lock
+                    self._db.rollback()
+                    raise
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                # The stale row is still expired on disk; the next lookup or prune drops it
+                print(f"Plan cache delete failed: {e}")
+                self._db.rollback()
+
+    def _prune_db(self, now):
+        # Keep the on-disk table bounded by the same TTL and size cap as memory
+        self._db.execute("DELETE FROM plans WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM plans WHERE key NOT IN (SELECT key FROM plans ORDER BY created DESC LIMIT ?)",
+            (self.max_size,),
+        )
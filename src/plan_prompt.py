@@ -0,0 +1,71 @@
+import re
+from collections import namedtuple
+
+from finance_calc import compute_figures, figures_for_prompt, format_inr, template_plan
+from montecarlo import goal_odds_for_prompt
+from plan_cache import profile_key
+
+# Bump whenever the prompt or system instruction changes so cached plans are not reused
+PROMPT_VERSION = "4"
+
+# Static advisor instructions, sent as the model's system instruction; the prompt only carries the profile
+SYSTEM_INSTRUCTION = """You are a certified Indian financial advisor writing CONCISE personalized plans for Telegram.
+When precomputed figures are given, use them exactly as given and do not redo the arithmetic.
+Structure every plan as:
+1. Monthly Savings
+2. Goal Feasibility: Quick assessment based on the figures and the simulated chances of success
+3. Top 2 Investment Options: Brief suggestions
+4. Budget Tip: One key recommendation
+5. Action Plan: 3 simple steps
+Keep it brief (max 2000 characters), use ₹ currency, avoid jargon."""
+
+# A profile can go to the cheaper lite model when its figures were computed locally, it leaves a monthly
+# surplus to invest and it names one short goal; several goals or a deficit need the standard model
+SIMPLE_GOAL_WORDS = 8
+_GOAL_SEPARATORS = re.compile(r"[,;&+/\n]|\b(?:and|also|plus|then)\b", re.IGNORECASE)
+
+# figures is None (and fallback too) when the answers couldn't be parsed as numbers
+PlanRequest = namedtuple("PlanRequest", "prompt figures cache_key fallback simple")
+
+
+def build_plan_request(age, income, expenses, goals):
+    """Return the PlanRequest for one user's answers (used by bot.py and batch_plans.py alike)."""
+    # Work out the numbers locally so the model only has to write the narrative
+    figures = compute_figures(age, income, expenses)
+    if figures:
+        savings = figures['savings']
+        savings_text = format_inr(savings)
+        income_text, expenses_text = format_inr(figures['income']), format_inr(figures['expenses'])
+        # Goal feasibility comes from a Monte Carlo simulation, not the model's guess
+        computed = "\n".join(filter(None, [figures_for_prompt(figures), goal_odds_for_prompt(figures, goals)]))
+        figures_text = f"""
+    Precomputed figures (use them exactly as given, do not redo the arithmetic):
+    {computed.replace(chr(10), chr(10) + "    ")}
+"""
+    else:
+        savings = savings_text = "Calculate manually"
+        income_text, expenses_text = f"₹{income}", f"₹{expenses}"
+        figures_text = ""
+
+    # Only the profile goes in the prompt; the instructions are in SYSTEM_INSTRUCTION
+    prompt = f"""
+    Create a personalized plan for a {age}-year-old with:
+    - Monthly income: {income_text}
+    - Monthly expenses: {expenses_text}
+    - Financial goals: {goals}
+    - Monthly Savings: {savings_text}
+{figures_text}"""
+
+    return PlanRequest(
+        prompt=prompt,
+        figures=figures,
+        cache_key=profile_key(age, income, expenses, goals, savings, PROMPT_VERSION),
+        fallback=template_plan(figures, goals) if figures else None,
+        simple=is_simple(figures, goals),
+    )
+
+
+def is_simple(figures, goals):
+    """True for a profile with a surplus and a single short goal."""
+    return (bool(figures) and figures["savings"] > 0 and len(goals.split()) <= SIMPLE_GOAL_WORDS
+            and not _GOAL_SEPARATORS.search(goals))
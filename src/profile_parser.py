@@ -0,0 +1,86 @@
+import re
+
+from finance_calc import parse_age, parse_amount
+
+# (field, state while waiting for it, question), in the order the conversation asks them
+PROFILE_STEPS = [
+    ("age", "awaiting_age", "How old are you?"),
+    ("income", "awaiting_income", "💸 What is your monthly income (in ₹)?"),
+    ("expenses", "awaiting_expenses", "What are your monthly expenses (in ₹)?"),
+    ("goals", "awaiting_goals", "What are your financial goals?\n"
+                                "(e.g., Buy a home, Child's education, Retirement, Tax saving):"),
+]
+
+PLAN_USAGE = ("Send everything in one message next time, e.g.\n"
+              "/plan age 28 income 80k expenses 45k goals home, retirement")
+
+PROFILE_FIELDS = tuple(step[0] for step in PROFILE_STEPS)
+
+
+def missing_step(data):
+    """The first profile step still unanswered in data, or None once the profile is complete."""
+    return next((step for step in PROFILE_STEPS if step[0] not in data), None)
+
+
+def state_after(field):
+    """The state that follows answering field in the stepwise order."""
+    index = PROFILE_FIELDS.index(field)
+    return PROFILE_STEPS[index + 1][1] if index + 1 < len(PROFILE_STEPS) else "generating_advice"
+
+
+# Labels that introduce each field: "age 28", "income=80k", "spend: 45k", "goals home, retirement"
+_LABELS = {
+    "age": ("age", "aged"),
+    "income": ("income", "salary", "earn", "earns", "earning", "earnings"),
+    "expenses": ("expenses", "expense", "spend", "spends", "spending", "costs"),
+    "goals": ("goals", "goal"),
+}
+_FIELD_FOR_LABEL = {label: field for field, labels in _LABELS.items() for label in labels}
+
+
+def _alternation(labels):
+    return "|".join(sorted(labels, key=len, reverse=True))
+
+
+# A number label only counts when a number follows, so goals like "reduce spending" stay in the goals text
+_LABEL = re.compile(
+    r"\b(?:(" + _alternation(_LABELS["age"] + _LABELS["income"] + _LABELS["expenses"]) + r")"
+    r"\s*(?:[:=]|\bis\b)?\s*(?=(?:₹|rs\.?|inr)?\s*\d)"
+    r"|(" + _alternation(_LABELS["goals"]) + r")\b\s*(?:[:=]|\b(?:is|are)\b)?)\s*",
+    re.IGNORECASE,
+)
+
+_CLAUSE_END = re.compile(r"(?<!\d)[,.]|[,.](?!\d)|[;\n]|\s(?:and|but|&)\s", re.IGNORECASE)
+
+
+def parse_profile(text):
+    """Pull age, income, expenses and goals out of one message.
+
+    Takes labelled values in any order ("age 28 income 80k expenses 45k goals
+    home, retirement", "income=80k, age=28") or, without labels, "<age>
+    <income> <expenses> <goals>". Returns the fields that are present and
+    readable, as the answer text the stepwise conversation would have stored;
+    anything else is left out so the caller can ask for it.
+    """
+    text = (text or "").strip()
+    matches = list(_LABEL.finditer(text))
+    if matches:
+        found = {}
+        for match, following in zip(matches, matches[1:] + [None]):
+            field = _FIELD_FOR_LABEL[(match.group(1) or match.group(2)).lower()]
+            value = text[match.end():following.start() if following else len(text)]
+            if field != "goals":
+                # Up to the end of the clause; commas and dots inside a number (1,20,000, 1.2) don't end it
+                value = _CLAUSE_END.split(value, 1)[0]
+            found.setdefault(field, value.strip(" ,;.\n"))
+    else:
+        found = dict(zip(PROFILE_FIELDS, text.split(maxsplit=3)))
+    return {field: value for field, value in found.items() if _readable(field, value)}
+
+
+def _readable(field, value):
+    if field == "age":
+        return parse_age(value) is not None
+    if field in ("income", "expenses"):
+        return parse_amount(value) is not None
+    return bool(value)
@@ -0,0 +1,45 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def sample_stacks(seconds, interval=0.005):
+    """Sample every other thread's Python stack for `seconds`; returns {folded stack: samples}.
+
+    Wall-clock sampling through sys._current_frames(): threads blocked on
+    a lock, a socket or a sleep are counted too, so waiting on Gemini or
+    Telegram shows up next to CPU work. Each stack starts with the thread's
+    name, so the flame graph splits by thread (handlers, generation,
+    outbound, ...).
+    """
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def folded(counts):
+    """Collapsed-stack text ("frame;frame;frame count" per line) for flamegraph.pl, speedscope or inferno."""
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+def profile_to_file(seconds, path, interval=0.005):
+    """Sample for `seconds` and write the folded stacks to path."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(folded(sample_stacks(seconds, interval)))
+    print(f"Wrote a {seconds:g}s profile to {path}")
@@ -0,0 +1,170 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# HTTP-style status codes worth retrying: rate limited, server error, unavailable, timeout
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+def is_retryable(error):
+    """True for transient errors: google.api_core 429/5xx exceptions, timeouts and dropped connections."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_CODES
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, rng=random):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt))."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_call(func, attempts=3, base_delay=0.5, max_delay=8.0, retryable=is_retryable, on_retry=None):
+    """Call func(), retrying retryable errors with jittered exponential backoff.
+
+    ``on_retry(attempt, error, delay)`` is called before each sleep. The last
+    error is re-raised once ``attempts`` calls have failed.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt + 1 >= attempts or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry is not None:
+                on_retry(attempt + 1, e, delay)
+            time.sleep(delay)
+
+
+async def retry_call_async(func, attempts=3, base_delay=0.5, max_delay=8.0, retryable=is_retryable, on_retry=None):
+    """retry_call() for a coroutine function; waits with asyncio.sleep instead of blocking."""
+    for attempt in range(attempts):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt + 1 >= attempts or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry is not None:
+                on_retry(attempt + 1, e, delay)
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Fail fast while a dependency is down.
+
+    Closed: calls go through. After ``failure_threshold`` consecutive failures
+    the breaker opens and ``allow()`` returns False for ``reset_timeout``
+    seconds. Then it is half-open: one trial call is let through, and its
+    outcome closes or re-opens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def allow(self):
+        """Return True if a call may go ahead now."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies, for picking a hedging delay."""
+
+    def __init__(self, size=200):
+        self._lock = threading.Lock()
+        self._values = deque(maxlen=size)
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, p, min_samples=20):
+        """Return the p-th percentile (0-1), or None until min_samples have been seen."""
+        with self._lock:
+            if len(self._values) < min_samples:
+                return None
+            values = sorted(self._values)
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def hedged_call(executor, func, delay, on_hedge=None):
+    """Run func() on executor; if it hasn't finished after ``delay`` seconds, start a second copy.
+
+    Returns the first successful result. If one copy fails, the other is
+    still awaited; the error is raised only when both have failed. The losing
+    call is left to finish in the background. ``on_hedge()`` is called when
+    the second copy starts. With ``delay=None`` func runs inline, unhedged.
+    Returns (result, hedge_won).
+    """
+    if delay is None:
+        return func(), False
+    primary = executor.submit(func)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result(), False
+
+    if on_hedge is not None:
+        on_hedge()
+    hedge = executor.submit(func)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), future is hedge
+            error = future.exception()
+    raise error
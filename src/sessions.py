@@ -0,0 +1,248 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class SessionStore(ABC):
+    """Per-chat conversation state with inactivity expiry.
+
+    Every read-modify-write goes through the store so handlers running on
+    different threads never race on a shared dict. ``update`` and ``get``
+    return a copy of the session data, or None when there is no live session.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = float(ttl)
+
+    @abstractmethod
+    def create(self, user_id, **fields):
+        """Start a fresh session (replacing any existing one) and return its data."""
+
+    @abstractmethod
+    def get(self, user_id):
+        """A copy of the live session's data, or None."""
+
+    @abstractmethod
+    def update(self, user_id, **fields):
+        """Merge fields into a live session and refresh its expiry; None if there is none."""
+
+    @abstractmethod
+    def delete(self, user_id):
+        """Remove a session and return its data, or None if there was none."""
+
+    @abstractmethod
+    def expire(self, now=None):
+        """Drop sessions idle for longer than ttl and return their user ids."""
+
+    @abstractmethod
+    def in_state(self, state):
+        """Return {user_id: data} for every live session whose "state" is state."""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of stored sessions, including expired ones not swept yet."""
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+
+class _Session:
+    __slots__ = ("data", "expires_at", "slot")
+
+    def __init__(self, data, expires_at, slot):
+        self.data = data
+        self.expires_at = expires_at
+        self.slot = slot
+
+
+class MemorySessionStore(SessionStore):
+    """In-memory sessions expired through a hashed timer wheel.
+
+    Each session sits in the wheel bucket of the first tick at or after its
+    deadline, so every session in a bucket the sweep reaches is due, a
+    sweep only looks at buckets whose tick has passed, and every session is
+    touched once when it expires: amortized O(1), independent of how many
+    sessions are live.
+    """
+
+    def __init__(self, ttl=600, resolution=1.0):
+        super().__init__(ttl)
+        self.resolution = float(resolution)
+        self._slots = [set() for _ in range(int(math.ceil(self.ttl / self.resolution)) + 2)]
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_tick = self._tick(time.time())
+
+    def _tick(self, t):
+        return int(t // self.resolution)
+
+    def _schedule(self, user_id, session, now):
+        self._slots[session.slot].discard(user_id)
+        session.expires_at = now + self.ttl
+        # Rounded up: a session expiring mid-tick must not share a bucket with ones that are already due
+        session.slot = int(math.ceil(session.expires_at / self.resolution)) % len(self._slots)
+        self._slots[session.slot].add(user_id)
+
+    def create(self, user_id, **fields):
+        now = time.time()
+        with self._lock:
+            old = self._sessions.get(user_id)
+            if old is not None:
+                self._slots[old.slot].discard(user_id)
+            session = _Session(dict(fields), 0.0, 0)
+            self._sessions[user_id] = session
+            self._schedule(user_id, session, now)
+            return dict(session.data)
+
+    def _live(self, user_id, now):
+        # A session past its deadline is gone even if the sweeper has not reached it yet
+        session = self._sessions.get(user_id)
+        return session if session is not None and session.expires_at > now else None
+
+    def get(self, user_id):
+        with self._lock:
+            session = self._live(user_id, time.time())
+            return dict(session.data) if session is not None else None
+
+    def update(self, user_id, **fields):
+        now = time.time()
+        with self._lock:
+            session = self._live(user_id, now)
+            if session is None:
+                return None
+            session.data.update(fields)
+            self._schedule(user_id, session, now)
+            return dict(session.data)
+
+    def delete(self, user_id):
+        with self._lock:
+            session = self._sessions.pop(user_id, None)
+            if session is None:
+                return None
+            self._slots[session.slot].discard(user_id)
+            return session.data
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            current = self._tick(now)
+            # Never walk more than one full turn of the wheel, however long we slept
+            start = max(self._last_tick + 1, current - len(self._slots) + 1)
+            for tick in range(start, current + 1):
+                bucket = self._slots[tick % len(self._slots)]
+                for user_id in list(bucket):
+                    session = self._sessions[user_id]
+                    if session.expires_at <= now:
+                        bucket.discard(user_id)
+                        del self._sessions[user_id]
+                        expired.append(user_id)
+            self._last_tick = current
+        return expired
+
+    def in_state(self, state):
+        now = time.time()
+        with self._lock:
+            return {user_id: dict(session.data) for user_id, session in self._sessions.items()
+                    if session.expires_at > now and session.data.get("state") == state}
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """Durable sessions in a SQLite database (WAL mode) so conversations survive restarts.
+
+    Several processes can open the same file, which is how shard workers share sessions.
+    """
+
+    def __init__(self, path, ttl=600):
+        super().__init__(ttl)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def create(self, user_id, **fields):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, expires_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(fields), time.time() + self.ttl),
+            )
+        return dict(fields)
+
+    def _load(self, user_id, now):
+        row = self._db.execute(
+            "SELECT data FROM sessions WHERE user_id = ? AND expires_at > ?", (user_id, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, user_id):
+        with self._lock:
+            return self._load(user_id, time.time())
+
+    def update(self, user_id, **fields):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                data = self._load(user_id, now)
+                if data is not None:
+                    data.update(fields)
+                    self._db.execute(
+                        "UPDATE sessions SET data = ?, expires_at = ? WHERE user_id = ?",
+                        (json.dumps(data), now + self.ttl, user_id),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return data
+
+    def delete(self, user_id):
+        with self._lock:
+            data = self._load(user_id, time.time())
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        return data
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        # The expires_at index makes this proportional to the number of expired rows
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute("SELECT user_id FROM sessions WHERE expires_at <= ?", (now,)).fetchall()
+                self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def in_state(self, state):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, data FROM sessions WHERE expires_at > ? AND json_extract(data, '$.state') = ?",
+                (time.time(), state),
+            ).fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def make_session_store(backend="memory", ttl=600, path="sessions.db"):
+    """Build the session store selected by configuration."""
+    if backend == "sqlite":
+        return SqliteSessionStore(path, ttl=ttl)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl)
+    raise ValueError(f"Unknown session backend: {backend!r}")
@@ -0,0 +1,87 @@
+import multiprocessing
+import threading
+
+# Update types whose payload carries the chat directly
+_CHAT_KEYS = ("message", "edited_message", "channel_post", "edited_channel_post")
+
+
+def update_chat_id(update):
+    """Return the chat id a raw (JSON-decoded) Telegram update belongs to, or 0 if it has none."""
+    for key in _CHAT_KEYS:
+        if key in update:
+            return update[key]["chat"]["id"]
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        # callback_query.message.chat, my_chat_member.chat, inline_query.from, ...
+        message = value.get("message")
+        if isinstance(message, dict) and "chat" in message:
+            return message["chat"]["id"]
+        if "chat" in value:
+            return value["chat"]["id"]
+        if "from" in value:
+            return value["from"]["id"]
+    return 0
+
+
+def shard_for(chat_id, shards):
+    """Stable shard index for a chat; the same chat always maps to the same worker."""
+    return int(chat_id) % shards
+
+
+class ShardRouter:
+    """Fan raw updates out to worker processes, keyed on chat id.
+
+    Each worker process gets its own queue and calls ``target(index, inbox)``.
+    All updates for one chat go to the same worker and are queued in arrival
+    order, so per-chat order is preserved as long as the worker handles its
+    inbox one update at a time. Queues are bounded: when a worker falls
+    behind, ``route`` blocks and the receiver stops pulling new updates.
+    """
+
+    def __init__(self, target, workers, max_queue=1000, name="shard"):
+        self.workers = max(1, int(workers))
+        self.target = target
+        self.name = name
+        # spawn, not fork: a forked child would inherit the parent's threads' locks but not the threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue(max_queue) for _ in range(self.workers)]
+        self._processes = []
+        self._lock = threading.Lock()
+        self.routed = [0] * self.workers
+
+    def start(self):
+        with self._lock:
+            if self._processes:
+                return
+            for i, inbox in enumerate(self._queues):
+                p = self._ctx.Process(target=self.target, args=(i, inbox), name=f"{self.name}-{i}", daemon=True)
+                p.start()
+                self._processes.append(p)
+
+    def route(self, update):
+        """Queue a raw update dict on its chat's worker; returns the shard index."""
+        shard = shard_for(update_chat_id(update), self.workers)
+        self._queues[shard].put(update)
+        with self._lock:
+            self.routed[shard] += 1
+        return shard
+
+    def alive(self):
+        return bool(self._processes) and all(p.is_alive() for p in self._processes)
+
+    def stats(self):
+        depths = []
+        for q in self._queues:
+            try:
+                depths.append(q.qsize())
+            except NotImplementedError:  # macOS has no sem_getvalue
+                depths.append(-1)
+        with self._lock:
+            routed = list(self.routed)
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for p in self._processes if p.is_alive()),
+            "queue_depths": depths,
+            "routed": routed,
+        }
@@ -0,0 +1,84 @@
+import time
+
+from text_split import TELEGRAM_MAX_LENGTH, find_split, utf16_len
+
+
+class MessageStreamer:
+    """Show streamed model output by progressively editing a Telegram message.
+
+    Edits are throttled to one every ``min_interval`` seconds. When the current
+    message would exceed Telegram's length limit it is finalized and the rest
+    of the text continues in a new message.
+
+    Nothing is sent until the first piece arrives, so a request that fails
+    before producing any text leaves no trace in the chat; ``discard`` removes
+    what a stream that failed halfway already showed.
+
+    ``send(chat_id, text)`` must return the sent message (we need its id);
+    ``edit(text, chat_id, message_id)`` and ``delete(chat_id, message_id)``
+    may return immediately.
+    """
+
+    def __init__(self, send, edit, delete, chat_id, header="", min_interval=1.0, max_length=TELEGRAM_MAX_LENGTH):
+        self.send = send
+        self.edit = edit
+        self.delete = delete
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.max_length = max_length
+        self.text = ""            # everything streamed so far
+        self._current = header    # text of the message being edited
+        self._shown = None        # what Telegram currently displays for that message
+        self._last_edit = 0.0
+        self._message_id = None   # the message being edited; None until the first piece
+        self._message_ids = []    # every message sent so far
+
+    def feed(self, piece):
+        if not piece:
+            return
+        self.text += piece
+        self._current += piece
+        while utf16_len(self._current) > self.max_length:
+            self._roll_over()
+        if time.monotonic() - self._last_edit >= self.min_interval:
+            self._edit()
+
+    def finish(self):
+        """Flush whatever has not been shown yet."""
+        if self.text:
+            self._edit()
+
+    def discard(self):
+        """Delete the messages sent so far, e.g. before a fallback or an error replaces a failed stream."""
+        for message_id in self._message_ids:
+            self.delete(self.chat_id, message_id)
+        self._message_ids = []
+        self._message_id = None
+
+    def _roll_over(self):
+        # Break at a paragraph, sentence or word boundary, outside any Markdown/HTML entity
+        cut = find_split(self._current, self.max_length)
+        head, rest = self._current[:cut], self._current[cut:].lstrip()
+        self._current = head
+        self._edit()
+        self._current = rest
+        # If rest still overflows, the caller's loop rolls over again before the next edit
+        first = rest.rstrip() if rest.strip() and utf16_len(rest) <= self.max_length else "…"
+        self._send(first)
+
+    def _edit(self):
+        text = self._current.rstrip() or "…"
+        if text == self._shown:
+            return
+        if self._message_id is None:
+            self._send(text)
+            return
+        self.edit(text, self.chat_id, self._message_id)
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+    def _send(self, text):
+        self._message_id = self.send(self.chat_id, text).message_id
+        self._message_ids.append(self._message_id)
+        self._shown = text
+        self._last_edit = time.monotonic()
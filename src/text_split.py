@@ -0,0 +1,107 @@
+import re
+
+# Telegram's hard limit for a single text message, counted in UTF-16 code units
+TELEGRAM_MAX_LENGTH = 4096
+
+_SENTENCE_END = re.compile(r"[.!?…](?=\s)")
+_HTML_ENTITY = re.compile(r"&#?[A-Za-z0-9]{1,10}$")
+_LINE_DELIMITER = re.compile(r"```|\*\*|__|`|\*|_|~")
+
+
+def utf16_len(text):
+    """Length of text as Telegram counts it (emoji outside the BMP take two units)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _advance(text, start, budget):
+    """Largest end such that text[start:end] fits in budget UTF-16 units."""
+    end = min(len(text), start + budget)
+    excess = utf16_len(text[start:end]) - budget
+    # Walk back over at most `excess` code points, each worth one or two units
+    while excess > 0:
+        end -= 1
+        excess -= 2 if ord(text[end]) > 0xFFFF else 1
+    return end
+
+
+def _open_entity(text, start, cut):
+    """If cut falls inside an HTML tag/entity or a Markdown span, return where that entity opens."""
+    window = text[start:cut]
+    # Code fences may span lines: never leave one open at a chunk boundary
+    if window.count("```") % 2:
+        return start + window.rfind("```")
+    line_start = window.rfind("\n") + 1
+    line = window[line_start:]
+    lt, gt = line.rfind("<"), line.rfind(">")
+    if lt > gt:
+        return start + line_start + lt
+    entity = _HTML_ENTITY.search(line)
+    if entity:
+        return start + line_start + entity.start()
+    lb = line.rfind("[")
+    if lb != -1 and (")" not in line[lb:] or line.rfind("](") > line.rfind(")")):
+        return start + line_start + lb
+    # Markdown emphasis and inline code are line-scoped; track which delimiter is still open
+    opened = None
+    for m in _LINE_DELIMITER.finditer(line):
+        if m.group() == "```":
+            continue  # fences were checked above; a closing one is not an open inline span
+        if opened is None:
+            opened = m
+        elif opened.group() == m.group():
+            opened = None
+    if opened is not None:
+        return start + line_start + opened.start()
+    return cut
+
+
+def _best_cut(text, start, end):
+    """Pick where to end the chunk text[start:end]: paragraph, then sentence, then word boundary."""
+    # Only accept a "nicer" boundary if it keeps the chunk at least half full
+    floor = start + (end - start) // 2
+    pos = text.rfind("\n\n", floor, end)
+    if pos == -1:
+        pos = text.rfind("\n", floor, end)
+    if pos == -1:
+        last = None
+        for last in _SENTENCE_END.finditer(text, floor, end):
+            pass
+        pos = last.end() if last else -1
+    if pos == -1:
+        pos = max(text.rfind(" ", start, end), text.rfind("\t", start, end))
+    if pos <= start:
+        pos = end
+    safe = _open_entity(text, start, pos)
+    return safe if safe > start else pos
+
+
+def find_split(text, max_length=TELEGRAM_MAX_LENGTH):
+    """Index at which the first chunk of text should end (len(text) if it all fits)."""
+    end = _advance(text, 0, max_length)
+    return end if end >= len(text) else _best_cut(text, 0, end)
+
+
+def split_message(text, max_length=TELEGRAM_MAX_LENGTH):
+    """Split text into as few chunks as possible that each fit Telegram's limit.
+
+    Lengths are measured in UTF-16 code units like Telegram does. Chunks are
+    packed close to max_length and broken at a paragraph, sentence or word
+    boundary, never inside a Markdown/HTML entity. Runs in a single pass.
+    """
+    if len(text) <= max_length // 2 or utf16_len(text) <= max_length:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = _advance(text, start, max_length)
+        if end < len(text):
+            end = _best_cut(text, start, end)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+        # Skip the whitespace we broke on so the next chunk starts with content
+        while start < len(text) and text[start].isspace():
+            start += 1
+    return chunks
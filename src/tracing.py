@@ -0,0 +1,104 @@
+import contextlib
+import json
+import logging
+import logging.handlers
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class Tracer:
+    """Timing spans as JSON lines in a rotating log, one trace ID per conversation.
+
+    Each line is one span: when it started (``ts``, epoch seconds), how long
+    it took (``ms``), the chat and the conversation's trace ID, plus
+    whatever attributes the caller added. Sorting one trace's lines by
+    ``ts`` gives the timeline of a plan: handler, prompt build, queue wait,
+    Gemini call and every chunk sent.
+
+    /start and /plan begin a new trace for the chat; later spans find it by
+    chat ID, so nothing extra travels through sessions or queues. Disabled
+    (no path), every method is a cheap no-op.
+    """
+
+    def __init__(self, path=None, max_bytes=10 * 2**20, backups=3, max_chats=10000):
+        self.max_chats = max_chats
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = logging.getLogger(f"{__name__}.{id(self)}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        self.enabled = False
+        self.open(path, max_bytes, backups)
+
+    def open(self, path, max_bytes=10 * 2**20, backups=3):
+        """(Re)direct spans to path, rotated at max_bytes with `backups` old files kept; None turns tracing off."""
+        for handler in list(self._log.handlers):
+            self._log.removeHandler(handler)
+            handler.close()
+        self.enabled = bool(path)
+        if self.enabled:
+            # delay: the file is only created once there is something to write
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log.addHandler(handler)
+
+    def new_trace(self, chat_id):
+        """Start a new conversation trace for chat_id; returns its ID."""
+        trace = secrets.token_hex(8)
+        with self._lock:
+            self._traces[chat_id] = trace
+            self._traces.move_to_end(chat_id)
+            while len(self._traces) > self.max_chats:
+                self._traces.popitem(last=False)
+        return trace
+
+    def trace_for(self, chat_id):
+        with self._lock:
+            trace = self._traces.get(chat_id)
+        return trace if trace is not None else self.new_trace(chat_id)
+
+    def record(self, name, chat_id, started, seconds, **attrs):
+        """Write one span that started at `started` (epoch seconds) and lasted `seconds`."""
+        if not self.enabled:
+            return
+        entry = {"ts": round(started, 6), "trace": self.trace_for(chat_id), "chat": chat_id, "span": name,
+                 "ms": round(seconds * 1000, 3)}
+        entry.update((k, v) for k, v in attrs.items() if v is not None)
+        self._log.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def span(self, name, chat_id, **attrs):
+        """Context manager that times its block; it yields a dict of attributes the block may add to."""
+        if not self.enabled:
+            return contextlib.nullcontext({})
+        return self._span(name, chat_id, attrs)
+
+    @contextlib.contextmanager
+    def _span(self, name, chat_id, attrs):
+        started, began = time.time(), time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, chat_id, started, time.perf_counter() - began, **attrs)
+
+    def track(self, future, name, chat_id, **attrs):
+        """Record a span from now until future (a Future or asyncio Task) is done; returns future."""
+        if not self.enabled:
+            return future
+        started, began = time.time(), time.perf_counter()
+
+        def done(f):
+            try:
+                error = f.exception()
+            except BaseException as e:  # cancelled
+                error = e
+            self.record(name, chat_id, started, time.perf_counter() - began,
+                        error=type(error).__name__ if error is not None else None, **attrs)
+
+        future.add_done_callback(done)
+        return future
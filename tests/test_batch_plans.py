@@ -0,0 +1,24 @@
+import json
+from types import SimpleNamespace
+
+import batch_plans
+
+
+def test_a_profile_that_fails_to_build_is_recorded_and_the_run_continues(tmp_path, monkeypatch):
+    build = batch_plans.build_plan_request
+
+    def failing(age, income, expenses, goals):
+        if goals == "bad":
+            raise ZeroDivisionError("division by zero")
+        return build(age, income, expenses, goals)
+
+    monkeypatch.setattr(batch_plans, "build_plan_request", failing)
+    source, output = tmp_path / "profiles.jsonl", tmp_path / "plans.jsonl"
+    source.write_text("\n".join(json.dumps({"age": 30, "income": "60k", "expenses": "20k", "goals": goals})
+                                for goals in ("house", "bad", "car")) + "\n")
+    args = batch_plans.parse_args([str(source), str(output), "--prompts-only"])
+    batch_plans.run(args, {"standard": SimpleNamespace(name="standard")})
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [r["line"] for r in records] == [1, 2, 3]
+    assert records[1]["error"] == "invalid profile: ZeroDivisionError: division by zero"
+    assert "prompt" in records[0] and "prompt" in records[2]
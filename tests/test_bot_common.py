@@ -0,0 +1,36 @@
+import pytest
+
+import bot_common
+from bot_common import webhook_authorized
+
+
+def test_webhook_secret_must_match_in_path_and_header():
+    secret = bot_common.WEBHOOK_SECRET
+    assert webhook_authorized(secret, secret)
+    assert not webhook_authorized(secret, "wrong")
+    assert not webhook_authorized("wrong", secret)
+
+
+def test_non_ascii_webhook_secrets_are_refused_not_errors():
+    secret = bot_common.WEBHOOK_SECRET
+    assert not webhook_authorized("é", secret)
+    assert not webhook_authorized(secret, "Ã©")
+
+
+def test_sharding_needs_shared_sessions_only_where_it_is_supported(monkeypatch, capsys):
+    monkeypatch.setenv("BOT_TOKEN", "1:a")
+    monkeypatch.setenv("GEMINI_API_KEY", "x")
+    monkeypatch.setattr(bot_common, "BOT_MODE", "polling")
+    monkeypatch.setattr(bot_common, "SHARD_WORKERS", 2)
+    bot_common.check_config(supports_shards=False)
+    assert "SHARD_WORKERS is ignored" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        bot_common.check_config(supports_shards=True)
+    assert "SESSION_BACKEND=sqlite" in capsys.readouterr().out
+
+
+def test_webhook_settings_point_at_the_secret_route(monkeypatch):
+    monkeypatch.setattr(bot_common, "WEBHOOK_URL", "https://bot.example")
+    settings = bot_common.webhook_settings()
+    assert settings == {"url": f"https://bot.example/telegram/{bot_common.WEBHOOK_SECRET}",
+                        "secret_token": bot_common.WEBHOOK_SECRET}
@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+from conversation import Conversation
+from bot_common import sessions
+
+
+def make_conversation(sent):
+    return Conversation(send=lambda chat_id, text, **kwargs: sent.append(text), generation_pool=None,
+                        generate_plan=None, answer_question=None)
+
+
+def test_follow_up_turn_is_recorded_before_summarizing():
+    sent = []
+    conversation = make_conversation(sent)
+    sessions.create(7, state="answering_follow_up", plan="Save", summary="", turns=[["q1", "a1"]])
+    before = conversation.follow_up_answered(7, "q2", "a2")
+    assert sent == ["a2"]
+    # The next question is accepted while the older turns are still being summarized
+    assert sessions.get(7)["state"] == "follow_up"
+    assert before["turns"] == [["q1", "a1"], ["q2", "a2"]]
+    sessions.update(7, state="follow_up", turns=before["turns"] + [["q3", "a3"]])
+    conversation.follow_up_summarized(7, before, "asked about q1", [["q2", "a2"]])
+    session = sessions.get(7)
+    assert session["summary"] == "asked about q1"
+    assert session["turns"] == [["q2", "a2"], ["q3", "a3"]]
+    sessions.delete(7)
+
+
+def test_stale_summary_is_dropped():
+    conversation = make_conversation([])
+    sessions.create(8, state="answering_follow_up", plan="Save", summary="", turns=[])
+    before = conversation.follow_up_answered(8, "q1", "a1")
+    sessions.update(8, summary="newer summary", turns=[])
+    conversation.follow_up_summarized(8, before, "older summary", [["q1", "a1"]])
+    assert sessions.get(8)["summary"] == "newer summary"
+    sessions.delete(8)
+
+
+def test_answer_for_an_ended_conversation_is_not_recorded():
+    conversation = make_conversation([])
+    sessions.create(9, state="awaiting_age")
+    assert conversation.follow_up_answered(9, "q1", "a1") is None
+    assert "turns" not in sessions.get(9)
+    sessions.delete(9)
+
+
+class FakePool:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, func, *args):
+        self.jobs.append(args)
+        return 0
+
+
+PROFILE = {"age": "30", "income": "50000", "expenses": "30000", "goals": "retire early"}
+
+
+def test_stale_plan_is_queued_again_and_the_old_job_skipped():
+    pool = FakePool()
+    conversation = Conversation(send=lambda chat_id, text, **kwargs: None, generation_pool=pool,
+                                generate_plan=None, answer_question=None)
+    sessions.create(10, state="generating_advice", plan_queued_at=1.0, **PROFILE)
+    conversation.resume_jobs()
+    assert [job[0] for job in pool.jobs] == [10]
+    queued_at = pool.jobs[0][-1]
+    assert sessions.get(10)["plan_queued_at"] == queued_at
+    assert conversation.plan_job_current(10, queued_at)
+    assert not conversation.plan_job_current(10, 1.0)
+    sessions.delete(10)
+
+
+def test_plan_is_sent_when_caching_it_fails(monkeypatch):
+    import sqlite3
+
+    import bot_common
+
+    def locked(key, plan):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(bot_common.plan_cache, "put", locked)
+    sent = []
+    conversation = make_conversation(sent)
+    sessions.create(11, state="generating_advice", **PROFILE)
+    conversation.plan_generated(11, "Invest 20% of your income.", cache_key="k")
+    assert any("Invest 20% of your income." in text for text in sent)
+    assert sessions.get(11) is None  # the conversation finished normally
+
+
+def test_a_session_that_fails_to_resume_is_reset(monkeypatch):
+    sent = []
+    conversation = make_conversation(sent)
+
+    def broken(user_id, data):
+        raise KeyError("age")
+
+    monkeypatch.setattr(conversation, "request_plan", broken)
+    sessions.create(12, state="generating_advice")
+    sessions.create(13, state="answering_follow_up", plan="Save", summary="", turns=[])
+    conversation.resume_jobs()
+    assert sessions.get(12)["state"] == "awaiting_goals"
+    assert sessions.get(13)["state"] == "follow_up"
+    assert len(sent) == 2
+    sessions.delete(12)
+    sessions.delete(13)
+
+
+def test_lost_follow_up_answer_is_given_up_after_the_timeout():
+    sent = []
+    conversation = make_conversation(sent)
+    sessions.create(14, state="answering_follow_up", question_asked_at=1.0)
+    conversation.waiting_for_answer(SimpleNamespace(chat=SimpleNamespace(id=14)))
+    assert sessions.get(14)["state"] == "follow_up"
+    assert "ask it again" in sent[0]
+    sessions.delete(14)
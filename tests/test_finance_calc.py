@@ -0,0 +1,61 @@
+import pytest
+
+from finance_calc import compute_figures, figures_for_prompt, parse_amount, template_plan
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("50000", 50000),
+    ("50k", 50000),
+    ("₹1,20,000", 120000),
+    ("120,000", 120000),
+    ("1.2 lakh", 120000),
+    ("2 cr", 2e7),
+    ("Rs. 45000", 45000),
+    ("rs45000", 45000),
+    ("INR 45,000", 45000),
+    ("50000rs", 50000),
+    ("50000 rs", 50000),
+    ("45000INR", 45000),
+    ("45000 rupees", 45000),
+    ("50000.", 50000),
+    ("about 45k.", 45000),
+    ("1.5k", 1500),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "none", "50000xyz", "first salary"])
+def test_parse_amount_rejects_unreadable_text(text):
+    assert parse_amount(text) is None
+
+
+@pytest.mark.parametrize("text", ["1" * 310, "9" * 20 + " cr", float("inf"), float("nan")])
+def test_parse_amount_rejects_huge_and_non_finite_amounts(text):
+    assert parse_amount(text) is None
+
+
+def test_zero_expenses_before_retirement():
+    figures = compute_figures("25", "50k", "0")
+    assert figures["retirement"]["needed"] == 0
+    assert "no target from current expenses" in figures_for_prompt(figures)
+    plan = template_plan(figures, "travel")
+    assert "by 60" in plan
+
+
+def test_zero_income_and_expenses():
+    figures = compute_figures("25", "0", "0")
+    assert figures["savings_rate"] == 0.0
+    figures_for_prompt(figures)
+    assert "budget fix" in template_plan(figures, "travel")
+
+
+def test_largest_amounts_still_render():
+    figures = compute_figures("25", "10000000 cr", "1")
+    assert figures["income"] == 1e14
+    assert "₹" in figures_for_prompt(figures)
+    assert "₹" in template_plan(figures, "retire")
+
+
+def test_unparseable_huge_income_gives_no_figures():
+    assert compute_figures("25", "1" * 310, "1000") is None
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from outbox import Outbox, OutboxSender
+
+
+class TelegramError(Exception):
+    def __init__(self, error_code):
+        super().__init__(f"Error code: {error_code}")
+        self.error_code = error_code
+
+
+def done(result=None, error=None):
+    future = Future()
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+    return future
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_due_returns_the_oldest_message_of_each_chat(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    first, second = outbox.enqueue(1, ["a", "b"])
+    other, = outbox.enqueue(2, ["c"])
+    assert [row.id for row in outbox.due()] == [first, other]
+    outbox.ack(first, 10)
+    assert [row.text for row in outbox.due()] == ["b", "c"]
+    assert outbox.pending() == 2
+
+
+def test_retried_message_holds_back_the_rest_of_its_chat(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    first, _ = outbox.enqueue(1, ["a", "b"])
+    now = time.time()
+    outbox.retry(first, "timeout", now + 30)
+    assert outbox.due(now) == []
+    row, = outbox.due(now + 30)
+    assert (row.id, row.attempts) == (first, 1)
+    outbox.give_up(first, "blocked")
+    assert [row.text for row in outbox.due(now + 30)] == ["b"]
+
+
+def test_purge_keeps_undelivered_messages(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), retention=0)
+    sent, _ = outbox.enqueue(1, ["a", "b"])
+    outbox.ack(sent)
+    assert outbox.purge(time.time() + 1) == 1
+    assert outbox.pending() == 1
+
+
+def test_sender_delivers_each_chat_in_order_and_retries(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    delivered = []
+    failures = {"b": [ConnectionError("reset")]}
+
+    def send(chat_id, text):
+        if failures.get(text):
+            return done(error=failures[text].pop())
+        delivered.append((chat_id, text))
+        return done(SimpleNamespace(message_id=len(delivered)))
+
+    outbox.enqueue(1, ["a", "b", "c"])
+    outbox.enqueue(2, ["x", "y"])
+    sender = OutboxSender(outbox, send, base_delay=0, poll_interval=0.01)
+    sender.start()
+    wait_until(lambda: outbox.pending() == 0)
+    assert [text for chat, text in delivered if chat == 1] == ["a", "b", "c"]
+    assert [text for chat, text in delivered if chat == 2] == ["x", "y"]
+    assert (sender.sent, sender.retried, sender.failed) == (5, 1, 0)
+
+
+def test_sender_gives_up_on_permanent_errors_and_after_max_attempts(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    attempts = {}
+
+    def send(chat_id, text):
+        attempts[text] = attempts.get(text, 0) + 1
+        if text == "blocked":
+            return done(error=TelegramError(403))
+        if text == "flaky":
+            raise TimeoutError("timed out")
+        return done(SimpleNamespace(message_id=1))
+
+    outbox.enqueue(1, ["blocked", "after blocked"])
+    outbox.enqueue(2, ["flaky", "after flaky"])
+    sender = OutboxSender(outbox, send, max_attempts=3, base_delay=0, poll_interval=0.01)
+    sender.start()
+    wait_until(lambda: outbox.pending() == 0)
+    assert attempts == {"blocked": 1, "after blocked": 1, "flaky": 3, "after flaky": 1}
+    assert (sender.sent, sender.retried, sender.failed) == (2, 2, 2)
@@ -0,0 +1,39 @@
+import sqlite3
+
+from plan_cache import PlanCache
+
+
+class LockedDb:
+    """Stands in for a SQLite connection whose database another process holds locked."""
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_plans_survive_in_the_database(tmp_path):
+    path = str(tmp_path / "plans.db")
+    PlanCache(db_path=path).put("k", "plan")
+    cache = PlanCache(db_path=path)
+    assert cache.get("k") == "plan"
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_locked_database_is_a_miss(tmp_path):
+    cache = PlanCache(db_path=str(tmp_path / "plans.db"))
+    cache._db = LockedDb()
+    assert cache.get("k") is None
+    assert cache.misses == 1
+
+
+def test_expired_plan_is_a_miss_even_when_it_cannot_be_deleted(tmp_path):
+    cache = PlanCache(ttl=10, db_path=str(tmp_path / "plans.db"))
+    cache._entries["k"] = (0.0, "old plan")
+    cache._db = LockedDb()
+    assert cache.get("k") is None
+    assert "k" not in cache._entries
@@ -0,0 +1,24 @@
+import pytest
+
+from finance_calc import compute_figures
+from plan_prompt import build_plan_request, is_simple
+
+
+@pytest.mark.parametrize("goals", ["buy a house", "retire early", "child's education fund"])
+def test_one_short_goal_with_a_surplus_is_simple(goals):
+    assert is_simple(compute_figures("30", "80k", "40k"), goals)
+
+
+@pytest.mark.parametrize("goals", [
+    "buy a house and retire early",
+    "car, house",
+    "travel; emergency fund",
+    "save for my daughter's wedding in ten years time",
+])
+def test_several_or_long_goals_are_not_simple(goals):
+    assert not is_simple(compute_figures("30", "80k", "40k"), goals)
+
+
+def test_a_deficit_or_unparsed_figures_are_not_simple():
+    assert not is_simple(compute_figures("30", "40k", "50k"), "buy a house")
+    assert not build_plan_request("30", "a lot", "some", "buy a house").simple
@@ -0,0 +1,37 @@
+import pytest
+
+from profile_parser import PROFILE_STEPS, missing_step, parse_profile, state_after
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("age 28 income 80k expenses 45k goals home, retirement",
+     {"age": "28", "income": "80k", "expenses": "45k", "goals": "home, retirement"}),
+    ("income=80k, age=28", {"income": "80k", "age": "28"}),
+    ("Goals: retire early. Salary is ₹1,20,000 and spend 45k, age 30",
+     {"goals": "retire early", "income": "₹1,20,000", "expenses": "45k", "age": "30"}),
+    ("28 80000 45000 buy a home", {"age": "28", "income": "80000", "expenses": "45000", "goals": "buy a home"}),
+    ("28 80000", {"age": "28", "income": "80000"}),
+    ("", {}),
+])
+def test_parse_profile(text, expected):
+    assert parse_profile(text) == expected
+
+
+def test_number_labels_inside_goals_stay_in_the_goals():
+    assert parse_profile("goals reduce spending") == {"goals": "reduce spending"}
+
+
+def test_unreadable_values_are_left_out():
+    assert parse_profile("age 200 income lots expenses 45k") == {"expenses": "45k"}
+
+
+def test_missing_step_follows_the_conversation_order():
+    assert missing_step({}) == PROFILE_STEPS[0]
+    assert missing_step({"age": "28", "expenses": "45k"})[0] == "income"
+    assert missing_step({"age": "28", "income": "80k", "expenses": "45k", "goals": "home"}) is None
+
+
+def test_state_after():
+    assert state_after("age") == "awaiting_income"
+    assert state_after("expenses") == "awaiting_goals"
+    assert state_after("goals") == "generating_advice"
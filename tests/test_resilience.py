@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, is_retryable, retry_call
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def failing(*errors, result="ok"):
+    """A callable that raises each error in turn, then returns result."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    func.calls = calls
+    return func
+
+
+@pytest.mark.parametrize("error, expected", [
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (ApiError(429), True),
+    (ApiError(503), True),
+    (ApiError(400), False),
+    (ValueError(), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_retry_call_retries_transient_errors():
+    func = failing(TimeoutError(), ApiError(503))
+    retries = []
+    assert retry_call(func, attempts=3, base_delay=0, on_retry=lambda *a: retries.append(a[0])) == "ok"
+    assert len(func.calls) == 3
+    assert retries == [1, 2]
+
+
+def test_retry_call_raises_the_last_error_when_attempts_run_out():
+    last = ApiError(502)
+    func = failing(TimeoutError(), last)
+    with pytest.raises(ApiError) as raised:
+        retry_call(func, attempts=2, base_delay=0)
+    assert raised.value is last
+
+
+def test_retry_call_does_not_retry_permanent_errors():
+    func = failing(ApiError(400))
+    with pytest.raises(ApiError):
+        retry_call(func, attempts=5, base_delay=0)
+    assert len(func.calls) == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert breaker.opened == 1
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.opened == 2
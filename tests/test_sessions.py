@@ -0,0 +1,59 @@
+import pytest
+
+from sessions import MemorySessionStore, SessionStore, SqliteSessionStore
+
+
+def first_expiry(store, user_id, start, until, step=0.1):
+    """Sweep every `step` seconds from start to until; returns when user_id was expired, or None."""
+    now = start
+    while now <= until:
+        if user_id in store.expire(now):
+            return now
+        now += step
+    return None
+
+
+def test_memory_session_expires_within_one_tick_of_ttl():
+    store = MemorySessionStore(ttl=10, resolution=1.0)
+    store.create(1, state="awaiting_age")
+    deadline = store._sessions[1].expires_at
+    expired_at = first_expiry(store, 1, deadline - store.ttl, deadline + store.ttl * 2)
+    assert expired_at is not None
+    assert deadline <= expired_at <= deadline + store.resolution
+    assert len(store) == 0
+
+
+def test_memory_session_sweep_reaches_sessions_due_mid_tick():
+    store = MemorySessionStore(ttl=10, resolution=1.0)
+    store.create(1)
+    deadline = store._sessions[1].expires_at
+    # A sweep inside the deadline's tick but before it must not skip the session for a whole turn
+    assert store.expire(deadline - 0.01) == []
+    assert store.expire(deadline + store.resolution) == [1]
+
+
+def test_refreshed_session_is_not_expired_early():
+    store = MemorySessionStore(ttl=10, resolution=1.0)
+    store.create(1)
+    deadline = store._sessions[1].expires_at
+    store.update(1, state="awaiting_income")
+    assert store.expire(deadline - 0.01) == []
+    assert 1 in store
+
+
+def test_in_state_lists_live_sessions_in_that_state(tmp_path):
+    for store in (MemorySessionStore(ttl=10), SqliteSessionStore(str(tmp_path / "sessions.db"), ttl=10)):
+        store.create(1, state="generating_advice", age="30")
+        store.create(2, state="awaiting_goals")
+        assert store.in_state("generating_advice") == {1: {"state": "generating_advice", "age": "30"}}
+
+
+def test_session_store_is_abstract():
+    class PartialStore(SessionStore):
+        def get(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        SessionStore()
+    with pytest.raises(TypeError):
+        PartialStore()
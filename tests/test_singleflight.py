@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_together(flight, func, callers=5):
+    """Call flight.do("k", func) from several threads while func is blocked; return each outcome."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait(5)
+        return func()
+
+    def call(i):
+        try:
+            return flight.do("k", blocked if i == 0 else func)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as pool:
+        leader = pool.submit(call, 0)
+        started.wait(5)
+        waiters = [pool.submit(call, i) for i in range(1, callers)]
+        while flight.stats()["shared"] < callers - 1:
+            time.sleep(0.001)
+        release.set()
+        return [leader.result()] + [w.result() for w in waiters]
+
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight()
+    results = run_together(flight, lambda: "plan")
+    assert results[0] == ("plan", False)
+    assert results[1:] == [("plan", True)] * 4
+    assert flight.stats() == {"executed": 1, "shared": 4, "in_flight": 0}
+
+
+def test_concurrent_callers_share_one_error():
+    flight = SingleFlight()
+    error = RuntimeError("gemini down")
+
+    def fail():
+        raise error
+
+    assert all(outcome is error for outcome in run_together(flight, fail))
+    assert flight.stats()["executed"] == 1
+
+
+def test_key_is_forgotten_after_the_call():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", int, "x")
+    assert flight.do("k", int, "7") == (7, False)
+    assert flight.stats() == {"executed": 2, "shared": 0, "in_flight": 0}
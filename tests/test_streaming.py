@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from streaming import MessageStreamer
+
+
+class FakeChat:
+    """Records what a MessageStreamer sends, edits and deletes."""
+
+    def __init__(self):
+        self.messages = {}
+        self.next_id = 1
+
+    def send(self, chat_id, text):
+        message_id, self.next_id = self.next_id, self.next_id + 1
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+    def edit(self, text, chat_id, message_id):
+        self.messages[message_id] = text
+
+    def delete(self, chat_id, message_id):
+        del self.messages[message_id]
+
+    def streamer(self, **kwargs):
+        return MessageStreamer(self.send, self.edit, self.delete, chat_id=1, header="Plan\n\n", **kwargs)
+
+
+def test_nothing_is_sent_before_the_first_piece():
+    chat = FakeChat()
+    streamer = chat.streamer()
+    streamer.finish()
+    assert chat.messages == {}
+
+
+def test_first_piece_is_sent_with_the_header():
+    chat = FakeChat()
+    streamer = chat.streamer(min_interval=0)
+    streamer.feed("Save more.")
+    streamer.feed(" Spend less.")
+    streamer.finish()
+    assert list(chat.messages.values()) == ["Plan\n\nSave more. Spend less."]
+
+
+def test_discard_deletes_every_message_of_a_failed_stream():
+    chat = FakeChat()
+    streamer = chat.streamer(min_interval=0, max_length=40)
+    for _ in range(5):
+        streamer.feed("Invest a little every single month. ")
+    assert len(chat.messages) > 1
+    streamer.discard()
+    assert chat.messages == {}
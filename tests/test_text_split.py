@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from text_split import TELEGRAM_MAX_LENGTH, split_message, utf16_len
+
+# Pieces a Telegram plan is made of; the multi-character ones must never be cut
+TOKENS = [
+    '<a href="https://example.com/page">', "</a>", "[read this guide](https://example.com/guide)", "&amp;", "&#8377;",
+    "```\nprint(1)\nprint(2)\n```", "*two words*", "`some code`", "word", "savings.", "₹50,000", "📈", "👨‍👩‍👧", "\n\n",
+]
+
+
+def random_text(seed):
+    """Return (text, spans of its tokens) built from TOKENS separated by spaces and newlines."""
+    rng = random.Random(seed)
+    text, spans = "", []
+    for _ in range(rng.randint(20, 300)):
+        token = rng.choice(TOKENS)
+        if token.strip():
+            spans.append((len(text), len(text) + len(token)))
+        text += token + rng.choice([" ", " ", "\n"])
+    return text, spans
+
+
+def cut_positions(text, chunks):
+    """Where each chunk but the last ends in text (chunks are stripped, in order)."""
+    positions, pos = [], 0
+    for chunk in chunks:
+        pos = text.index(chunk, pos) + len(chunk)
+        positions.append(pos)
+    return positions[:-1]
+
+
+@pytest.mark.parametrize("max_length", [64, 100, 300])
+@pytest.mark.parametrize("seed", range(100))
+def test_chunks_fit_keep_everything_and_never_cut_an_entity(seed, max_length):
+    text, spans = random_text(seed)
+    chunks = split_message(text, max_length)
+    assert all(utf16_len(chunk) <= max_length for chunk in chunks)
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+    for cut in cut_positions(text, chunks):
+        assert not any(start < cut < end for start, end in spans), text[max(0, cut - 40):cut + 10]
+
+
+@pytest.mark.parametrize("unit", ["📈", "₹", "👨‍👩‍👧 ", "₹ 1,20,000 📈 "])
+def test_emoji_and_rupee_text_fits_telegram_limit(unit):
+    text = unit * (3 * TELEGRAM_MAX_LENGTH // len(unit))
+    chunks = split_message(text)
+    assert len(chunks) > 1
+    assert all(utf16_len(chunk) <= TELEGRAM_MAX_LENGTH for chunk in chunks)
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+
+
+def test_prose_is_packed_tightly():
+    text = " ".join(f"Sentence number {i} about saving and investing." for i in range(2000))
+    chunks = split_message(text)
+    assert all(utf16_len(chunk) > TELEGRAM_MAX_LENGTH * 0.9 for chunk in chunks[:-1])
+
+
+def test_short_text_is_one_chunk():
+    assert split_message("📊 Your plan") == ["📊 Your plan"]